@@ -0,0 +1,92 @@
+"""
+Compares per-configuration id resolution against the batched
+`MetadataTableRegistry.lookup_configuration_ids` on a part with many versions.
+
+    python benchmarks/commit_id_resolution.py --configs 50000 --versions 20
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ml_experiment.definition_part import DefinitionPart, generate_configurations
+from ml_experiment.metadata.metadata_table_registry import MetadataTableRegistry
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--configs', type=int, default=5000)
+parser.add_argument('--versions', type=int, default=10)
+
+
+def build_part(base: str, n_configs: int, n_versions: int) -> DefinitionPart:
+    part = DefinitionPart('bench', base=base)
+    part.get_results_path = lambda base_path: os.path.join(base_path, 'results', 'bench')
+
+    part.add_sweepable_property('alpha', range(n_configs // 10))
+    part.add_sweepable_property('beta', range(10))
+
+    # every version introduces a new property with an assumed prior value
+    # so every later lookup must walk back through all versions
+    for v in range(n_versions):
+        part.add_property(f'p{v}', 0, assume_prior_value=0)
+        part.commit()
+
+    # the configurations we are going to resolve contain one more new value
+    part.add_sweepable_property('alpha', [-1])
+    return part
+
+
+def per_row(cur: sqlite3.Cursor, part: DefinitionPart, configurations: list[dict]):
+    registry = MetadataTableRegistry()
+    out = []
+    for configuration in configurations:
+        query = part._get_configuration_without_priors(configuration)
+        out.append(
+            registry.get_configuration_id(cur, part.name, configuration)
+                .flat_otherwise(lambda: registry.get_configuration_id(cur, part.name, query))
+                .or_else(None)
+        )
+    return out
+
+
+def batched(cur: sqlite3.Cursor, part: DefinitionPart, configurations: list[dict]):
+    registry = MetadataTableRegistry()
+    out = registry.lookup_configuration_ids(cur, part.name, configurations)
+    missing = [i for i, c in enumerate(out) if c is None]
+    queries = [part._get_configuration_without_priors(configurations[i]) for i in missing]
+    for i, c in zip(missing, registry.lookup_configuration_ids(cur, part.name, queries), strict=True):
+        out[i] = c
+    return out
+
+
+def main():
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as base:
+        part = build_part(base, args.configs, args.versions)
+        configurations = list(generate_configurations(part._properties))
+        db_path = os.path.join(part.get_results_path(base), 'metadata.db')
+
+        with sqlite3.connect(db_path) as con:
+            cur = con.cursor()
+
+            start = time.perf_counter()
+            expected = per_row(cur, part, configurations)
+            t_row = time.perf_counter() - start
+
+            start = time.perf_counter()
+            got = batched(cur, part, configurations)
+            t_batch = time.perf_counter() - start
+
+    assert got == expected
+    print(f'configurations: {len(configurations)}  versions: {args.versions}')
+    print(f'per-row: {t_row:.3f}s')
+    print(f'batched: {t_batch:.3f}s')
+    print(f'speedup: {t_row / t_batch:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Reports throughput and peak Python memory of `DefinitionPart.commit`
+for increasingly large sweeps, to help size jobs.
+
+    python benchmarks/commit_streaming.py --sizes 10000 100000 1000000 --chunk-size 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ml_experiment.definition_part import DEFAULT_CHUNK_SIZE, DefinitionPart
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+
+def commit(base: str, n_configs: int, chunk_size: int):
+    part = DefinitionPart('bench', base=base)
+    part.get_results_path = lambda base_path: os.path.join(base_path, 'results', 'bench')
+    part.add_sweepable_property('alpha', range(max(1, n_configs // 100)))
+    part.add_sweepable_property('beta', [i / 100 for i in range(100)])
+    part.add_property('steps', 100_000)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    part.commit(chunk_size=chunk_size)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+def main():
+    args = parser.parse_args()
+
+    print(f'{"configs":>10} {"seconds":>9} {"rows/sec":>10} {"peak MiB":>9}')
+    for n in args.sizes:
+        with tempfile.TemporaryDirectory() as base:
+            elapsed, peak = commit(base, n, args.chunk_size)
+
+        print(f'{n:>10} {elapsed:>9.2f} {n / elapsed:>10.0f} {peak / 2**20:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Stress test for concurrent access to metadata.db: many reader processes
+open the database and read configurations, the way entry scripts do at
+the start of every run, while a writer keeps committing new versions
+and recording run outcomes.
+
+    python benchmarks/metadata_contention.py --readers 64 --seconds 10
+    python benchmarks/metadata_contention.py --readers 64 --seconds 10 --legacy
+
+`--legacy` uses plain `sqlite3.connect` with the default rollback journal
+and no retries, to compare against the connection policy in
+ml_experiment._utils.sqlite.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ml_experiment._utils.sqlite as sqlu
+from ml_experiment.definition_part import DefinitionPart
+from ml_experiment.execution.types import RunResult, RunSpec
+from ml_experiment.experiment_definition import ExperimentDefinition
+import ml_experiment.metadata.run_ledger as run_ledger
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--readers', type=int, default=32)
+parser.add_argument('--seconds', type=float, default=5.0)
+parser.add_argument('--configs', type=int, default=10_000)
+parser.add_argument('--legacy', action='store_true')
+
+
+def get_results_path(base_path: str) -> str:
+    return os.path.join(base_path, 'results', 'bench')
+
+
+def make_part(base: str, n_configs: int, extra: int = 0) -> DefinitionPart:
+    part = DefinitionPart('bench', base=base)
+    part.get_results_path = get_results_path
+    part.add_sweepable_property('alpha', range(n_configs // 10 + extra))
+    part.add_sweepable_property('beta', range(10))
+    return part
+
+
+def use_legacy_policy():
+    def _connect(db_path: str, readonly: bool = False, timeout: float = sqlu.DEFAULT_BUSY_TIMEOUT):
+        return sqlite3.connect(db_path)
+
+    sqlu.connect = _connect
+    sqlu.retry_busy = lambda fn, *args, **kwargs: fn()
+
+
+def reader(base: str, n_configs: int, deadline: float, legacy: bool, out):
+    if legacy:
+        use_legacy_policy()
+
+    ok = errors = 0
+    latencies = []
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            # a fresh definition per read, like a new run starting up
+            with ExperimentDefinition('bench', 0, base=base) as exp:
+                exp.get_results_path = get_results_path
+                exp.get_config(random.randrange(n_configs))
+            ok += 1
+            latencies.append(time.perf_counter() - start)
+        except sqlite3.OperationalError:
+            errors += 1
+
+    out.put((ok, errors, latencies))
+
+
+def writer(base: str, n_configs: int, deadline: float, legacy: bool, out):
+    if legacy:
+        use_legacy_policy()
+
+    commits = ledger_writes = errors = 0
+    db_path = os.path.join(get_results_path(base), 'metadata.db')
+    con = sqlu.connect(db_path)
+    sqlu.write_transaction(con, run_ledger.ensure_ledger)
+
+    while time.time() < deadline:
+        try:
+            make_part(base, n_configs, extra=commits + 1).commit()
+            commits += 1
+
+            for i in range(100):
+                run = RunSpec('bench', 0, i, commits)
+                sqlu.write_transaction(con, lambda cur: run_ledger.mark_running(cur, [run], 'bench'))
+                sqlu.write_transaction(con, lambda cur: run_ledger.mark_finished(cur, [RunResult(run, 0, 1.0)]))
+                ledger_writes += 2
+        except sqlite3.OperationalError:
+            con.rollback()
+            errors += 1
+
+    con.close()
+    out.put((commits, ledger_writes, errors))
+
+
+def main():
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as base:
+        if args.legacy:
+            use_legacy_policy()
+        make_part(base, args.configs).commit()
+
+        ctx = multiprocessing.get_context('fork')
+        readers_out = ctx.Queue()
+        writer_out = ctx.Queue()
+        deadline = time.time() + args.seconds
+
+        procs = [ctx.Process(target=writer, args=(base, args.configs, deadline, args.legacy, writer_out))]
+        procs += [
+            ctx.Process(target=reader, args=(base, args.configs, deadline, args.legacy, readers_out))
+            for _ in range(args.readers)
+        ]
+        for p in procs:
+            p.start()
+
+        results = [readers_out.get() for _ in range(args.readers)]
+        commits, ledger_writes, write_errors = writer_out.get()
+        for p in procs:
+            p.join()
+
+    reads = sum(r[0] for r in results)
+    read_errors = sum(r[1] for r in results)
+    latencies = sorted(latency for r in results for latency in r[2])
+    p99 = latencies[int(0.99 * (len(latencies) - 1))] if latencies else float('nan')
+
+    print(f'policy:        {"legacy" if args.legacy else "wal + busy timeout + retry"}')
+    print(f'reads/sec:     {reads / args.seconds:.0f}')
+    print(f'read errors:   {read_errors}')
+    print(f'read p99 ms:   {p99 * 1000:.1f}')
+    print(f'commits:       {commits}')
+    print(f'ledger writes: {ledger_writes}')
+    print(f'write errors:  {write_errors}')
+
+
+if __name__ == '__main__':
+    main()
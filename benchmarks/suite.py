@@ -0,0 +1,364 @@
+"""
+Benchmarks for the paths that have to scale: committing definitions,
+reading configurations back, discovering versions, and scheduling runs.
+Everything runs offline against temporary databases.
+
+    python benchmarks/suite.py run
+    python benchmarks/suite.py run --scale full --only commit lookup --output before.json
+    python benchmarks/suite.py compare before.json after.json --threshold 0.2
+
+Every case is measured in seconds, so lower is always better. Results
+are written as JSON, along with the commit, Python version and machine
+they were measured on, to `--output` or to benchmarks/results/<commit>.json.
+`compare` prints the ratio of every case the two files share, and exits
+with 1 when any case got slower by more than the threshold.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from ml_experiment.definition_part import DefinitionPart  # noqa: E402
+from ml_experiment.experiment_definition import ExperimentDefinition  # noqa: E402
+from ml_experiment.metadata.config_cache import ConfigCache  # noqa: E402
+from ml_experiment.metadata.metadata_table_registry import MetadataTableRegistry  # noqa: E402
+from ml_experiment.metadata.query import ge, isin  # noqa: E402
+from ml_experiment.Scheduler import LocalRunConfig, Scheduler  # noqa: E402
+
+EXP_NAME = 'bench'
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+SCALES: Dict[str, Dict[str, Any]] = {
+    'small': {
+        'commit_sizes': [1_000, 10_000, 100_000],
+        'commit_versions': 3,
+        'lookup_configs': 100_000,
+        'lookup_calls': 200,
+        'discovery_versions': [100],
+        'scheduler_runs': 100,
+    },
+    'full': {
+        'commit_sizes': [1_000, 10_000, 100_000, 1_000_000],
+        'commit_versions': 5,
+        'lookup_configs': 1_000_000,
+        'lookup_calls': 1_000,
+        'discovery_versions': [100, 500],
+        'scheduler_runs': 1_000,
+    },
+}
+
+# an entry script that does nothing, so that only the scheduler is measured
+NOOP_ENTRY = f"""
+import sys
+sys.path.append({ROOT!r})
+
+from ml_experiment.execution.batch import BATCH_FLAG, run_batch
+
+def run(part, version, config_id, seed, results_path):
+    pass
+
+if __name__ == '__main__' and BATCH_FLAG in sys.argv[1:]:
+    sys.exit(1 if run_batch(run) else 0)
+"""
+
+parser = argparse.ArgumentParser()
+commands = parser.add_subparsers(dest='command', required=True)
+
+run_parser = commands.add_parser('run')
+run_parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+run_parser.add_argument('--only', nargs='+', default=None)
+run_parser.add_argument('--repeat', type=int, default=3)
+run_parser.add_argument('--output', type=str, default=None)
+
+compare_parser = commands.add_parser('compare')
+compare_parser.add_argument('before')
+compare_parser.add_argument('after')
+compare_parser.add_argument('--threshold', type=float, default=0.2)
+
+
+# -------------
+# -- Helpers --
+# -------------
+
+class Results:
+    def __init__(self):
+        self.cases: Dict[str, Dict[str, Any]] = {}
+
+
+    def add(self, case: str, times: List[float], per: int = 1, **extra: Any):
+        # `per` turns the times of a loop into the time of a single call
+        times = [t / per for t in times]
+        self.cases[case] = {
+            'seconds': statistics.median(times),
+            'min': min(times),
+            'repeat': len(times),
+            **extra,
+        }
+        print(f'{case:<45} {statistics.median(times):>12.6f}s {min(times):>12.6f}s', flush=True)
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> List[float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    return times
+
+
+def make_part(base: str, n_configs: int) -> DefinitionPart:
+    part = DefinitionPart(EXP_NAME, base=base)
+    part.get_results_path = get_results_path
+    part.add_sweepable_property('alpha', range(max(1, n_configs // 10)))
+    part.add_sweepable_property('beta', range(min(10, n_configs)))
+    part.add_property('steps', 100_000)
+    return part
+
+
+def get_results_path(base_path: str) -> str:
+    return os.path.join(base_path, 'results', EXP_NAME)
+
+
+def get_metadata(scale: str) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT, capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+
+    return {
+        'commit': commit,
+        'dirty': dirty,
+        'scale': scale,
+        'time': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+# ----------------
+# -- Benchmarks --
+# ----------------
+
+def bench_commit(results: Results, scale: Dict[str, Any], repeat: int):
+    """The first version of a sweep, later versions that resolve ids against it, and a no-op recommit."""
+    for n in scale['commit_sizes']:
+        first, later, noop, compact = [], [], [], []
+        for _ in range(repeat if n < 100_000 else 1):
+            with tempfile.TemporaryDirectory() as base:
+                compact += measure(lambda: make_part(base, n).commit(compact=True), 1)
+
+            with tempfile.TemporaryDirectory() as base:
+                part = make_part(base, n)
+                first += measure(part.commit, 1)
+
+                for v in range(1, scale['commit_versions']):
+                    part.add_property(f'p{v}', 0, assume_prior_value=0)
+                    later += measure(part.commit, 1)
+
+                noop += measure(part.commit, 1)
+
+        results.add(f'commit/{n}/first_version', first, configs=n)
+        results.add(f'commit/{n}/later_version', later, configs=n)
+        results.add(f'commit/{n}/unchanged', noop, configs=n)
+        results.add(f'commit/{n}/compact_first_version', compact, configs=n)
+
+
+def bench_lookup(results: Results, scale: Dict[str, Any], repeat: int):
+    """Reading configurations back, through a fresh definition, a reused one, and the cache, and querying them."""
+    _bench_lookup(results, scale, repeat, compact=False, prefix='')
+    _bench_lookup(results, scale, repeat, compact=True, prefix='compact/')
+
+
+def _bench_lookup(results: Results, scale: Dict[str, Any], repeat: int, compact: bool, prefix: str):
+    n = scale['lookup_configs']
+    calls = scale['lookup_calls']
+
+    with tempfile.TemporaryDirectory() as base:
+        make_part(base, n).commit(compact=compact)
+        rng = random.Random(0)
+        ids = [rng.randrange(n) for _ in range(calls)]
+        batch = [rng.randrange(n) for _ in range(1000)]
+
+        def _definition(**kwargs: Any) -> ExperimentDefinition:
+            exp = ExperimentDefinition(EXP_NAME, 0, base=base, **kwargs)
+            exp.get_results_path = get_results_path
+            return exp
+
+        def _cold():
+            # every run of an entry script opens the database anew
+            for i in ids:
+                with _definition() as exp:
+                    exp.get_config(i)
+
+        def _warm():
+            for i in ids:
+                exp.get_config(i)
+
+        with _definition() as exp:
+            exp.get_config(0)
+            results.add(f'{prefix}get_config/cold', measure(_cold, repeat), per=calls, configs=n)
+            results.add(f'{prefix}get_config/warm', measure(_warm, repeat), per=calls, configs=n)
+            results.add(f'{prefix}get_configs/1000', measure(lambda: exp.get_configs(batch), repeat), configs=n)
+            results.add(f'{prefix}get_columnar', measure(exp.get_columnar, repeat), configs=n)
+
+            where = {'alpha': isin(range(0, n // 10, 100)), 'beta': ge(5)}
+            results.add(f'{prefix}query_ids/scan', measure(lambda: exp.query_ids(where, index=False), repeat), configs=n)
+
+            # compact versions are views, which cannot be indexed
+            if not compact:
+                exp.query_ids(where, index=True)
+                results.add(f'{prefix}query_ids/indexed', measure(lambda: exp.query_ids(where, index=False), repeat), configs=n)
+
+        cache = ConfigCache()
+        with _definition(cache=cache) as exp:
+            results.add(f'{prefix}get_config/cache_load', measure(lambda: (cache.clear(), exp.get_config(0)), repeat), configs=n)
+            results.add(f'{prefix}get_config/cached', measure(_warm, repeat), per=calls, configs=n)
+
+
+def bench_discovery(results: Results, scale: Dict[str, Any], repeat: int):
+    """Finding parts and versions in a database with many versions."""
+    for n_versions in scale['discovery_versions']:
+        with tempfile.TemporaryDirectory() as base:
+            part = make_part(base, 100)
+            part.commit()
+            for v in range(1, n_versions):
+                part.add_property(f'p{v}', 0, assume_prior_value=0)
+                part.commit()
+
+            db_path = os.path.join(get_results_path(base), 'metadata.db')
+
+            def _discover(fn: Callable[[sqlite3.Cursor, MetadataTableRegistry], Any]) -> Callable[[], Any]:
+                # a fresh connection and registry, like a new process would have
+                def _run():
+                    with sqlite3.connect(db_path) as con:
+                        fn(con.cursor(), MetadataTableRegistry())
+                return _run
+
+            results.add(f'discovery/{n_versions}/parts', measure(_discover(lambda cur, reg: reg.get_parts(cur)), repeat))
+            results.add(f'discovery/{n_versions}/latest_version', measure(_discover(lambda cur, reg: reg.get_latest_version(cur, EXP_NAME)), repeat))
+            results.add(f'discovery/{n_versions}/all_tables', measure(_discover(lambda cur, reg: list(reg.get_tables(cur, EXP_NAME))), repeat))
+            results.add(f'discovery/{n_versions}/all_runs', measure(
+                lambda: Scheduler(EXP_NAME, [0], 'entry.py', base=base).get_all_runs(), repeat,
+            ))
+
+
+def bench_scheduler(results: Results, scale: Dict[str, Any], repeat: int):
+    """Runs per second with an entry script that does nothing, so the overhead is all that is left."""
+    n = scale['scheduler_runs']
+    slots = max(1, os.cpu_count() or 1)
+
+    with tempfile.TemporaryDirectory() as base:
+        make_part(base, n).commit()
+        entry = os.path.join(base, 'noop_entry.py')
+        with open(entry, 'w') as f:
+            f.write(NOOP_ENTRY)
+
+        configs = {
+            'subprocess': LocalRunConfig(tasks_in_parallel=slots, log_path=None),
+            'batched': LocalRunConfig(tasks_in_parallel=slots, log_path=None, runs_per_invocation=max(1, n // (4 * slots))),
+            'in_process': LocalRunConfig(tasks_in_parallel=slots, log_path=None, in_process=True),
+        }
+
+        for name, config in configs.items():
+            sched = Scheduler(EXP_NAME, [0], entry, base=base).get_all_runs()
+            assert len(sched.all_runs) == n
+
+            def _run():
+                failed = [r for r in sched.run(config) if not r.ok]
+                assert not failed, failed[0]
+
+            times = measure(_run, repeat)
+            results.add(f'scheduler/{name}/{n}', times, per=n, runs=n, slots=slots, runs_per_second=n / statistics.median(times))
+
+        lazy = Scheduler(EXP_NAME, [0], entry, base=base)
+        results.add(f'scheduler/get_all_runs/{n}', measure(lambda: lazy.get_all_runs().remaining(), repeat), runs=n)
+
+
+BENCHMARKS = {
+    'commit': bench_commit,
+    'lookup': bench_lookup,
+    'discovery': bench_discovery,
+    'scheduler': bench_scheduler,
+}
+
+
+# --------------
+# -- Commands --
+# --------------
+
+def run(args: argparse.Namespace):
+    only = args.only or list(BENCHMARKS)
+    unknown = set(only) - set(BENCHMARKS)
+    if unknown:
+        raise SystemExit(f'Unknown benchmarks {sorted(unknown)}, expected some of {list(BENCHMARKS)}')
+
+    meta = get_metadata(args.scale)
+    results = Results()
+
+    print(f'{"case":<45} {"median":>13} {"min":>13}')
+    for name in only:
+        BENCHMARKS[name](results, SCALES[args.scale], args.repeat)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f'{(meta["commit"] or "local")[:12]}-{args.scale}.json')
+
+    with open(output, 'w') as f:
+        json.dump({'meta': meta, 'results': results.cases}, f, indent=2)
+
+    print(f'wrote {output}')
+
+
+def compare(args: argparse.Namespace) -> int:
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f'before: {before["meta"]["commit"]}  after: {after["meta"]["commit"]}')
+    if before['meta']['platform'] != after['meta']['platform']:
+        print('warning: the results were measured on different machines')
+
+    regressions = 0
+    print(f'{"case":<45} {"before":>12} {"after":>12} {"ratio":>7}')
+    for case in sorted(set(before['results']) & set(after['results'])):
+        old = before['results'][case]['seconds']
+        new = after['results'][case]['seconds']
+        ratio = new / old if old > 0 else float('inf')
+
+        slower = ratio > 1 + args.threshold
+        regressions += slower
+        print(f'{case:<45} {old:>12.6f} {new:>12.6f} {ratio:>6.2f}x{"  <-- slower" if slower else ""}')
+
+    print(f'{regressions} cases slower by more than {args.threshold:.0%}')
+    return 1 if regressions else 0
+
+
+def main():
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,18 +5,28 @@ import os
 sys.path.append(os.getcwd())
 
 import sqlite3
-from typing import Self, Callable, NamedTuple
-from dataclasses import dataclass
-from itertools import product
-from multiprocessing.pool import Pool
-import subprocess
+from typing import Self, Callable, Iterable
+from dataclasses import dataclass, field
+from itertools import islice
+import socket
+import tempfile
+from ml_experiment.execution.async_executor import AsyncSubprocessExecutor, Launch
+from ml_experiment.execution.batch import encode_runs, get_batch_command, make_batches, read_status
+from ml_experiment.execution.dispatch import Executor, dispatch
+from ml_experiment.execution.resources import ResourceManager, Resources
+from ml_experiment.execution.run_set import RunSet
+from ml_experiment.execution.run_space import RunSpace
+from ml_experiment.execution.sharding import assign_by_cost
+from ml_experiment.execution.telemetry import Progress, Telemetry, get_profile_path, get_profiled_command
+import ml_experiment.execution.slurm as slurm
+from ml_experiment.execution.types import RunResult, RunSpec
+from ml_experiment.execution.worker_pool import DEFAULT_ENTRY_FUNCTION, WorkerPool
+from ml_experiment.metadata.metadata_table import MetadataTable
 from ml_experiment.metadata.metadata_table_registry import MetadataTableRegistry
-
-class RunSpec(NamedTuple):
-    part_name: str
-    version: int
-    config_id: int
-    seed: int
+from ml_experiment.metadata.query import Where
+import ml_experiment.metadata.run_history as run_history
+import ml_experiment.metadata.run_ledger as run_ledger
+import ml_experiment._utils.sqlite as sqlu
 
 
 @dataclass
@@ -28,11 +38,94 @@ class RunConfig:
 class LocalRunConfig(RunConfig):
     tasks_in_parallel: int
 
-    log_path: str = ".logs/"
+    # stdout and stderr of every run are written to `<log_path>/<exp_name>/`,
+    # or go to the terminal when this is None
+    # runs imported in-process always write to the terminal
+    log_path: str | None = ".logs/"
+    compress_logs: bool = False
+
+    # import the entry script once per long-lived worker process
+    # and call its `entry_function` for every run, instead of
+    # starting a new interpreter per run
+    in_process: bool = False
+    entry_function: str = DEFAULT_ENTRY_FUNCTION
+
+    # pack several runs into each invocation of the entry script,
+    # limited by count and/or by estimated seconds of work
+    # see ml_experiment.execution.batch for the protocol the entry must follow
+    runs_per_invocation: int | None = None
+    invocation_time_budget: float | None = None
+
+    # expected seconds per run for runs without any recorded history
+    estimated_run_time: float = 1.0
+
+    # threads that numeric libraries may use in every run, and MiB of memory
+    # every run needs, or a function declaring both per run
+    # in-process workers outlive their runs, so they only limit numeric
+    # libraries to `threads_per_run`, and per-run threads only gate admission
+    threads_per_run: int | None = None
+    memory_per_run: float = 0.0
+    resources: Callable[[RunSpec], Resources] | None = None
+
+    # when resources are declared, runs are only started while their threads
+    # and memory fit the machine and the load average is at most `max_load`
+    # `memory_limit` defaults to the memory available at launch, in MiB
+    pin_cpus: bool = False
+    memory_limit: float | None = None
+    max_load: float | None = None
+
+    # called after every finished run
+    on_progress: Callable[[Progress], None] | None = None
+
+    # every run's queue wait, wall and CPU time, peak memory and exit code,
+    # and a summary of the launch, are written here after the launch
+    # as a CSV of runs when the path ends in `.csv`, and as JSON otherwise
+    report_path: str | None = None
+
+    # runs for which `profile` is true are run under `profiler`, "cprofile"
+    # or "py-spy" (which must be installed, and cannot profile in-process runs),
+    # and their profiles are saved next to their logs
+    profile: Callable[[RunSpec], bool] | None = None
+    profiler: str = "cprofile"
+
+
+# runs are submitted as a single job array, see ml_experiment.execution.slurm
+# `Scheduler.run` gives back as soon as the job is submitted, and the tasks
+# record their outcomes in the run ledger
+@dataclass
+class SlurmRunConfig(RunConfig):
+    # seconds of wall time and number of cores of every array task
+    wall_time: float
+    cores: int = 1
+
+    # fraction of the wall time that runs are packed into,
+    # leaving room for run times that exceed their estimate
+    fill: float = 0.9
+
+    # directory that a subdirectory with the submission script,
+    # task manifests and task logs is created in
+    job_dir: str = ".slurm/"
+
+    # extra `#SBATCH` options (e.g. "--account=...") and shell lines
+    # run on the node before the runs start (e.g. activating a venv)
+    sbatch_options: list[str] = field(default_factory=list)
+    setup: list[str] = field(default_factory=list)
+
+    # command used to submit the job
+    sbatch: str = "sbatch"
+
+    # most tasks submitted in one array, which slurm's MaxArraySize
+    # caps; larger sweeps are split across several arrays
+    max_array_size: int = slurm.DEFAULT_MAX_ARRAY_SIZE
+
+    in_process: bool = False
+    entry_function: str = DEFAULT_ENTRY_FUNCTION
+    estimated_run_time: float = 1.0
 
 
 
 Pred = Callable[[str, int, int, int], bool]
+BatchPred = Callable[[RunSet | RunSpace], Iterable[bool]]
 VersionSpec = int | dict[str, int | None] | None
 
 class Scheduler:
@@ -44,28 +137,56 @@ class Scheduler:
         self.results_path = os.path.join(self.base_path, 'results', self.exp_name)
         self.version = version if version is not None else -1
 
-        self.all_runs = set[RunSpec]() # TODO: polars dataframe!
+        self.all_runs: RunSet | RunSpace = RunSet()
 
         self._sanity_check()
 
     def __repr__(self):
         return f'Scheduler({self.exp_name}, {self.seeds}, {self.version}, {self.all_runs})'
 
-    def get_all_runs(self) -> Self:
+    def get_all_runs(self, lazy: bool = False, where: Where | None = None) -> Self:
+        """
+        Enumerates every (configuration, seed) pair of the resolved versions.
+        With `lazy=True` the runs are kept in factored form as a RunSpace,
+        which is numbered deterministically and never materialized, and
+        is started in that order instead of longest-first.
+
+        With `where`, only configurations satisfying it are enumerated, see
+        `ExperimentDefinition.query_ids`. The selection is made in SQL, and
+        parts without every queried property are left out.
+        """
         meta = MetadataTableRegistry()
 
         table_path = os.path.join(self.results_path, 'metadata.db')
 
-        with sqlite3.connect(table_path) as con:
+        with sqlu.connect(table_path, readonly=True) as con:
             cur = con.cursor()
             parts = meta.get_parts(cur)
             resloved_ver = self._resolve_version(parts, cur, meta)
 
+            tables = []
             for k, v in resloved_ver.items():
                 t = meta.get_table(cur, k, v)
                 assert t is not None
-                config_ids = t.get_configuration_ids(cur)
-                self.all_runs |= {RunSpec(k, v, c, s) for c, s in product(config_ids, self.seeds)}
+                tables.append(t)
+
+            if where is not None:
+                tables = [t for t in tables if set(where) <= t.get_configuration_columns(cur)]
+                if not tables:
+                    raise ValueError(f'No part of {self.exp_name} has every property in <{sorted(where)}>')
+
+            if lazy:
+                self.all_runs = RunSpace(
+                    (t.part_name, t.version, _get_config_ids(cur, t, where), self.seeds)
+                    for t in sorted(tables, key=lambda t: t.part_name)
+                )
+                return self
+
+            runs = RunSet()
+            for t in tables:
+                runs |= RunSet.from_product(t.part_name, t.version, _get_config_ids(cur, t, where), self.seeds)
+
+            self.all_runs = runs
 
         return self
 
@@ -73,32 +194,307 @@ class Scheduler:
     def filter(self, already_exists: Pred) -> Scheduler:
         filtered = Scheduler(self.exp_name, self.seeds, self.entry, self.version, self.base_path)
 
-        for r in self.all_runs:
-            if not already_exists(*r):
-                filtered.all_runs.add(r)
+        filtered.all_runs = self.all_runs.filter(not already_exists(*r) for r in self.all_runs)
+        return filtered
+
+
+    def filter_batch(self, already_exist: BatchPred) -> Scheduler:
+        """
+        Like `filter`, but the predicate is asked about every run at once
+        and gives back one flag per run, in order. See
+        `ExistenceIndex.predicate` for a predicate backed by a single
+        walk of the results directory.
+        """
+        filtered = Scheduler(self.exp_name, self.seeds, self.entry, self.version, self.base_path)
+
+        exists = already_exist(self.all_runs)
+        filtered.all_runs = self.all_runs.filter(not e for e in exists)
 
         return filtered
 
 
-    def run(self, c: RunConfig) -> None:
-        type(c)
+    def remaining(self, retry_failed: bool = True) -> Scheduler:
+        """
+        Drops every run that the run ledger records as done, using a single
+        indexed query per part. Failed runs are kept unless `retry_failed=False`,
+        and runs that were in progress when a previous launch died are kept.
+        """
+        filtered = Scheduler(self.exp_name, self.seeds, self.entry, self.version, self.base_path)
+
+        table_path = os.path.join(self.results_path, 'metadata.db')
+        with sqlu.connect(table_path, readonly=True) as con:
+            cur = con.cursor()
+
+            skip = RunSet()
+            for part, version in self.all_runs.get_groups():
+                done = run_ledger.get_runs_with_status(cur, part, version, run_ledger.DONE)
+                if not retry_failed:
+                    done |= run_ledger.get_runs_with_status(cur, part, version, run_ledger.FAILED)
+
+                skip |= RunSet(RunSpec(part, version, c, s) for c, s in done)
+
+        filtered.all_runs = self.all_runs - skip
+        return filtered
+
+
+    def shard(self, index: int, count: int, balance: str = 'count', estimated_run_time: float = 1.0) -> Scheduler:
+        """
+        The `index`-th of `count` disjoint subsets of the runs, which together
+        cover every run. Shards only depend on the runs themselves, so every
+        host computes the same split without coordinating.
+
+        With `balance='count'` runs are dealt out round-robin in (part, version,
+        config_id, seed) order; a lazy run space is sliced without enumerating it.
+        With `balance='cost'` runs are spread by expected duration from the run
+        history, which then must be the same on every host.
+        """
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f'shard index {index} is out of range for {count} shards')
+
+        sharded = Scheduler(self.exp_name, self.seeds, self.entry, self.version, self.base_path)
+
+        if balance == 'count':
+            # a run space is already numbered deterministically
+            runs = self.all_runs if isinstance(self.all_runs, RunSpace) else self.all_runs.sort()
+            sharded.all_runs = runs[index::count]
+
+        elif balance == 'cost':
+            runs = self.all_runs.to_run_set() if isinstance(self.all_runs, RunSpace) else self.all_runs
+            runs = runs.sort()
+
+            db_path = os.path.join(self.results_path, 'metadata.db')
+            with sqlu.connect(db_path, readonly=True) as con:
+                estimator = run_history.RuntimeEstimator(con.cursor(), default=estimated_run_time)
+                shards = assign_by_cost([estimator.estimate(r) for r in runs], count)
+
+            sharded.all_runs = runs.filter(s == index for s in shards)
+
+        else:
+            raise ValueError(f'Unknown shard balance <{balance}>')
+
+        return sharded
+
+
+    def run(self, c: RunConfig) -> list[RunResult]:
         if isinstance(c, LocalRunConfig):
-            self._run_local(c)
+            return self._run_local(c)
+        elif isinstance(c, SlurmRunConfig):
+            # results are recorded by the array tasks, use `submit` for
+            # a handle on the submitted job
+            self.submit(c)
+            return []
         else:
             raise ValueError('Unknown RunConfig type')
 
 
+    def submit(self, c: SlurmRunConfig) -> slurm.Submission:
+        """
+        Packs the runs into job arrays of at most `c.max_array_size` tasks
+        and submits them. Results are not waited for, and are recorded in
+        the run ledger by the tasks as they finish. Gives back the
+        directory holding the job's files and the id of every array.
+        """
+        if c.max_array_size < 1:
+            raise ValueError(f'max_array_size must be at least 1, got {c.max_array_size}')
+
+        db_path = os.path.join(self.results_path, 'metadata.db')
+        con = sqlu.connect(db_path)
+        try:
+            sqlu.write_transaction(con, _ensure_tables)
+
+            estimator = run_history.RuntimeEstimator(con.cursor(), default=c.estimated_run_time)
+            runs = list(self.all_runs)
+            tasks = slurm.pack_tasks(runs, estimator.estimate, c.wall_time * c.fill, c.cores)
+
+            _mark_pending(con, runs)
+        finally:
+            con.close()
+
+        os.makedirs(c.job_dir, exist_ok=True)
+        job_dir = os.path.abspath(tempfile.mkdtemp(prefix=f'{self.exp_name}-', dir=c.job_dir))
+
+        slurm.write_manifests(job_dir, tasks, {
+            'exp_name': self.exp_name,
+            'entry': self.entry,
+            'base': self.base_path,
+            'cores': c.cores,
+            'in_process': c.in_process,
+            'entry_function': c.entry_function,
+            'estimated_run_time': c.estimated_run_time,
+        })
+
+        job_ids: list[str] = []
+        for first in range(0, len(tasks), c.max_array_size):
+            n = min(c.max_array_size, len(tasks) - first)
+            script = slurm.write_submission(job_dir, self.exp_name, n, c.wall_time, c.cores, c.sbatch_options, c.setup, first)
+            job_ids.append(slurm.submit(c.sbatch, script))
+
+        return slurm.Submission(job_dir, job_ids)
+
+
     # ----------------------
     # -- Internal Methods --
     # ----------------------
 
-    def _run_local(self, c: LocalRunConfig) -> None:
-        pool = Pool(c.tasks_in_parallel)
-        pool.map(self._run_single, self.all_runs)
+    def _run_local(self, c: LocalRunConfig) -> list[RunResult]:
+        if c.tasks_in_parallel < 1:
+            raise ValueError(f'tasks_in_parallel must be at least 1, got {c.tasks_in_parallel}')
+
+        db_path = os.path.join(self.results_path, 'metadata.db')
+        con = sqlu.connect(db_path)
+        cur = con.cursor()
+
+        try:
+            # start the runs that are expected to take longest first
+            # so that a long run does not end up alone at the tail
+            sqlu.write_transaction(con, _ensure_tables)
+            estimator = run_history.RuntimeEstimator(cur, default=c.estimated_run_time)
+
+            runs: Iterable[RunSpec]
+            if isinstance(self.all_runs, RunSpace):
+                # a lazy run space is streamed in order, so that the first
+                # runs can start without enumerating the rest
+                runs = iter(self.all_runs)
+            else:
+                runs = list(self.all_runs.sort(key=lambda r: (-estimator.estimate(r), r)))
+
+                # record the whole launch up front, so that the ledger
+                # knows about runs that never got started if this process dies
+                _mark_pending(con, runs)
+
+            host = socket.gethostname()
+            telemetry = Telemetry(c.tasks_in_parallel, len(self.all_runs), c.on_progress)
+
+            # every ledger update is its own short transaction, so that
+            # other schedulers and a committing writer are never held up for long
+            def _start(job: list[RunSpec]):
+                sqlu.write_transaction(con, lambda cur: run_ledger.mark_running(cur, job, host))
+                telemetry.on_start(job)
+
+            def _record(res: RunResult):
+                def _write(cur: sqlite3.Cursor):
+                    run_history.record_durations(cur, [res])
+                    run_ledger.mark_finished(cur, [res])
+
+                sqlu.write_transaction(con, _write)
+                telemetry.on_result(res)
+
+            executor = self._get_executor(c)
+            try:
+                results = dispatch(
+                    executor,
+                    self._get_jobs(c, runs, estimator),
+                    on_result=_record,
+                    on_start=_start,
+                    resources=self._get_resource_manager(c),
+                )
+            finally:
+                executor.close()
+
+            if c.report_path is not None:
+                telemetry.write_report(c.report_path)
+
+            return results
+
+        finally:
+            con.close()
+
+
+    def _get_executor(self, c: LocalRunConfig) -> Executor:
+        if c.profile is not None:
+            os.makedirs(self._get_log_dir(c), exist_ok=True)
+
+        if c.in_process:
+            if c.profile is not None and c.profiler != 'cprofile':
+                raise ValueError(f'In-process runs can only be profiled with cprofile, not <{c.profiler}>')
+
+            def _profile(r: RunSpec) -> str | None:
+                if c.profile is None or not c.profile(r):
+                    return None
+
+                return get_profile_path(self._get_log_dir(c), _get_log_name(r), c.profiler)
+
+            return WorkerPool(self.entry, c.tasks_in_parallel, self.results_path, c.entry_function, c.threads_per_run, _profile)
+
+        log_path = self._get_log_dir(c) if c.log_path is not None else None
+        if c.runs_per_invocation is None and c.invocation_time_budget is None:
+            return AsyncSubprocessExecutor(c.tasks_in_parallel, lambda runs: self._launch_single(c, runs), log_path, c.compress_logs)
+
+        return AsyncSubprocessExecutor(c.tasks_in_parallel, lambda runs: self._launch_batch(c, runs), log_path, c.compress_logs)
+
+
+    def _get_log_dir(self, c: LocalRunConfig) -> str:
+        # profiles are kept in the default log directory when logs are not
+        return os.path.join(c.log_path if c.log_path is not None else '.logs/', self.exp_name)
 
 
-    def _run_single(self, r: RunSpec) -> None:
-        subprocess.run(['python', self.entry, '--part', r.part_name, '--config-id', str(r.config_id), '--seed', str(r.seed), '--version', str(r.version), '--results-path', self.results_path])
+    def _get_jobs(self, c: LocalRunConfig, runs: Iterable[RunSpec], estimator: run_history.RuntimeEstimator) -> Iterable[list[RunSpec]]:
+        if c.in_process or (c.runs_per_invocation is None and c.invocation_time_budget is None):
+            return ([r] for r in runs)
+
+        return make_batches(
+            runs,
+            max_runs=c.runs_per_invocation or sys.maxsize,
+            time_budget=c.invocation_time_budget,
+            estimate=estimator.estimate,
+        )
+
+
+    def _get_resource_manager(self, c: LocalRunConfig) -> ResourceManager | None:
+        declared = (
+            c.threads_per_run is not None
+            or c.memory_per_run > 0
+            or c.resources is not None
+            or c.pin_cpus
+            or c.memory_limit is not None
+            or c.max_load is not None
+        )
+        if not declared:
+            return None
+
+        default = Resources(c.threads_per_run, c.memory_per_run)
+        return ResourceManager(
+            c.resources or (lambda r: default),
+            pin_cpus=c.pin_cpus,
+            memory_limit=c.memory_limit,
+            max_load=c.max_load,
+        )
+
+
+    def _launch_single(self, c: LocalRunConfig, runs: list[RunSpec]) -> Launch:
+        # every run is its own invocation unless runs are batched
+        assert len(runs) == 1
+        r = runs[0]
+
+        args = ['python', self.entry, '--part', r.part_name, '--config-id', str(r.config_id), '--seed', str(r.seed), '--version', str(r.version), '--results-path', self.results_path]
+        name = _get_log_name(r)
+        return Launch(self._get_profiled_command(c, runs, name, args), name)
+
+
+    def _launch_batch(self, c: LocalRunConfig, runs: list[RunSpec]) -> Launch:
+        fd, status_path = tempfile.mkstemp(prefix='ml_experiment_status_', suffix='.jsonl')
+        os.close(fd)
+
+        def _collect(exit_code: int, duration: float, error: str | None) -> list[RunResult]:
+            return read_status(status_path, runs, exit_code, error)
+
+        def _cleanup():
+            # also reached when the batch is cancelled before it is collected
+            if os.path.exists(status_path):
+                os.remove(status_path)
+
+        cmd = get_batch_command(self.entry, self.results_path, status_path)
+        name = f'{_get_log_name(runs[0])}+{len(runs) - 1}'
+        return Launch(self._get_profiled_command(c, runs, name, cmd), name, encode_runs(runs).encode(), _collect, _cleanup)
+
+
+    def _get_profiled_command(self, c: LocalRunConfig, runs: list[RunSpec], name: str, cmd: list[str]) -> list[str]:
+        # a batch is profiled as a whole when any of its runs is selected
+        if c.profile is None or not any(c.profile(r) for r in runs):
+            return cmd
+
+        path = get_profile_path(self._get_log_dir(c), name, c.profiler)
+        return get_profiled_command(cmd, path, c.profiler)
 
 
     def _resolve_version(
@@ -130,3 +526,24 @@ class Scheduler:
         assert os.path.exists(res_path), f'{res_path}: {self.exp_name} does not exist'
 
 
+def _get_config_ids(cur: sqlite3.Cursor, t: MetadataTable, where: Where | None) -> Iterable[int]:
+    if where is None:
+        return t.get_configuration_ids(cur)
+
+    return t.query_ids(cur, where)
+
+
+def _ensure_tables(cur: sqlite3.Cursor):
+    run_history.ensure_history(cur)
+    run_ledger.ensure_ledger(cur)
+
+
+def _mark_pending(con: sqlite3.Connection, runs: Iterable[RunSpec], chunk_size: int = 10_000):
+    # many short transactions rather than one long one per launch
+    it = iter(runs)
+    while chunk := list(islice(it, chunk_size)):
+        sqlu.write_transaction(con, lambda cur: run_ledger.mark_pending(cur, chunk))
+
+
+def _get_log_name(r: RunSpec) -> str:
+    return f'{r.part_name}-{r.version}-{r.config_id}-{r.seed}'
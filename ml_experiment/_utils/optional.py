@@ -0,0 +1,17 @@
+from types import ModuleType
+
+
+def try_import_numpy() -> ModuleType | None:
+    try:
+        import numpy as np
+        return np
+    except ImportError:
+        return None
+
+
+def require_numpy() -> ModuleType:
+    np = try_import_numpy()
+    if np is None:
+        raise ImportError('numpy is required for this feature. Install it with `pip install ml-experiment-definition[numpy]`')
+
+    return np
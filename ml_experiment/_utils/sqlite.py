@@ -1,7 +1,21 @@
 import os
+import random
 import sqlite3
+import time
+import urllib.parse
 
-from typing import Set, List
+from typing import Callable, Set, List, TypeVar
+
+T = TypeVar('T')
+
+# seconds that sqlite itself waits on a lock before giving up
+DEFAULT_BUSY_TIMEOUT = 30.0
+
+# set to 0 or 1 to force the journal mode instead of detecting it
+WAL_ENV_VAR = 'ML_EXPERIMENT_SQLITE_WAL'
+
+# filesystems that cannot share the WAL index between hosts
+_NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'lustre', 'gpfs', 'beegfs', 'fuse.sshfs', '9p'}
 
 # --------------
 # -- Creation --
@@ -11,16 +25,128 @@ def create_table(cur: sqlite3.Cursor, table_name: str, columns: List[str]):
     columns_str = ', '.join(columns)
     cur.execute(f"CREATE TABLE '{table_name}' ({columns_str})")
 
+def create_index(cur: sqlite3.Cursor, index_name: str, table_name: str, columns: List[str]):
+    columns_str = ', '.join(columns)
+    cur.execute(f"CREATE INDEX IF NOT EXISTS '{index_name}' ON '{table_name}' ({columns_str})")
+
 def init_db(db_path: str):
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    con = sqlite3.connect(db_path)
+    con = connect(db_path)
     return con
 
 
+# -----------------
+# -- Connections --
+# -----------------
+
+def connect(db_path: str, readonly: bool = False, timeout: float = DEFAULT_BUSY_TIMEOUT) -> sqlite3.Connection:
+    """
+    Opens a database with the connection policy used throughout this library.
+    Every connection waits up to `timeout` seconds on locks. Writable
+    connections switch the database to WAL, so that readers never block
+    the writer or each other, unless it lives on a network filesystem.
+    Read-only connections cannot take write locks at all.
+    """
+    if readonly:
+        uri = f'file:{urllib.parse.quote(os.path.abspath(db_path))}?mode=ro'
+        return sqlite3.connect(uri, uri=True, timeout=timeout)
+
+    con = sqlite3.connect(db_path, timeout=timeout)
+    if use_wal(db_path):
+        retry_busy(lambda: enable_wal(con))
+
+    return con
+
+def enable_wal(con: sqlite3.Connection) -> bool:
+    # the journal mode is stored in the database, so this only changes anything once
+    mode = con.execute('PRAGMA journal_mode').fetchone()[0]
+    if mode != 'wal':
+        mode = con.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+
+    return mode == 'wal'
+
+def use_wal(db_path: str) -> bool:
+    forced = os.environ.get(WAL_ENV_VAR)
+    if forced is not None:
+        return forced.lower() not in ('0', 'false', 'no', '')
+
+    return get_filesystem_type(db_path) not in _NETWORK_FILESYSTEMS
+
+def get_filesystem_type(path: str) -> str | None:
+    # the type of the longest mount point containing `path`, where /proc is available
+    try:
+        with open('/proc/self/mounts', 'r') as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return None
+
+    path = os.path.realpath(os.path.dirname(os.path.abspath(path)))
+    best = ('', None)
+    for mount_point, fs_type in mounts:
+        mount_point = mount_point.replace('\\040', ' ')
+        inside = path == mount_point or path.startswith(mount_point.rstrip('/') + '/')
+        if inside and len(mount_point) > len(best[0]):
+            best = (mount_point, fs_type)
+
+    return best[1]
+
+
+# ------------------
+# -- Transactions --
+# ------------------
+
+def is_busy(e: sqlite3.OperationalError) -> bool:
+    code = getattr(e, 'sqlite_errorcode', None)
+    if code is None:
+        return 'locked' in str(e) or 'busy' in str(e)
+
+    # extended result codes keep the primary code in the low byte
+    return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+def retry_busy(fn: Callable[[], T], attempts: int = 10, delay: float = 0.05) -> T:
+    """
+    Calls `fn`, retrying with jittered exponential backoff while the
+    database stays locked past the busy timeout. The jitter keeps many
+    processes that hit the same lock from retrying in lockstep.
+    """
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except sqlite3.OperationalError as e:
+            if not is_busy(e) or attempt == attempts - 1:
+                raise
+
+            time.sleep(random.uniform(0, delay * 2 ** attempt))
+
+    raise AssertionError('unreachable')
+
+def write_transaction(con: sqlite3.Connection, fn: Callable[[sqlite3.Cursor], T]) -> T:
+    """
+    Runs `fn` in its own short write transaction, which takes the write
+    lock up front so it cannot deadlock with another writer part way through.
+    """
+    def _attempt():
+        cur = con.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            out = fn(cur)
+            con.commit()
+            return out
+        except BaseException:
+            con.rollback()
+            raise
+
+    return retry_busy(_attempt)
+
+
 # -------------
 # -- Getters --
 # -------------
 
 def get_tables(cur: sqlite3.Cursor) -> Set[str]:
-    res = cur.execute("SELECT name FROM sqlite_master")
+    res = cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    return set(r[0] for r in res.fetchall())
+
+def get_views(cur: sqlite3.Cursor) -> Set[str]:
+    res = cur.execute("SELECT name FROM sqlite_master WHERE type='view'")
     return set(r[0] for r in res.fetchall())
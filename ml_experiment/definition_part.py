@@ -1,15 +1,34 @@
+import inspect
 import os
-from itertools import product
+import sqlite3
+from itertools import islice, product
 
-from typing import Dict, Iterable, Set
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Set, Tuple
 from collections import defaultdict
 
 import ml_experiment._utils.sqlite as sqlu
 from ml_experiment._utils.path import get_results_path
+from ml_experiment.metadata.fingerprint import function_digest, sweep_digest
 from ml_experiment.metadata.metadata_table_registry import MetadataTableRegistry
 
 ValueType = int | float | str | bool
 
+# number of configurations resolved and inserted at a time during commit
+DEFAULT_CHUNK_SIZE = 10_000
+
+
+class Condition(NamedTuple):
+    # the property is swept while every property in `when` has one of its allowed values
+    when: Dict[str, Set[ValueType]]
+    otherwise: ValueType
+
+
+class Constraint(NamedTuple):
+    fn: Callable[..., bool]
+    # the properties passed to `fn`, named by its parameters
+    keys: Tuple[str, ...]
+
+
 class DefinitionPart:
     def __init__(self, name: str, base: str | None = None):
         self.name = name
@@ -18,6 +37,8 @@ class DefinitionPart:
 
         self._properties: Dict[str, Set[ValueType]] = defaultdict(set)
         self._prior_values: Dict[str, ValueType] = {}
+        self._conditions: Dict[str, Condition] = {}
+        self._constraints: List[Constraint] = []
 
     def add_property(
         self,
@@ -41,9 +62,55 @@ class DefinitionPart:
         if assume_prior_value is not None:
             self._prior_values[key] = assume_prior_value
 
-    def commit(self):
-        configurations = list(generate_configurations(self._properties))
+    def add_conditional_property(
+        self,
+        key: str,
+        values: Iterable[ValueType],
+        when: Dict[str, ValueType | Iterable[ValueType]],
+        otherwise: ValueType,
+        assume_prior_value: ValueType | None = None,
+    ):
+        """
+        A property that is only swept in configurations where every property
+        in `when` has the given value (or one of the given values), and is
+        `otherwise` everywhere else, e.g.
+
+            part.add_sweepable_property('trace', [True, False])
+            part.add_conditional_property('lambda', [0.5, 0.9], when={'trace': True}, otherwise=0.0)
+
+        The properties in `when` must be added first, and can themselves be conditional.
+        """
+        missing = [k for k in when if k not in self._properties]
+        if missing:
+            raise ValueError(f'<{key}> depends on properties that are not defined yet: {missing}')
+
+        allowed = {
+            k: set(v) if isinstance(v, Iterable) and not isinstance(v, str) else {v}
+            for k, v in when.items()
+        }
+        self._conditions[key] = Condition(allowed, otherwise)
+        self.add_sweepable_property(key, values, assume_prior_value)
+
+    def add_constraint(self, constraint: Callable[..., bool]):
+        """
+        Only keeps configurations for which `constraint` is true. It is called
+        with the properties named by its parameters, e.g.
+
+            part.add_constraint(lambda alpha, tau: alpha * tau <= 1)
 
+        Constraints are checked as soon as their properties are chosen while
+        generating the sweep, so rejected branches are never enumerated.
+        """
+        keys = tuple(inspect.signature(constraint).parameters)
+        self._constraints.append(Constraint(constraint, keys))
+
+    def commit(self, chunk_size: int = DEFAULT_CHUNK_SIZE, compact: bool = False):
+        """
+        Writes the sweep as a new version, unless it has exactly the same
+        configurations as the latest version. With `compact` the version
+        stores only the values of every property, and configurations are
+        decoded from their ids, see ml_experiment.metadata.compact.
+        """
         save_path = self.get_results_path(self.base_path)
         db_path = os.path.join(save_path, 'metadata.db')
         con = sqlu.init_db(db_path)
@@ -51,43 +118,116 @@ class DefinitionPart:
 
         table_registry = MetadataTableRegistry()
 
-        # tag configurations with the appropriate configuration id
-        # grabbing from prior tables where possible, or generating a unique id for new configs
-        next_config_id = table_registry.get_max_configuration_id(cur, self.name) + 1
-        for configuration in configurations:
-            config_query = self._get_configuration_without_priors(configuration)
+        # if the latest table was built from exactly this definition
+        # then there is nothing to do, and no configurations need to be generated
+        digest = self._get_digest()
+        latest_table = table_registry.get_latest_version(cur, self.name)
+        if latest_table is not None and table_registry.get_digest(cur, self.name, latest_table.version) == digest:
+            # persist the catalog in case it was just rebuilt from a legacy database
+            con.commit()
+            con.close()
+            return
 
-            configuration['id'] = (
-                table_registry.get_configuration_id(cur, self.name, configuration)
-                    .flat_otherwise(lambda: table_registry.get_configuration_id(cur, self.name, config_query))
-                    .or_else(next_config_id)
-            )
+        con.commit()
 
-            if configuration['id'] == next_config_id:
-                next_config_id += 1
+        # the new table is built in a single transaction
+        # if it turns out to be identical to the latest table, we roll it back
+        # the write lock is taken up front, so a concurrent writer
+        # waits for it rather than failing part way through the build
+        sqlu.retry_busy(lambda: cur.execute('BEGIN IMMEDIATE'))
 
-        # determine whether we should build a new table
-        # and what version to call that table
+        # another writer may have committed while we waited for the lock
+        # so read the latest version again, bypassing anything cached before the lock was held
+        table_registry = MetadataTableRegistry()
+        table_registry.migrate(cur)
         latest_table = table_registry.get_latest_version(cur, self.name)
+        if latest_table is not None and table_registry.get_digest(cur, self.name, latest_table.version) == digest:
+            con.commit()
+            con.close()
+            return
 
+        # determine what version to call the new table
         next_table_version = 0
-        skip_build = False
         if latest_table is not None:
             next_table_version = latest_table.version + 1
 
-            # check if the current latest table contains exactly the same configs
-            expected_config_ids = set(c['id'] for c in configurations)
-            current_config_ids = latest_table.get_configuration_ids(cur)
+        next_config_id = table_registry.get_max_configuration_id(cur, self.name) + 1
+        if compact:
+            table = table_registry.create_compact_table(cur, self.name, next_table_version, self._get_axes(), digest)
+        else:
+            table = table_registry.create_new_table(cur, self.name, next_table_version, self._properties.keys(), digest)
+
+        # stream configurations through id resolution and insertion in fixed-size chunks
+        # so that memory does not grow with the size of the sweep
+        configurations = generate_configurations(self._properties, self._conditions, self._constraints)
+        for chunk in chunked(configurations, chunk_size):
+            next_config_id = self._assign_configuration_ids(cur, table_registry, chunk, next_table_version, next_config_id)
+            table.add_configurations(cur, chunk)
 
-            skip_build = expected_config_ids == current_config_ids
+        # check if the current latest table contains exactly the same configs
+        skip_build = latest_table is not None and table.has_same_configuration_ids(cur, latest_table)
 
-        if not skip_build:
-            table = table_registry.create_new_table(cur, self.name, next_table_version, self._properties.keys())
-            table.add_configurations(cur, configurations)
+        if skip_build:
+            # remember that this definition produces the latest table
+            # so that the next commit can return immediately
+            assert latest_table is not None
+            con.rollback()
+            table_registry.set_digest(cur, self.name, latest_table.version, digest)
 
         con.commit()
+
         con.close()
 
+    def _get_axes(self) -> Dict[str, List[ValueType]]:
+        # in the order configurations are generated, so that a whole grid is a single run of ids
+        axes = {k: list(values) for k, values in self._properties.items()}
+        for k, condition in self._conditions.items():
+            if condition.otherwise not in self._properties[k]:
+                axes[k].append(condition.otherwise)
+
+        return axes
+
+    def _get_digest(self) -> str:
+        conditions = {k: (c.when, c.otherwise) for k, c in self._conditions.items()}
+        if not self._constraints:
+            return sweep_digest(self._properties, self._prior_values, conditions)
+
+        # constraints are identified by what they compute, so that the sweep never needs to be generated
+        selection = ';'.join(f"{','.join(c.keys)}:{function_digest(c.fn)}" for c in self._constraints)
+        return sweep_digest(self._properties, self._prior_values, conditions, selection)
+
+    def _assign_configuration_ids(
+        self,
+        cur: sqlite3.Cursor,
+        table_registry: MetadataTableRegistry,
+        configurations: List[Dict[str, ValueType]],
+        version: int,
+        next_config_id: int,
+    ) -> int:
+        """
+        Tag configurations with the appropriate configuration id, grabbing
+        from tables prior to `version` where possible, or generating a unique
+        id for new configs. Returns the next unused configuration id.
+        """
+        config_ids = table_registry.lookup_configuration_ids(cur, self.name, configurations, max_version=version - 1)
+
+        # configurations that were not found might exist without their assumed prior values
+        missing = [i for i, conf_id in enumerate(config_ids) if conf_id is None]
+        queries = [self._get_configuration_without_priors(configurations[i]) for i in missing]
+        prior_ids = table_registry.lookup_configuration_ids(cur, self.name, queries, max_version=version - 1)
+
+        for i, conf_id in zip(missing, prior_ids, strict=True):
+            config_ids[i] = conf_id
+
+        for configuration, conf_id in zip(configurations, config_ids, strict=True):
+            if conf_id is None:
+                conf_id = next_config_id
+                next_config_id += 1
+
+            configuration['id'] = conf_id
+
+        return next_config_id
+
     def _get_configuration_without_priors(self, configuration: Dict[str, ValueType]):
         """
         When a new property is introduced that has an assumed prior value,
@@ -107,6 +247,73 @@ class DefinitionPart:
         return out
 
 
-def generate_configurations(properties: Dict[str, Set[ValueType]]):
-    for configuration in product(*properties.values()):
-        yield dict(zip(properties.keys(), configuration, strict=True))
+def generate_configurations(
+    properties: Dict[str, Set[ValueType]],
+    conditions: Dict[str, Condition] | None = None,
+    constraints: Iterable[Constraint] = (),
+) -> Iterator[Dict[str, ValueType]]:
+    constraints = list(constraints)
+    if not conditions and not constraints:
+        for configuration in product(*properties.values()):
+            yield dict(zip(properties.keys(), configuration, strict=True))
+        return
+
+    yield from _generate_pruned(properties, conditions or {}, constraints)
+
+
+def _generate_pruned(
+    properties: Dict[str, Set[ValueType]],
+    conditions: Dict[str, Condition],
+    constraints: List[Constraint],
+) -> Iterator[Dict[str, ValueType]]:
+    # a depth-first walk of the product in the same order as `product`, choosing
+    # one property per level, so that a branch is cut as soon as a condition
+    # collapses it or a constraint rejects it
+    keys = list(properties)
+    depth_of = {k: i for i, k in enumerate(keys)}
+
+    for key, condition in conditions.items():
+        if any(depth_of[k] >= depth_of[key] for k in condition.when):
+            raise ValueError(f'<{key}> must be defined after the properties it depends on')
+
+    # every constraint is checked at the level where its last property is chosen
+    checks: List[List[Constraint]] = [[] for _ in keys]
+    for c in constraints:
+        unknown = [k for k in c.keys if k not in depth_of]
+        if unknown:
+            raise ValueError(f'Constraint {c.fn} refers to undefined properties {unknown}')
+
+        if not c.keys:
+            if not c.fn():
+                return
+            continue
+
+        checks[max(depth_of[k] for k in c.keys)].append(c)
+
+    options = [list(properties[k]) for k in keys]
+    configuration: Dict[str, Any] = {}
+
+    def _fill(depth: int) -> Iterator[Dict[str, ValueType]]:
+        if depth == len(keys):
+            yield dict(configuration)
+            return
+
+        key = keys[depth]
+        values = options[depth]
+
+        condition = conditions.get(key)
+        if condition is not None and not all(configuration[k] in allowed for k, allowed in condition.when.items()):
+            values = [condition.otherwise]
+
+        for v in values:
+            configuration[key] = v
+            if all(c.fn(**{k: configuration[k] for k in c.keys}) for c in checks[depth]):
+                yield from _fill(depth + 1)
+
+    yield from _fill(0)
+
+
+def chunked(configurations: Iterable[Dict[str, ValueType]], size: int) -> Iterator[List[Dict[str, ValueType]]]:
+    it = iter(configurations)
+    while chunk := list(islice(it, size)):
+        yield chunk
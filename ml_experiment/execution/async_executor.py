@@ -0,0 +1,242 @@
+import asyncio
+import gzip
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Any, Callable, Dict, List, NamedTuple, Tuple
+
+from ml_experiment.execution.resources import Placement
+from ml_experiment.execution.telemetry import get_usage
+from ml_experiment.execution.types import RunResult, RunSpec
+
+# bytes read from a child's pipe at a time, which bounds what is held in memory per stream
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# bytes at the end of a failed job's stderr that are reported as its error
+ERROR_TAIL_SIZE = 4096
+
+
+class Launch(NamedTuple):
+    args: List[str]
+
+    # file name, without suffix, of the job's logs
+    name: str
+
+    # written to the child's stdin, which is then closed
+    input: bytes | None = None
+
+    # turns the exit code, duration and tail of stderr into the job's results
+    # by default every run of the job shares the outcome of the process
+    collect: Callable[[int, float, str | None], List[RunResult]] | None = None
+
+    # called once the job is over, whether it finished or was cancelled
+    cleanup: Callable[[], None] | None = None
+
+
+class AsyncSubprocessExecutor:
+    """
+    Runs every job as a child process, all of them managed by a single
+    event loop in this process rather than by a helper process per slot.
+    The event loop runs while `wait` blocks.
+
+    Each job's stdout and stderr are streamed into `<name>.out` and
+    `<name>.err` under `log_path` one chunk at a time, so a child that
+    writes faster than the logs are written is held back by its pipe
+    instead of being buffered in memory. Empty logs are removed, and
+    with `compress` finished logs are gzipped. Without a `log_path`
+    children write straight to this process's terminal.
+
+    Children are reaped by threads of this executor's own, rather than
+    the loop's shared default pool, which is smaller than a large number
+    of slots and would leave finished children waiting to be reaped.
+    """
+    def __init__(
+        self,
+        slots: int,
+        launch: Callable[[List[RunSpec]], Launch],
+        log_path: str | None = None,
+        compress: bool = False,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        self.slots = slots
+        self.launch = launch
+        self.log_path = log_path
+        self.compress = compress
+        self.chunk_size = chunk_size
+
+        if log_path is not None:
+            os.makedirs(log_path, exist_ok=True)
+
+        self._loop = asyncio.new_event_loop()
+
+        # every running job may hold a thread reaping its child and one writing its input
+        self._threads = ThreadPoolExecutor(max_workers=2 * slots)
+        self._semaphore = asyncio.Semaphore(slots)
+        self._running: Dict[int, Tuple[asyncio.Task[List[RunResult]], List[RunSpec]]] = {}
+
+
+    def start(self, slot: int, runs: List[RunSpec], placement: Placement | None = None):
+        task = self._loop.create_task(self._run(runs, placement))
+        self._running[slot] = (task, runs)
+
+
+    def wait(self) -> List[Tuple[int, List[RunResult]]]:
+        tasks = [task for task, _ in self._running.values()]
+        done, _ = self._loop.run_until_complete(asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED))
+
+        out: List[Tuple[int, List[RunResult]]] = []
+        for slot in sorted(self._running):
+            task, runs = self._running[slot]
+            if task not in done:
+                continue
+
+            del self._running[slot]
+            try:
+                out.append((slot, task.result()))
+            except Exception as e:
+                out.append((slot, [RunResult(r, 1, 0.0, repr(e)) for r in runs]))
+
+        return out
+
+
+    def close(self):
+        # anything still running is killed
+        tasks = [task for task, _ in self._running.values()]
+        for task in tasks:
+            task.cancel()
+
+        if tasks:
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+
+        self._loop.run_until_complete(self._loop.shutdown_default_executor())
+        self._loop.close()
+        self._threads.shutdown()
+        self._running = {}
+
+
+    async def _run(self, runs: List[RunSpec], placement: Placement | None) -> List[RunResult]:
+        launch = self.launch(runs)
+        try:
+            return await self._run_launch(launch, runs, placement)
+        finally:
+            if launch.cleanup is not None:
+                launch.cleanup()
+
+
+    async def _run_launch(self, launch: Launch, runs: List[RunSpec], placement: Placement | None) -> List[RunResult]:
+        kwargs: Dict[str, Any] = {}
+        if placement is not None:
+            launch = launch._replace(args=placement.wrap(launch.args))
+            kwargs = placement.get_popen_kwargs()
+
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                exit_code, tail, usage = await self._execute(launch, kwargs)
+            except OSError as e:
+                # the child could not be started at all
+                exit_code, tail, usage = 1, repr(e), None
+
+            duration = time.perf_counter() - start
+
+        if launch.collect is not None:
+            return launch.collect(exit_code, duration, tail)
+
+        # a job of several runs shares the usage of its process
+        error = tail if exit_code != 0 else None
+        cpu_time, max_rss = usage if usage is not None and len(runs) == 1 else (None, None)
+        return [RunResult(r, exit_code, duration, error, cpu_time, max_rss) for r in runs]
+
+
+    async def _execute(self, launch: Launch, kwargs: Dict[str, Any]) -> Tuple[int, str | None, Tuple[float, float] | None]:
+        # children are reaped here rather than by asyncio, which keeps their resource usage
+        pipe = subprocess.PIPE if self.log_path is not None else None
+        proc = subprocess.Popen(
+            launch.args,
+            stdin=subprocess.PIPE if launch.input is not None else None,
+            stdout=pipe,
+            stderr=pipe,
+            **kwargs,
+        )
+        loop = asyncio.get_running_loop()
+        reaped = loop.run_in_executor(self._threads, _reap, proc)
+
+        paths: List[str] = []
+        tail = bytearray()
+        transports: List[asyncio.BaseTransport] = []
+        try:
+            streams = []
+            if launch.input is not None:
+                streams.append(loop.run_in_executor(self._threads, _feed, proc.stdin, launch.input))
+
+            if self.log_path is not None:
+                paths = [os.path.join(self.log_path, launch.name + suffix) for suffix in ('.out', '.err')]
+                streams.append(self._drain(proc.stdout, paths[0], transports))
+                streams.append(self._drain(proc.stderr, paths[1], transports, tail))
+
+            await asyncio.gather(*streams)
+            exit_code, usage = await reaped
+
+        except asyncio.CancelledError:
+            # the reaping thread collects the child once it is gone
+            if proc.returncode is None:
+                proc.kill()
+            raise
+
+        finally:
+            for transport in transports:
+                transport.close()
+
+        if paths:
+            await loop.run_in_executor(self._threads, self._finish_logs, paths)
+
+        return exit_code, tail.decode(errors='replace') or None, usage
+
+
+    async def _drain(self, pipe: IO[bytes] | None, path: str, transports: List[asyncio.BaseTransport], tail: bytearray | None = None):
+        assert pipe is not None
+        loop = asyncio.get_running_loop()
+        stream = asyncio.StreamReader(limit=self.chunk_size)
+        transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stream), pipe)
+        transports.append(transport)
+
+        with open(path, 'wb', buffering=self.chunk_size) as f:
+            while chunk := await stream.read(self.chunk_size):
+                f.write(chunk)
+
+                if tail is not None:
+                    tail += chunk
+                    del tail[:-ERROR_TAIL_SIZE]
+
+
+    def _finish_logs(self, paths: List[str]):
+        for path in paths:
+            if os.path.getsize(path) == 0:
+                os.remove(path)
+                continue
+
+            if self.compress:
+                with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(path)
+
+
+def _feed(stdin: IO[bytes] | None, data: bytes):
+    assert stdin is not None
+    try:
+        stdin.write(data)
+        stdin.close()
+    except (BrokenPipeError, ConnectionResetError):
+        # the child exited without reading all of its input
+        pass
+
+
+def _reap(proc: subprocess.Popen) -> Tuple[int, Tuple[float, float] | None]:
+    if not hasattr(os, 'wait4'):
+        return proc.wait(), None
+
+    _, status, ru = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, get_usage(ru)
@@ -0,0 +1,180 @@
+"""
+Packing many runs into a single invocation of the entry script.
+
+The scheduler invokes the entry script as
+
+    python <entry> --batch --results-path <path> --status-file <file>
+
+and writes one JSON object per run to its stdin:
+
+    {"part": "softmaxAC", "version": 0, "config_id": 3, "seed": 1}
+
+For every run it finishes, the entry appends one JSON line to the status file:
+
+    {"part": ..., "version": ..., "config_id": ..., "seed": ...,
+     "exit_code": 0, "duration": 1.25, "error": null,
+     "cpu_time": 1.2, "max_rss": 312.5}
+
+where `cpu_time` and `max_rss` (the peak memory of the process so far,
+in MiB) are optional.
+
+Runs that never show up in the status file (e.g. because the process
+crashed part way through) are reported as failed by the scheduler.
+
+Entry scripts that expose a `run(part, version, config_id, seed, results_path)`
+function can support this protocol with
+
+    if '--batch' in sys.argv[1:]:
+        run_batch(run)
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from typing import IO, Any, Callable, Iterable, Iterator, List, Sequence
+
+from ml_experiment.execution.telemetry import get_self_usage
+from ml_experiment.execution.types import RunResult, RunSpec
+
+BATCH_FLAG = '--batch'
+
+
+# --------------------
+# -- Scheduler side --
+# --------------------
+
+def make_batches(
+    runs: Iterable[RunSpec],
+    max_runs: int = 1,
+    time_budget: float | None = None,
+    estimate: Callable[[RunSpec], float] | None = None,
+) -> Iterator[List[RunSpec]]:
+    """
+    Greedily packs consecutive runs into batches of at most `max_runs`
+    runs, and, when a `time_budget` is given, of at most that many
+    estimated seconds. A single run longer than the budget gets a
+    batch of its own.
+    """
+    batch: List[RunSpec] = []
+    total = 0.0
+
+    for run in runs:
+        cost = estimate(run) if estimate is not None and time_budget is not None else 0.0
+
+        full = len(batch) >= max_runs
+        over = time_budget is not None and total + cost > time_budget
+        if batch and (full or over):
+            yield batch
+            batch = []
+            total = 0.0
+
+        batch.append(run)
+        total += cost
+
+    if batch:
+        yield batch
+
+
+def get_batch_command(entry: str, results_path: str, status_path: str) -> List[str]:
+    return ['python', entry, BATCH_FLAG, '--results-path', results_path, '--status-file', status_path]
+
+
+def encode_runs(runs: Sequence[RunSpec]) -> str:
+    return ''.join(json.dumps(_run_to_json(r)) + '\n' for r in runs)
+
+
+def read_status(status_path: str, runs: Sequence[RunSpec], exit_code: int, error: str | None = None) -> List[RunResult]:
+    reported = {}
+    if os.path.exists(status_path):
+        with open(status_path, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+
+                d = json.loads(line)
+                run = _run_from_json(d)
+                reported[run] = RunResult(run, d['exit_code'], d['duration'], d.get('error'), d.get('cpu_time'), d.get('max_rss'))
+
+    # anything the entry did not report on failed with the process itself,
+    # whose stderr most likely says why
+    failed_code = exit_code if exit_code != 0 else 1
+    failed_error = f'run was not reported by the batch (exit code {exit_code})'
+    if error:
+        failed_error += '\n' + error
+
+    return [
+        reported.get(r) or RunResult(r, failed_code, 0.0, failed_error)
+        for r in runs
+    ]
+
+
+# ----------------
+# -- Entry side --
+# ----------------
+
+batch_parser = argparse.ArgumentParser()
+batch_parser.add_argument(BATCH_FLAG, action='store_true')
+batch_parser.add_argument('--results-path', type=str, required=True)
+batch_parser.add_argument('--status-file', type=str, required=True)
+
+
+def run_batch(
+    fn: Callable[..., Any],
+    argv: Sequence[str] | None = None,
+    stdin: IO[str] | None = None,
+) -> int:
+    """
+    Runs every run listed on stdin through `fn`, recording the outcome
+    of each one in the status file. Gives back the number of failed runs.
+    """
+    args = batch_parser.parse_args(argv)
+    lines: IO[str] = stdin if stdin is not None else sys.stdin
+    runs = [_run_from_json(json.loads(line)) for line in lines if line.strip()]
+
+    failures = 0
+    with open(args.status_file, 'a') as status:
+        for run in runs:
+            cpu_start, _ = get_self_usage()
+            start = time.perf_counter()
+            error = None
+            try:
+                fn(
+                    part=run.part_name,
+                    version=run.version,
+                    config_id=run.config_id,
+                    seed=run.seed,
+                    results_path=args.results_path,
+                )
+            except Exception:
+                error = traceback.format_exc()
+                failures += 1
+
+            d = _run_to_json(run)
+            d['exit_code'] = 0 if error is None else 1
+            d['duration'] = time.perf_counter() - start
+            d['error'] = error
+
+            cpu_end, max_rss = get_self_usage()
+            d['cpu_time'] = cpu_end - cpu_start
+            d['max_rss'] = max_rss
+
+            # flush each run so progress survives a crash later in the batch
+            status.write(json.dumps(d) + '\n')
+            status.flush()
+
+    return failures
+
+
+def _run_to_json(run: RunSpec) -> dict[str, Any]:
+    return {
+        'part': run.part_name,
+        'version': run.version,
+        'config_id': run.config_id,
+        'seed': run.seed,
+    }
+
+
+def _run_from_json(d: dict[str, Any]) -> RunSpec:
+    return RunSpec(d['part'], d['version'], d['config_id'], d['seed'])
@@ -0,0 +1,84 @@
+from typing import Callable, Dict, Iterable, List, Protocol, Tuple
+
+from ml_experiment.execution.resources import Placement, ResourceManager
+from ml_experiment.execution.types import RunResult, RunSpec
+
+
+class Executor(Protocol):
+    """
+    Runs jobs in a fixed number of slots. A job is started in a
+    free slot, and `wait` blocks until at least one slot finishes.
+    Jobs admitted by a ResourceManager are also given their placement.
+    """
+    slots: int
+
+    def start(self, slot: int, runs: List[RunSpec], placement: Placement | None = None) -> None: ...
+    def wait(self) -> List[Tuple[int, List[RunResult]]]: ...
+    def close(self) -> None: ...
+
+
+def dispatch(
+    executor: Executor,
+    jobs: Iterable[List[RunSpec]],
+    on_result: Callable[[RunResult], None] | None = None,
+    on_start: Callable[[List[RunSpec]], None] | None = None,
+    resources: ResourceManager | None = None,
+) -> List[RunResult]:
+    # with no slots nothing could ever run
+    if executor.slots < 1:
+        raise ValueError(f'An executor needs at least one slot, got {executor.slots}')
+
+    # hand out one job at a time, in order, to whichever slot frees up first
+    # jobs are pulled lazily, so they can be generated as the sweep runs
+    queue = iter(jobs)
+    free = list(reversed(range(executor.slots)))
+    busy = 0
+    results: List[RunResult] = []
+
+    # a job that did not fit waits at the head of the line for running jobs to finish
+    held: List[RunSpec] | None = None
+    placements: Dict[int, Placement] = {}
+
+    while True:
+        while free:
+            job = held if held is not None else next(queue, None)
+            held = None
+            if job is None:
+                break
+
+            slot = free[-1]
+            if resources is not None:
+                placement = resources.acquire(job, force=busy == 0)
+                if placement is None:
+                    held = job
+                    break
+
+                placements[slot] = placement
+
+            if on_start is not None:
+                on_start(job)
+
+            free.pop()
+            if slot in placements:
+                executor.start(slot, job, placements[slot])
+            else:
+                executor.start(slot, job)
+            busy += 1
+
+        if not busy:
+            break
+
+        for slot, finished in executor.wait():
+            free.append(slot)
+            busy -= 1
+
+            if slot in placements:
+                assert resources is not None
+                resources.release(placements.pop(slot))
+
+            for res in finished:
+                results.append(res)
+                if on_result is not None:
+                    on_result(res)
+
+    return results
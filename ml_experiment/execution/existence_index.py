@@ -0,0 +1,107 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Set
+
+from ml_experiment.execution.types import RunSpec
+
+# relative path of a run's result, either as a format string over
+# {part}, {version}, {config_id} and {seed}, or as a function of the run
+PathTemplate = str | Callable[[RunSpec], str]
+
+
+class ExistenceIndex:
+    """
+    Every file under `root`, found with a single walk of the directory
+    tree, so that existence checks are answered from memory instead of
+    with one `stat` per run. With `workers > 1` the top-level
+    subdirectories are walked concurrently, which mostly helps on
+    network filesystems where each listing is a round trip.
+    """
+    def __init__(self, root: str, workers: int = 1):
+        self.root = root
+        self.workers = workers
+
+        self._files: Set[str] = set()
+        self.refresh()
+
+
+    def refresh(self):
+        self._files = set()
+        if not os.path.isdir(self.root):
+            return
+
+        files, subdirs = _scan(self.root, '')
+        self._files |= files
+
+        if self.workers <= 1 or len(subdirs) <= 1:
+            for d in subdirs:
+                self._files |= _walk(self.root, d)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for found in pool.map(lambda d: _walk(self.root, d), subdirs):
+                self._files |= found
+
+
+    def __contains__(self, path: str) -> bool:
+        return _normalize(path) in self._files
+
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+
+    def contains(self, paths: Iterable[str]) -> List[bool]:
+        return [_normalize(p) in self._files for p in paths]
+
+
+    def predicate(self, template: PathTemplate) -> Callable[[Iterable[RunSpec]], List[bool]]:
+        """
+        A batch predicate for `Scheduler.filter_batch` that considers a run
+        to exist when its result file, relative to `root`, is in the index.
+        """
+        def _exists(runs: Iterable[RunSpec]) -> List[bool]:
+            return self.contains(format_path(template, r) for r in runs)
+
+        return _exists
+
+
+def format_path(template: PathTemplate, run: RunSpec) -> str:
+    if callable(template):
+        return template(run)
+
+    return template.format(part=run.part_name, version=run.version, config_id=run.config_id, seed=run.seed)
+
+
+# ---------------
+# -- Internals --
+# ---------------
+
+def _scan(root: str, rel: str):
+    files: Set[str] = set()
+    subdirs: List[str] = []
+
+    with os.scandir(os.path.join(root, rel)) as it:
+        for entry in it:
+            path = os.path.join(rel, entry.name) if rel else entry.name
+            if entry.is_dir():
+                subdirs.append(path)
+            else:
+                files.add(path)
+
+    return files, subdirs
+
+
+def _walk(root: str, rel: str) -> Set[str]:
+    files: Set[str] = set()
+    stack = [rel]
+    while stack:
+        found, subdirs = _scan(root, stack.pop())
+        files |= found
+        stack.extend(subdirs)
+
+    return files
+
+
+def _normalize(path: str) -> str:
+    return os.path.normpath(path)
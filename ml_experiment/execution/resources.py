@@ -0,0 +1,189 @@
+import os
+import shutil
+import warnings
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from ml_experiment.execution.types import RunSpec
+
+# variables read by the common numeric libraries to size their thread pools
+THREAD_ENV_VARS = (
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'BLIS_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+)
+
+
+@dataclass(frozen=True)
+class Resources:
+    # threads the run's numeric libraries may use, None leaves them unconstrained
+    threads: int | None = None
+
+    # MiB of memory the run is expected to need at its peak
+    memory: float = 0.0
+
+
+@dataclass(frozen=True)
+class Placement:
+    """Where a started job runs, and what it was admitted with."""
+    threads: int | None
+    memory: float
+    cpus: Tuple[int, ...] = field(default=())
+
+    def get_env(self) -> Dict[str, str]:
+        if self.threads is None:
+            return {}
+
+        return {var: str(self.threads) for var in THREAD_ENV_VARS}
+
+
+    def get_popen_kwargs(self) -> Dict[str, Any]:
+        """Arguments for `subprocess` that start a process under this placement."""
+        kwargs: Dict[str, Any] = {}
+
+        env = self.get_env()
+        if env:
+            kwargs['env'] = {**os.environ, **env}
+
+        return kwargs
+
+
+    def wrap(self, args: Sequence[str]) -> List[str]:
+        """
+        The command that starts `args` on this placement's CPUs. The child
+        is pinned by `taskset` rather than between fork and exec, which is
+        unsafe in a parent with threads.
+        """
+        if not self.cpus:
+            return list(args)
+
+        return ['taskset', '--cpu-list', ','.join(str(c) for c in self.cpus), *args]
+
+
+class ResourceManager:
+    """
+    Admits jobs only while the machine has room for them. Every job holds
+    its declared threads (on dedicated CPUs when `pin_cpus` is set) and
+    memory until it finishes. A job is held back while the declared
+    totals would exceed the machine, the free memory reported by the OS
+    is below its declaration, or the load average is above `max_load`.
+    """
+    def __init__(
+        self,
+        resources: Callable[[RunSpec], Resources],
+        pin_cpus: bool = False,
+        memory_limit: float | None = None,
+        max_load: float | None = None,
+    ):
+        self.resources = resources
+        self.pin_cpus = pin_cpus and can_pin_cpus()
+        self.max_load = max_load
+
+        self._cpus = get_available_cpus()
+        self._free_cpus = list(self._cpus)
+        self._threads = 0
+
+        self.memory_limit = memory_limit if memory_limit is not None else get_available_memory()
+        self._memory = 0.0
+
+
+    def acquire(self, runs: Sequence[RunSpec], force: bool = False) -> Placement | None:
+        """
+        Reserves resources for a job, or gives back None if it does not fit
+        right now. With `force` the job is admitted regardless, which keeps
+        a job that can never fit from waiting forever on an idle machine.
+        """
+        declared = [self.resources(r) for r in runs]
+        threads = max((d.threads for d in declared if d.threads is not None), default=None)
+        memory = max((d.memory for d in declared), default=0.0)
+
+        # runs that do not declare threads only hold a CPU when they are pinned
+        need = threads if threads is not None else int(self.pin_cpus)
+
+        if not force and not self._fits(need, memory):
+            return None
+
+        cpus: Tuple[int, ...] = ()
+        if self.pin_cpus:
+            cpus = tuple(self._free_cpus[:need])
+            del self._free_cpus[:need]
+
+        self._threads += need
+        self._memory += memory
+        return Placement(threads, memory, cpus)
+
+
+    def release(self, placement: Placement):
+        self._threads -= placement.threads if placement.threads is not None else int(self.pin_cpus)
+        self._memory -= placement.memory
+        self._free_cpus = sorted(set(self._free_cpus) | set(placement.cpus))
+
+
+    def _fits(self, threads: int, memory: float) -> bool:
+        if self._threads + threads > len(self._cpus):
+            return False
+
+        if self.pin_cpus and len(self._free_cpus) < threads:
+            return False
+
+        if memory > 0:
+            if self.memory_limit is not None and self._memory + memory > self.memory_limit:
+                return False
+
+            available = get_available_memory()
+            if available is not None and memory > available:
+                return False
+
+        if self.max_load is not None and _get_load() > self.max_load:
+            return False
+
+        return True
+
+
+# ------------------
+# -- Machine info --
+# ------------------
+
+def get_available_cpus() -> List[int]:
+    # respects any affinity this process was itself started with
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+
+    return list(range(os.cpu_count() or 1))
+
+
+def can_pin_cpus() -> bool:
+    # only some platforms, notably Linux, let a process set CPU affinity
+    if not hasattr(os, 'sched_setaffinity'):
+        warnings.warn('CPU affinity is not supported on this platform, runs will not be pinned to CPUs', stacklevel=3)
+        return False
+
+    # and children are pinned by taskset, which minimal installs may lack
+    if shutil.which('taskset') is None:
+        warnings.warn('taskset was not found, runs will not be pinned to CPUs', stacklevel=3)
+        return False
+
+    return True
+
+
+def get_available_memory() -> float | None:
+    # MiB the kernel reports as available to new allocations, where /proc is available
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    return None
+
+
+def _get_load() -> float:
+    try:
+        return os.getloadavg()[0]
+    except OSError:
+        return 0.0
@@ -0,0 +1,308 @@
+from array import array
+from itertools import chain
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Set, Tuple, overload
+
+from ml_experiment._utils.optional import try_import_numpy
+from ml_experiment.execution.types import RunSpec
+
+# numpy is only used to speed up bulk operations when it is installed
+_np = try_import_numpy()
+
+# part codes and versions are small, config ids and seeds need not be
+_SMALL = 'i'
+_LARGE = 'q'
+
+
+class RunSet:
+    """
+    An ordered set of runs stored column-wise: part names are dictionary
+    encoded, and versions, config ids and seeds are packed integer arrays.
+    This takes around 24 bytes per run, compared to a few hundred for a
+    set of RunSpec tuples.
+
+    Iterating gives back RunSpec tuples in insertion order. Set operations
+    keep the order of the left-hand side, and are vectorized when numpy is
+    installed.
+    """
+    def __init__(self, runs: Iterable[RunSpec] = ()):
+        self._parts: List[str] = []
+        self._code = array(_SMALL)
+        self._version = array(_SMALL)
+        self._config_id = array(_LARGE)
+        self._seed = array(_LARGE)
+
+        codes: Dict[str, int] = {}
+        for r in dict.fromkeys(runs):
+            code = codes.get(r.part_name)
+            if code is None:
+                code = codes[r.part_name] = len(self._parts)
+                self._parts.append(r.part_name)
+
+            self._code.append(code)
+            self._version.append(r.version)
+            self._config_id.append(r.config_id)
+            self._seed.append(r.seed)
+
+
+    @classmethod
+    def from_product(cls, part_name: str, version: int, config_ids: Iterable[int], seeds: Iterable[int]) -> 'RunSet':
+        """
+        Every combination of `config_ids` and `seeds`, grouped by config id,
+        built without materializing a RunSpec per run.
+        """
+        config_ids = list(dict.fromkeys(config_ids))
+        seeds = list(dict.fromkeys(seeds))
+        n = len(config_ids) * len(seeds)
+
+        if _np is not None:
+            ids = _np.repeat(_np.asarray(config_ids, dtype=_LARGE), len(seeds))
+            ss = _np.tile(_np.asarray(seeds, dtype=_LARGE), len(config_ids))
+            return cls._from_columns(
+                [part_name],
+                array(_SMALL, bytes(n * array(_SMALL).itemsize)),
+                array(_SMALL, [version]) * n,
+                array(_LARGE, ids.tobytes()),
+                array(_LARGE, ss.tobytes()),
+            )
+
+        return cls._from_columns(
+            [part_name],
+            array(_SMALL, [0]) * n,
+            array(_SMALL, [version]) * n,
+            array(_LARGE, (c for c in config_ids for _ in seeds)),
+            array(_LARGE, seeds) * len(config_ids),
+        )
+
+
+    # ---------------
+    # -- Accessors --
+    # ---------------
+
+    def __len__(self) -> int:
+        return len(self._code)
+
+
+    def __iter__(self) -> Iterator[RunSpec]:
+        parts = self._parts
+        for code, version, config_id, seed in zip(self._code, self._version, self._config_id, self._seed, strict=True):
+            yield RunSpec(parts[code], version, config_id, seed)
+
+
+    @overload
+    def __getitem__(self, idx: int) -> RunSpec: ...
+    @overload
+    def __getitem__(self, idx: slice) -> 'RunSet': ...
+    def __getitem__(self, idx: int | slice) -> 'RunSpec | RunSet':
+        if isinstance(idx, slice):
+            return self._from_columns(
+                self._parts,
+                self._code[idx],
+                self._version[idx],
+                self._config_id[idx],
+                self._seed[idx],
+            )
+
+        return RunSpec(self._parts[self._code[idx]], self._version[idx], self._config_id[idx], self._seed[idx])
+
+
+    def __contains__(self, run: object) -> bool:
+        if not isinstance(run, RunSpec) or run.part_name not in self._parts:
+            return False
+
+        key = (self._parts.index(run.part_name), run.version, run.config_id, run.seed)
+        if _np is not None:
+            found = _np.ones(len(self), dtype=bool)
+            for col, v in zip(self._columns(), key, strict=True):
+                found &= _np.frombuffer(col, dtype=col.typecode) == v
+            return bool(found.any())
+
+        return key in zip(self._code, self._version, self._config_id, self._seed, strict=True)
+
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, RunSet):
+            return len(self) == len(other) and len(self & other) == len(self)
+
+        if isinstance(other, (set, frozenset)):
+            return set(self) == other
+
+        return NotImplemented
+
+
+    __hash__ = None  # type: ignore
+
+
+    def __repr__(self) -> str:
+        return f'RunSet({len(self)} runs, parts={self.get_parts()})'
+
+
+    @property
+    def nbytes(self) -> int:
+        return sum(col.itemsize * len(col) for col in self._columns())
+
+
+    def get_parts(self) -> Set[str]:
+        return set(self._parts[code] for code in set(self._code))
+
+
+    def get_groups(self) -> Set[Tuple[str, int]]:
+        """The distinct (part, version) pairs that have runs in this set."""
+        return set((self._parts[code], version) for code, version in set(zip(self._code, self._version, strict=True)))
+
+
+    # --------------------
+    # -- Set Operations --
+    # --------------------
+
+    def filter(self, keep: Iterable[bool]) -> 'RunSet':
+        if _np is not None:
+            mask = _np.fromiter(keep, dtype=bool, count=len(self))
+            return self._take(_np.flatnonzero(mask))
+
+        keep = list(keep)
+        assert len(keep) == len(self)
+        return self._take([i for i, k in enumerate(keep) if k])
+
+
+    def sort(self, key: Callable[[RunSpec], Any] | None = None, reverse: bool = False) -> 'RunSet':
+        """
+        Sorted by `key`, or by (part, version, config_id, seed) when no key
+        is given. The default order is vectorized when numpy is installed.
+        """
+        if key is None and _np is not None:
+            rank = _np.argsort(_np.argsort(_np.asarray(self._parts, dtype=object)))
+            code, version, config_id, seed = self._arrays()
+            order = _np.lexsort((seed, config_id, version, rank[code] if len(rank) else code))
+            return self._take(order[::-1] if reverse else order)
+
+        runs = list(self)
+        order = sorted(range(len(runs)), key=lambda i: runs[i] if key is None else key(runs[i]), reverse=reverse)
+        return self._take(order)
+
+
+    def union(self, other: Iterable[RunSpec]) -> 'RunSet':
+        other = _as_run_set(other)
+        if _np is None:
+            return RunSet(chain(self, other))
+
+        a, b = _align(self, other)
+        return b._take(_np.flatnonzero(~_isin(b, a)), prefix=a)
+
+
+    def difference(self, other: Iterable[RunSpec]) -> 'RunSet':
+        other = _as_run_set(other)
+        if _np is None:
+            drop = set(other)
+            return self._take([i for i, r in enumerate(self) if r not in drop])
+
+        a, b = _align(self, other)
+        return self._take(_np.flatnonzero(~_isin(a, b)))
+
+
+    def intersection(self, other: Iterable[RunSpec]) -> 'RunSet':
+        other = _as_run_set(other)
+        if _np is None:
+            keep = set(other)
+            return self._take([i for i, r in enumerate(self) if r in keep])
+
+        a, b = _align(self, other)
+        return self._take(_np.flatnonzero(_isin(a, b)))
+
+
+    __or__ = union
+    __sub__ = difference
+    __and__ = intersection
+
+
+    # ----------------------
+    # -- Internal Methods --
+    # ----------------------
+
+    @classmethod
+    def _from_columns(cls, parts: List[str], code: array, version: array, config_id: array, seed: array) -> 'RunSet':
+        out = cls.__new__(cls)
+        out._parts = list(parts)
+        out._code = code
+        out._version = version
+        out._config_id = config_id
+        out._seed = seed
+        return out
+
+
+    def _columns(self) -> Tuple[array, array, array, array]:
+        return self._code, self._version, self._config_id, self._seed
+
+
+    def _arrays(self):
+        assert _np is not None
+        return tuple(_np.frombuffer(col, dtype=col.typecode) for col in self._columns())
+
+
+    def _take(self, idx: Sequence[int], prefix: 'RunSet | None' = None) -> 'RunSet':
+        # gather rows by position, optionally appended to the rows of `prefix`
+        # which must share this set's part encoding
+        if _np is not None:
+            idx = _np.asarray(idx, dtype=_np.intp)
+            cols = [
+                array(col.typecode, arr[idx].tobytes())
+                for col, arr in zip(self._columns(), self._arrays(), strict=True)
+            ]
+        else:
+            cols = [array(col.typecode, (col[i] for i in idx)) for col in self._columns()]
+
+        if prefix is not None:
+            cols = [p + c for p, c in zip(prefix._columns(), cols, strict=True)]
+
+        return self._from_columns(self._parts, *cols)
+
+
+def _as_run_set(runs: Iterable[RunSpec]) -> RunSet:
+    return runs if isinstance(runs, RunSet) else RunSet(runs)
+
+
+def _align(a: RunSet, b: RunSet) -> Tuple[RunSet, RunSet]:
+    # re-encode both sets against one shared dictionary of part names
+    if a._parts == b._parts:
+        return a, b
+
+    # bound locally, the check on the module global does not carry into _recode
+    np = _np
+    assert np is not None
+    parts = list(dict.fromkeys(a._parts + b._parts))
+    index = {p: i for i, p in enumerate(parts)}
+
+    def _recode(s: RunSet) -> RunSet:
+        lookup = np.asarray([index[p] for p in s._parts], dtype=_SMALL)
+        code = lookup[s._arrays()[0]] if len(lookup) else s._arrays()[0]
+        return RunSet._from_columns(parts, array(_SMALL, code.astype(_SMALL).tobytes()), s._version, s._config_id, s._seed)
+
+    return _recode(a), _recode(b)
+
+
+def _isin(a: RunSet, b: RunSet):
+    """For every run of `a`, whether it is also in `b`. Both must share a part encoding."""
+    assert _np is not None
+    n = len(a)
+    if n == 0 or len(b) == 0:
+        return _np.zeros(n, dtype=bool)
+
+    cols = [_np.concatenate((x, y)) for x, y in zip(a._arrays(), b._arrays(), strict=True)]
+    from_b = _np.concatenate((_np.zeros(n, dtype=bool), _np.ones(len(b), dtype=bool)))
+
+    code, version, config_id, seed = cols
+    order = _np.lexsort((seed, config_id, version, code))
+
+    # number the groups of equal runs in sorted order
+    same = _np.ones(len(order) - 1, dtype=bool)
+    for col in cols:
+        s = col[order]
+        same &= s[1:] == s[:-1]
+    group = _np.concatenate(([0], _np.cumsum(~same)))
+
+    has_b = _np.zeros(group[-1] + 1, dtype=bool)
+    has_b[group[from_b[order]]] = True
+
+    out = _np.empty(n, dtype=bool)
+    from_a = ~from_b[order]
+    out[order[from_a]] = has_b[group[from_a]]
+    return out
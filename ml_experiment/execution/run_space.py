@@ -0,0 +1,159 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterable, Iterator, List, NamedTuple, Sequence, Set, Tuple, overload
+
+from ml_experiment.execution.run_set import RunSet
+from ml_experiment.execution.types import RunSpec
+
+
+class Factor(NamedTuple):
+    part_name: str
+    version: int
+    config_ids: array
+    seeds: Sequence[int]
+
+
+class RunSpace:
+    """
+    Every run of a sweep, kept in factored form: per part, the sorted
+    configuration ids times the sorted seeds. Runs are numbered by part,
+    then config id, then seed, the same order as a sorted RunSet, and are only turned into RunSpec tuples
+    when they are asked for, so the space takes memory proportional to
+    the number of configurations and seeds rather than the number of runs.
+
+    Slicing gives back another lazy RunSpace over the selected indices.
+    """
+    def __init__(self, factors: Iterable[Tuple[str, int, Iterable[int], Iterable[int]]] = ()):
+        self._factors: List[Factor] = []
+        self._offsets: List[int] = []
+
+        total = 0
+        for part_name, version, config_ids, seeds in factors:
+            # ranges of seeds are kept as ranges, so even huge seed counts are free
+            if isinstance(seeds, range):
+                seeds = seeds if seeds.step > 0 else seeds[::-1]
+            else:
+                seeds = sorted(set(seeds))
+            f = Factor(part_name, version, array('q', sorted(set(config_ids))), seeds)
+            self._factors.append(f)
+            self._offsets.append(total)
+            total += len(f.config_ids) * len(f.seeds)
+
+        self._range = range(total)
+
+
+    def __len__(self) -> int:
+        return len(self._range)
+
+
+    def __iter__(self) -> Iterator[RunSpec]:
+        for idx in self._range:
+            yield self._decode(idx)
+
+
+    @overload
+    def __getitem__(self, idx: int) -> RunSpec: ...
+    @overload
+    def __getitem__(self, idx: slice) -> 'RunSpace': ...
+    def __getitem__(self, idx: int | slice) -> 'RunSpec | RunSpace':
+        if isinstance(idx, slice):
+            out = RunSpace.__new__(RunSpace)
+            out._factors = self._factors
+            out._offsets = self._offsets
+            out._range = self._range[idx]
+            return out
+
+        return self._decode(self._range[idx])
+
+
+    def __contains__(self, run: object) -> bool:
+        if not isinstance(run, RunSpec):
+            return False
+
+        for f, offset in zip(self._factors, self._offsets, strict=True):
+            if f.part_name != run.part_name or f.version != run.version:
+                continue
+
+            c = bisect_left(f.config_ids, run.config_id)
+            if c == len(f.config_ids) or f.config_ids[c] != run.config_id or run.seed not in f.seeds:
+                return False
+
+            return offset + c * len(f.seeds) + f.seeds.index(run.seed) in self._range
+
+        return False
+
+
+    def __repr__(self) -> str:
+        return f'RunSpace({len(self)} runs, parts={self.get_parts()})'
+
+
+    def get_parts(self) -> Set[str]:
+        return set(part for part, _ in self.get_groups())
+
+
+    def get_groups(self) -> Set[Tuple[str, int]]:
+        """The distinct (part, version) pairs that have runs in this space."""
+        out = set()
+        for f, offset in zip(self._factors, self._offsets, strict=True):
+            if _overlaps(self._range, offset, offset + len(f.config_ids) * len(f.seeds)):
+                out.add((f.part_name, f.version))
+
+        return out
+
+
+    # ---------------------
+    # -- Materialization --
+    # ---------------------
+
+    def to_run_set(self) -> RunSet:
+        # whole factors can be built column-wise without going through RunSpec
+        if self._range == range(self._total()):
+            out = RunSet()
+            for f in self._factors:
+                out |= RunSet.from_product(f.part_name, f.version, f.config_ids, f.seeds)
+            return out
+
+        return RunSet(self)
+
+
+    def filter(self, keep: Iterable[bool]) -> RunSet:
+        return RunSet(r for r, k in zip(self, keep, strict=True) if k)
+
+
+    def difference(self, other: Iterable[RunSpec]) -> RunSet:
+        drop = other if isinstance(other, (set, frozenset)) else set(other)
+        return RunSet(r for r in self if r not in drop)
+
+
+    __sub__ = difference
+
+
+    # ----------------------
+    # -- Internal Methods --
+    # ----------------------
+
+    def _total(self) -> int:
+        if not self._factors:
+            return 0
+
+        f = self._factors[-1]
+        return self._offsets[-1] + len(f.config_ids) * len(f.seeds)
+
+
+    def _decode(self, idx: int) -> RunSpec:
+        k = bisect_right(self._offsets, idx) - 1
+        f = self._factors[k]
+        c, s = divmod(idx - self._offsets[k], len(f.seeds))
+        return RunSpec(f.part_name, f.version, f.config_ids[c], f.seeds[s])
+
+
+def _overlaps(r: range, lo: int, hi: int) -> bool:
+    # whether any element of `r` lies in [lo, hi)
+    if r.step < 0:
+        r = r[::-1]
+
+    if len(r) == 0:
+        return False
+
+    i = max(0, -(-(lo - r.start) // r.step))
+    return i < len(r) and r[i] < hi
@@ -0,0 +1,21 @@
+import heapq
+from typing import List, Sequence
+
+
+def assign_by_cost(costs: Sequence[float], count: int) -> List[int]:
+    """
+    Longest-processing-time-first assignment of items to `count` shards:
+    items are taken from most to least expensive, each going to the shard
+    with the least total cost so far. Ties are broken by position and by
+    shard index, so the same costs always give the same assignment.
+    """
+    order = sorted(range(len(costs)), key=lambda i: (-costs[i], i))
+
+    out = [0] * len(costs)
+    loads = [(0.0, shard) for shard in range(count)]
+    for i in order:
+        load, shard = heapq.heappop(loads)
+        out[i] = shard
+        heapq.heappush(loads, (load + costs[i], shard))
+
+    return out
@@ -0,0 +1,198 @@
+"""
+Running a sweep as a single Slurm job array.
+
+Runs are packed into array tasks so that each task is expected to finish
+within its wall time while running `cores` runs at a time. Every task
+gets a JSON manifest listing its runs, and the submission script starts
+
+    python -m ml_experiment.execution.slurm <job_dir>/task_${SLURM_ARRAY_TASK_ID}.json
+
+on each node, which runs the manifest with a local scheduler. Sweeps with
+more tasks than an array may hold are submitted as several arrays, each
+offsetting its task ids into the manifests.
+"""
+import heapq
+import json
+import math
+import os
+import shlex
+import subprocess
+import sys
+from typing import Any, Callable, Dict, List, NamedTuple, Sequence
+
+from ml_experiment.execution.types import RunSpec
+
+SUBMISSION_SCRIPT = 'submit.sh'
+
+# slurm's default MaxArraySize, which caps array task ids below it
+DEFAULT_MAX_ARRAY_SIZE = 1001
+
+
+class Submission(NamedTuple):
+    # the directory holding the submission scripts, task manifests and task logs
+    job_dir: str
+
+    # the id of every submitted array, in task order
+    job_ids: List[str]
+
+
+# -------------
+# -- Packing --
+# -------------
+
+def pack_tasks(
+    runs: Sequence[RunSpec],
+    estimate: Callable[[RunSpec], float],
+    time_budget: float,
+    cores: int,
+) -> List[List[RunSpec]]:
+    """
+    Splits `runs` into as few tasks as possible such that scheduling each
+    task's runs longest-first over `cores` slots is expected to finish in
+    `time_budget` seconds. Runs in each task are ordered longest first.
+    """
+    if not runs:
+        return []
+
+    costs = [estimate(r) for r in runs]
+    too_long = [r for r, c in zip(runs, costs, strict=True) if c > time_budget]
+    if too_long:
+        raise ValueError(f'{len(too_long)} runs are expected to take longer than the time budget of {time_budget}s, e.g. {too_long[0]}')
+
+    order = sorted(range(len(runs)), key=lambda i: (-costs[i], runs[i]))
+
+    # start from the lower bound on the number of tasks and grow until the plan fits
+    n_tasks = max(1, math.ceil(sum(costs) / (time_budget * cores)))
+    while True:
+        tasks = _assign(order, costs, n_tasks, cores, time_budget)
+        if tasks is not None:
+            return [[runs[i] for i in task] for task in tasks if task]
+
+        n_tasks = max(n_tasks + 1, math.ceil(n_tasks * 1.1))
+
+
+def _assign(order: List[int], costs: List[float], n_tasks: int, cores: int, time_budget: float) -> List[List[int]] | None:
+    # longest-processing-time-first over every core of every task
+    # slot `s` is core `s % cores` of task `s // cores`
+    slots = [(0.0, s) for s in range(n_tasks * cores)]
+    tasks: List[List[int]] = [[] for _ in range(n_tasks)]
+
+    for i in order:
+        load, s = heapq.heappop(slots)
+        if load + costs[i] > time_budget:
+            return None
+
+        tasks[s // cores].append(i)
+        heapq.heappush(slots, (load + costs[i], s))
+
+    return tasks
+
+
+# ----------------
+# -- Submission --
+# ----------------
+
+def format_time(seconds: float) -> str:
+    # slurm's days-hours:minutes:seconds format, rounded up to the minute
+    minutes = max(1, math.ceil(seconds / 60))
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{days}-{hours:02d}:{minutes:02d}:00'
+
+
+def write_manifests(job_dir: str, tasks: Sequence[Sequence[RunSpec]], header: Dict[str, Any]) -> List[str]:
+    paths = []
+    for i, task in enumerate(tasks):
+        path = get_manifest_path(job_dir, i)
+        with open(path, 'w') as f:
+            json.dump({**header, 'runs': [list(r) for r in task]}, f)
+
+        paths.append(path)
+
+    return paths
+
+
+def write_submission(
+    job_dir: str,
+    job_name: str,
+    n_tasks: int,
+    wall_time: float,
+    cores: int,
+    sbatch_options: Sequence[str] = (),
+    setup: Sequence[str] = (),
+    first_task: int = 0,
+) -> str:
+    """
+    Writes the script of an array over tasks `first_task` to
+    `first_task + n_tasks - 1`. Array task ids always start at 0, so an
+    array after the first offsets them into the manifests, and is
+    written to its own script with its own task logs.
+    """
+    task = '${SLURM_ARRAY_TASK_ID}'
+    log = 'task_%a.out'
+    name = SUBMISSION_SCRIPT
+    if first_task > 0:
+        task = f'$((SLURM_ARRAY_TASK_ID + {first_task}))'
+        log = f'task_{first_task}+%a.out'
+        name = f'submit_{first_task}.sh'
+
+    lines = [
+        '#!/bin/bash',
+        f'#SBATCH --job-name={job_name}',
+        f'#SBATCH --array=0-{n_tasks - 1}',
+        f'#SBATCH --time={format_time(wall_time)}',
+        f'#SBATCH --cpus-per-task={cores}',
+        f'#SBATCH --output={os.path.join(job_dir, log)}',
+        *(f'#SBATCH {opt}' for opt in sbatch_options),
+        '',
+        f'cd {shlex.quote(os.getcwd())}',
+        *setup,
+        'python -m ml_experiment.execution.slurm ' + shlex.quote(os.path.join(job_dir, 'task_')) + task + '.json',
+        '',
+    ]
+
+    path = os.path.join(job_dir, name)
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines))
+
+    return path
+
+
+def submit(sbatch: str, script: str) -> str:
+    # gives back the job id, which --parsable prints as `id` or `id;cluster`
+    proc = subprocess.run([sbatch, '--parsable', script], check=True, capture_output=True, text=True)
+    return proc.stdout.strip().split(';')[0]
+
+
+def get_manifest_path(job_dir: str, task: int) -> str:
+    return os.path.join(job_dir, f'task_{task}.json')
+
+
+# ---------------
+# -- Node side --
+# ---------------
+
+def run_manifest(path: str):
+    # imported here, since the scheduler imports this module
+    from ml_experiment.execution.run_set import RunSet
+    from ml_experiment.Scheduler import LocalRunConfig, Scheduler
+
+    with open(path, 'r') as f:
+        manifest = json.load(f)
+
+    sched = Scheduler(manifest['exp_name'], [], manifest['entry'], base=manifest['base'])
+    sched.all_runs = RunSet(RunSpec(*r) for r in manifest['runs'])
+
+    results = sched.run(LocalRunConfig(
+        tasks_in_parallel=manifest['cores'],
+        in_process=manifest['in_process'],
+        entry_function=manifest['entry_function'],
+        estimated_run_time=manifest['estimated_run_time'],
+    ))
+
+    return sum(not r.ok for r in results)
+
+
+if __name__ == '__main__':
+    failures = run_manifest(sys.argv[1])
+    sys.exit(1 if failures else 0)
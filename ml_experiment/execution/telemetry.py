@@ -0,0 +1,219 @@
+"""
+What happened to every run of a launch: how long it waited to start,
+its wall and CPU time, its peak memory and its exit status, with a
+summary of throughput, utilization and tail percentiles across runs.
+"""
+import csv
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Sequence, Tuple
+
+from ml_experiment.execution.types import RunResult, RunSpec
+
+try:
+    import resource
+except ImportError:
+    resource = None  # type: ignore
+
+# profilers that runs can be started under, and the suffix of the profiles they write
+PROFILERS = {
+    'cprofile': '.prof',
+    'py-spy': '.speedscope.json',
+}
+
+PERCENTILES = (50, 90, 99)
+
+
+class RunRecord(NamedTuple):
+    part_name: str
+    version: int
+    config_id: int
+    seed: int
+    exit_code: int
+
+    # seconds from the start of the launch until the run was started
+    queue_wait: float
+    wall_time: float
+    cpu_time: float | None
+    max_rss: float | None
+
+
+class Progress(NamedTuple):
+    done: int
+    failed: int
+    running: int
+    # None when the runs are streamed without being counted up front
+    total: int | None
+    elapsed: float
+
+    @property
+    def eta(self) -> float | None:
+        # seconds until every run is done, at the rate seen so far
+        if self.total is None or self.done == 0:
+            return None
+
+        return self.elapsed / self.done * (self.total - self.done)
+
+
+class Telemetry:
+    """
+    Collects the outcome of every run from the scheduler's `on_start` and
+    `on_result` callbacks, and calls `on_progress` after every finished run.
+    """
+    def __init__(
+        self,
+        slots: int,
+        total: int | None = None,
+        on_progress: Callable[[Progress], None] | None = None,
+    ):
+        self.slots = slots
+        self.total = total
+        self.on_progress = on_progress
+        self.records: List[RunRecord] = []
+
+        self._launched = time.perf_counter()
+        self._last = self._launched
+        self._started: Dict[RunSpec, float] = {}
+        self._failed = 0
+
+
+    def on_start(self, job: Sequence[RunSpec]):
+        now = time.perf_counter()
+        for r in job:
+            self._started[r] = now
+
+
+    def on_result(self, res: RunResult):
+        started = self._started.pop(res.run, self._launched)
+        self._last = time.perf_counter()
+        self._failed += not res.ok
+
+        self.records.append(RunRecord(
+            *res.run,
+            exit_code=res.exit_code,
+            queue_wait=started - self._launched,
+            wall_time=res.duration,
+            cpu_time=res.cpu_time,
+            max_rss=res.max_rss,
+        ))
+
+        if self.on_progress is not None:
+            self.on_progress(self.get_progress())
+
+
+    def get_progress(self) -> Progress:
+        return Progress(
+            done=len(self.records),
+            failed=self._failed,
+            running=len(self._started),
+            total=self.total,
+            elapsed=time.perf_counter() - self._launched,
+        )
+
+
+    def get_summary(self) -> Dict[str, Any]:
+        elapsed = self._last - self._launched
+        wall = [r.wall_time for r in self.records]
+        cpu = [r.cpu_time for r in self.records if r.cpu_time is not None]
+        rss = [r.max_rss for r in self.records if r.max_rss is not None]
+
+        return {
+            'runs': len(self.records),
+            'failed': self._failed,
+            'slots': self.slots,
+            'elapsed': elapsed,
+            # finished runs per second
+            'throughput': len(self.records) / elapsed if elapsed > 0 else None,
+            # fraction of the slots' time spent running something
+            'utilization': sum(wall) / (elapsed * self.slots) if elapsed > 0 else None,
+            # CPU seconds per wall second of the runs that reported it
+            'cpu_per_wall': sum(cpu) / sum(r.wall_time for r in self.records if r.cpu_time is not None) if cpu else None,
+            'queue_wait': describe(r.queue_wait for r in self.records),
+            'wall_time': describe(wall),
+            'cpu_time': describe(cpu),
+            'max_rss': describe(rss),
+        }
+
+
+    def write_report(self, path: str):
+        """
+        Writes a CSV with a row per run when `path` ends in `.csv`, and
+        otherwise a JSON document with the summary and every run.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(RunRecord._fields)
+                writer.writerows(self.records)
+            return
+
+        with open(path, 'w') as f:
+            json.dump({
+                'summary': self.get_summary(),
+                'runs': [r._asdict() for r in self.records],
+            }, f, indent=2)
+
+
+def describe(values: Iterable[float]) -> Dict[str, float] | None:
+    ordered = sorted(values)
+    if not ordered:
+        return None
+
+    out = {'mean': sum(ordered) / len(ordered)}
+    for p in PERCENTILES:
+        out[f'p{p}'] = percentile(ordered, p)
+
+    out['max'] = ordered[-1]
+    return out
+
+
+def percentile(ordered: Sequence[float], p: float) -> float:
+    # nearest rank, so that every percentile is a value that was seen
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+# -----------
+# -- Usage --
+# -----------
+
+def get_usage(ru: Any) -> Tuple[float, float]:
+    """CPU seconds and peak resident memory in MiB from a `struct_rusage`."""
+    # linux reports the peak in KiB, macOS in bytes
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return ru.ru_utime + ru.ru_stime, ru.ru_maxrss / scale
+
+
+def get_self_usage() -> Tuple[float, float | None]:
+    # CPU seconds this process has used, and its peak memory so far in MiB
+    if resource is None:
+        return time.process_time(), None
+
+    return time.process_time(), get_usage(resource.getrusage(resource.RUSAGE_SELF))[1]
+
+
+# ---------------
+# -- Profiling --
+# ---------------
+
+def get_profile_path(profile_dir: str, name: str, profiler: str) -> str:
+    if profiler not in PROFILERS:
+        raise ValueError(f'Unknown profiler <{profiler}>, expected one of {sorted(PROFILERS)}')
+
+    return os.path.join(profile_dir, name + PROFILERS[profiler])
+
+
+def get_profiled_command(cmd: List[str], profile_path: str, profiler: str) -> List[str]:
+    # `cmd` starts with the python interpreter the run would have used
+    python, *rest = cmd
+    if profiler == 'cprofile':
+        return [python, '-m', 'cProfile', '-o', profile_path, *rest]
+
+    if profiler == 'py-spy':
+        return ['py-spy', 'record', '--format', 'speedscope', '--output', profile_path, '--', python, *rest]
+
+    raise ValueError(f'Unknown profiler <{profiler}>, expected one of {sorted(PROFILERS)}')
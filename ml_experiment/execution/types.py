@@ -0,0 +1,25 @@
+from typing import NamedTuple
+
+
+class RunSpec(NamedTuple):
+    part_name: str
+    version: int
+    config_id: int
+    seed: int
+
+
+class RunResult(NamedTuple):
+    run: RunSpec
+    # 0 on success, following subprocess conventions otherwise:
+    # negative values are the signal that killed the process
+    exit_code: int
+    duration: float
+    error: str | None = None
+
+    # CPU seconds and peak resident memory in MiB, where the executor measures them
+    cpu_time: float | None = None
+    max_rss: float | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_code == 0
@@ -0,0 +1,265 @@
+import cProfile
+import importlib
+import importlib.util
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from multiprocessing.connection import Connection, wait
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Tuple
+
+from ml_experiment.execution.resources import Placement
+from ml_experiment.execution.telemetry import get_self_usage
+from ml_experiment.execution.types import RunResult, RunSpec
+
+# the callable an entry script exposes to be run in-process
+DEFAULT_ENTRY_FUNCTION = 'run'
+
+
+class WorkerPool:
+    """
+    Long-lived worker processes that import the entry script once and
+    then call its entry function for every run they are handed.
+
+    Workers are forked from a forkserver that has already imported the
+    entry script where possible, so even a respawned worker does not pay
+    for the imports again. A worker that dies mid-run only fails that run,
+    and is replaced before it is handed more work.
+
+    Numeric libraries size their thread pools once, when they are imported,
+    so `threads` applies to every worker for its whole life. The entry is
+    then imported by each worker instead of by the forkserver. For the same
+    reason the threads of a run's placement are not applied, only its CPUs.
+
+    The forkserver is shared by the whole process and only reads what to
+    preload when it starts, so the first pool decides it. Later pools with
+    another entry import theirs in each worker, and later pools that limit
+    `threads` after an entry was preloaded spawn fresh workers instead.
+
+    Runs report the CPU time they used, and the peak memory of their worker
+    so far. Runs that `profile` gives a path for are run under cProfile,
+    with the profile written to that path.
+    """
+    def __init__(
+        self,
+        entry: str,
+        slots: int,
+        results_path: str,
+        function: str = DEFAULT_ENTRY_FUNCTION,
+        threads: int | None = None,
+        profile: Callable[[RunSpec], str | None] | None = None,
+    ):
+        self.entry = entry
+        self.slots = slots
+        self.results_path = results_path
+        self.function = function
+        self.env = Placement(threads, 0.0).get_env()
+        self.profile = profile
+
+        self._ctx = _get_context(entry, preload_entry=threads is None)
+        self._workers: List[_Worker | None] = [None] * slots
+        self._running: Dict[int, RunSpec] = {}
+
+
+    def start(self, slot: int, runs: List[RunSpec], placement: Placement | None = None):
+        # workers run one job at a time
+        assert len(runs) == 1
+        worker = self._workers[slot]
+        if worker is None or not worker.process.is_alive():
+            worker = self._workers[slot] = self._spawn()
+
+        if placement is not None and placement.cpus:
+            os.sched_setaffinity(worker.process.pid, placement.cpus)
+
+        profile_path = self.profile(runs[0]) if self.profile is not None else None
+        worker.conn.send((runs[0], profile_path))
+        self._running[slot] = runs[0]
+
+
+    def wait(self) -> List[Tuple[int, List[RunResult]]]:
+        by_handle: Dict[Any, int] = {}
+        for slot in self._running:
+            worker = self._workers[slot]
+            assert worker is not None
+            by_handle[worker.conn] = slot
+            by_handle[worker.process.sentinel] = slot
+
+        ready = wait(list(by_handle.keys()))
+
+        out: List[Tuple[int, List[RunResult]]] = []
+        for slot in sorted(set(by_handle[r] for r in ready)):
+            worker = self._workers[slot]
+            assert worker is not None
+            run = self._running.pop(slot)
+
+            res = worker.receive(run)
+            if not worker.process.is_alive():
+                worker.close()
+                self._workers[slot] = None
+
+            out.append((slot, [res]))
+
+        return out
+
+
+    def close(self):
+        for worker in self._workers:
+            if worker is not None:
+                worker.close()
+
+        self._workers = [None] * self.slots
+        self._running = {}
+
+
+    def _spawn(self) -> '_Worker':
+        parent, child = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(child, self.entry, self.function, self.results_path, self.env),
+            daemon=True,
+        )
+        process.start()
+        child.close()
+        return _Worker(process, parent)
+
+
+class _Worker:
+    def __init__(self, process: Any, conn: Connection):
+        self.process = process
+        self.conn = conn
+
+
+    def receive(self, run: RunSpec) -> RunResult:
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError):
+            # the worker died before it could report back
+            self.process.join()
+            exit_code = self.process.exitcode
+            if exit_code is None or exit_code == 0:
+                exit_code = 1
+
+            return RunResult(run, exit_code, 0.0, f'worker process exited with code {self.process.exitcode}')
+
+
+    def close(self):
+        if self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+
+            self.process.join(timeout=5)
+
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+        self.conn.close()
+
+
+# ----------------------
+# -- Worker Internals --
+# ----------------------
+
+def _worker_main(conn: Connection, entry: str, function: str, results_path: str, env: Dict[str, str]):
+    os.environ.update(env)
+    fn = load_entry_function(entry, function)
+
+    while True:
+        msg: Tuple[RunSpec, str | None] | None = conn.recv()
+        if msg is None:
+            break
+
+        run, profile_path = msg
+        kwargs = {
+            'part': run.part_name,
+            'version': run.version,
+            'config_id': run.config_id,
+            'seed': run.seed,
+            'results_path': results_path,
+        }
+
+        profiler = cProfile.Profile() if profile_path is not None else None
+        cpu_start, _ = get_self_usage()
+        start = time.perf_counter()
+        exit_code, error = 0, None
+        try:
+            if profiler is not None:
+                profiler.runcall(fn, **kwargs)
+            else:
+                fn(**kwargs)
+        except Exception:
+            exit_code, error = 1, traceback.format_exc()
+
+        duration = time.perf_counter() - start
+        cpu_end, max_rss = get_self_usage()
+
+        if profiler is not None and profile_path is not None:
+            profiler.dump_stats(profile_path)
+
+        conn.send(RunResult(run, exit_code, duration, error, cpu_end - cpu_start, max_rss))
+
+    conn.close()
+
+
+def load_entry_function(entry: str, function: str = DEFAULT_ENTRY_FUNCTION) -> Callable[..., Any]:
+    module = _load_entry_module(entry)
+    fn = getattr(module, function, None)
+    if fn is None:
+        raise AttributeError(f'{entry} does not define an entry function <{function}>')
+
+    return fn
+
+
+def _load_entry_module(entry: str) -> ModuleType:
+    name = _get_module_name(entry)
+    if name in sys.modules:
+        return sys.modules[name]
+
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        pass
+
+    spec = importlib.util.spec_from_file_location(name, entry)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _get_module_name(entry: str) -> str:
+    # prefer the dotted path relative to the working directory
+    # so that the forkserver can import it by name
+    rel = os.path.relpath(os.path.abspath(entry), os.getcwd())
+    parts = rel.removesuffix('.py').split(os.sep)
+    if all(p.isidentifier() for p in parts):
+        return '.'.join(parts)
+
+    stem = os.path.basename(entry).removesuffix('.py')
+    return f'_ml_experiment_entry_{stem}'
+
+
+# what the first pool asked the forkserver to preload, which every later pool is stuck with
+_forkserver_preload: List[str] | None = None
+
+
+def _get_context(entry: str, preload_entry: bool = True):
+    global _forkserver_preload
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+
+    ctx = multiprocessing.get_context('forkserver')
+    if _forkserver_preload is None:
+        _forkserver_preload = [__name__, _get_module_name(entry)] if preload_entry else [__name__]
+        ctx.set_forkserver_preload(_forkserver_preload)
+
+    elif not preload_entry and len(_forkserver_preload) > 1:
+        # the forkserver has already sized the thread pools of whatever the entry imported
+        return multiprocessing.get_context('spawn')
+
+    return ctx
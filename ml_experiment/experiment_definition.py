@@ -1,12 +1,26 @@
+from collections import Counter
 from typing import Any
 import os
 import sqlite3
 
-from ml_experiment.metadata.metadata_table import MetadataTable
+import ml_experiment.metadata.catalog as catalog
+from ml_experiment.metadata.config_cache import ConfigCache, Configurations, default_cache
+from ml_experiment.metadata.metadata_table import MetadataTable, missing_configurations_error
+from ml_experiment.metadata.query import Where
+from ml_experiment._utils.optional import require_numpy, try_import_numpy
+import ml_experiment._utils.sqlite as sqlu
 from ml_experiment._utils.path import get_results_path
 
+# properties are indexed on demand once this process has queried them this often,
+# on tables large enough for an index to pay off
+AUTO_INDEX_AFTER = 3
+AUTO_INDEX_MIN_ROWS = 10_000
+
+# (database, table, property) -> number of queries in this process
+_query_counts: Counter = Counter()
+
 class ExperimentDefinition:
-    def __init__(self, part_name: str, version: int, base: str | None = None):
+    def __init__(self, part_name: str, version: int, base: str | None = None, cache: ConfigCache | bool = False):
         self.part_name = part_name
         self.version = version
         self.base_path = base or os.getcwd()
@@ -14,32 +28,184 @@ class ExperimentDefinition:
 
         self.table = MetadataTable(self.part_name, self.version)
 
-    def get_config(self, config_id: int) -> dict[str, Any]:
-        save_path = self.get_results_path(self.base_path)
-        db_path = os.path.join(save_path, 'metadata.db')
+        # a single connection is opened on first use and reused
+        self._con: sqlite3.Connection | None = None
+        self._db_path: str | None = None
+        self._db_ino: int | None = None
 
-        with sqlite3.connect(db_path) as con:
-            cur = con.cursor()
-            return self.table.get_configuration(cur, config_id)
+        # opt-in cache of the whole table, shared across instances
+        if cache is True:
+            cache = default_cache
+        self._cache = cache if isinstance(cache, ConfigCache) else None
 
+    def get_config(self, config_id: int) -> dict[str, Any]:
+        if self._cache is not None:
+            return self._get_cached_configs([config_id])[0]
 
+        cur = self._get_cursor()
+        return self.table.get_configuration(cur, config_id)
 
     def get_configs(self, config_ids: list[int], product_seeds: list[int] | None = None) -> list[dict[str, Any]]:
-        save_path = self.get_results_path(self.base_path)
-        db_path = os.path.join(save_path, 'metadata.db')
+        if self._cache is not None:
+            _c = self._get_cached_configs(config_ids)
+        else:
+            cur = self._get_cursor()
+            _c = self.table.get_configurations(cur, config_ids)
 
-        with sqlite3.connect(db_path) as con:
-            cur = con.cursor()
-            _c = [
-                self.table.get_configuration(cur, config_id)
-                for config_id in config_ids
+        if product_seeds is not None:
+            return [
+                {**c, 'seed': seed}
+                for c in _c
+                for seed in product_seeds
             ]
+        else:
+            return _c
+
+    def query_ids(self, where: Where, index: bool | None = None) -> list[int]:
+        """
+        Ids of the configurations whose properties satisfy every condition
+        in `where`, in increasing order, e.g.
+
+            exp.query_ids({'alpha': 0.01, 'tau': gt(5)})
+
+        See ml_experiment.metadata.query for the conditions. The queried
+        properties are indexed with `index=True`, never with `index=False`,
+        and by default once they are queried often on a large table.
+        """
+        self._index_properties(where, index)
+        return self.table.query_ids(self._get_cursor(), where)
+
+    def query(self, where: Where, index: bool | None = None) -> list[dict[str, Any]]:
+        # like `query_ids`, giving back the whole configurations
+        self._index_properties(where, index)
+        return self.table.query_configurations(self._get_cursor(), where)
+
+    def get_columnar(self, as_numpy: bool | None = None) -> dict[str, Any]:
+        """
+        Gives back every configuration of this version as one column per
+        property plus an aligned `id` column, sorted by id. Columns are
+        numpy arrays when numpy is installed (or `as_numpy=True`), and
+        lists otherwise.
+        """
+        cur = self._get_cursor()
+        columns = self.table.get_columnar(cur)
+
+        if as_numpy is False:
+            return columns
+
+        np = require_numpy() if as_numpy else try_import_numpy()
+        if np is None:
+            return columns
+
+        return {k: _to_array(np, v) for k, v in columns.items()}
+
+    def close(self):
+        if self._con is not None:
+            self._con.close()
+
+        self._con = None
+        self._db_path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    # ----------------------
+    # -- Internal Methods --
+    # ----------------------
+
+    def _get_db_path(self) -> str:
+        save_path = self.get_results_path(self.base_path)
+        return os.path.join(save_path, 'metadata.db')
+
+    def _get_cached_configs(self, config_ids: list[int]) -> list[dict[str, Any]]:
+        assert self._cache is not None
+
+        db_path = self._get_db_path()
+
+        def _load() -> Configurations:
+            return self.table.get_all_configurations(self._get_cursor())
+
+        def _version():
+            # committed versions never change, so their catalog entry identifies their contents
+            try:
+                return catalog.get_entry(self._get_cursor(), self.part_name, self.version)
+            except sqlite3.OperationalError:
+                return None
+
+        # a replaced database needs a new connection, the open one still reads the old file
+        if self._con is not None and self._db_ino != os.stat(db_path).st_ino:
+            self.close()
+
+        configs = self._cache.get_table(db_path, self.table.get_table_name(), _load, _version)
+
+        # only look up the requested ids, subtracting the keys view walks the whole table
+        missing = {config_id for config_id in config_ids if config_id not in configs}
+        if missing:
+            raise missing_configurations_error(self.table.get_table_name(), missing)
+
+        # hand out copies so callers cannot modify the cache
+        return [dict(configs[config_id]) for config_id in config_ids]
+
+    def _index_properties(self, where: Where, index: bool | None):
+        if index is False:
+            return
+
+        cur = self._get_cursor()
+        db_path = self._get_db_path()
+        table_name = self.table.get_table_name()
+        columns = set(where) & self.table.get_configuration_columns(cur)
+
+        if index is None:
+            for c in columns:
+                _query_counts[(db_path, table_name, c)] += 1
+
+            columns = {c for c in columns if _query_counts[(db_path, table_name, c)] >= AUTO_INDEX_AFTER}
+
+        columns = {c for c in columns if not self.table.has_column_index(cur, c)}
+        if not columns or (index is None and self.table.get_num_configurations(cur) < AUTO_INDEX_MIN_ROWS):
+            return
+
+        # this definition only holds a read-only connection
+        con = sqlu.connect(db_path)
+        try:
+            sqlu.write_transaction(con, lambda cur: [self.table.create_column_index(cur, c) for c in sorted(columns)])
+        except sqlite3.OperationalError:
+            # indexing on demand is only an optimization, e.g. the database may not be writable
+            if index:
+                raise
+        finally:
+            con.close()
+
+    def _get_cursor(self) -> sqlite3.Cursor:
+        db_path = self._get_db_path()
+
+        # the results path can be overridden after construction
+        # so make sure the open connection still points at the right database
+        if self._con is None or db_path != self._db_path:
+            self.close()
+            # workers only ever read, so never contend for the write lock
+            self._con = sqlu.connect(db_path, readonly=True)
+            self._db_path = db_path
+            self._db_ino = os.stat(db_path).st_ino
+
+        return self._con.cursor()
+
+
+def _to_array(np: Any, values: list[Any]):
+    kinds = set(type(v) for v in values)
+
+    # sqlite gives back NaN floats as NULL
+    if kinds <= {int, float, type(None)} and type(None) in kinds:
+        return np.asarray([np.nan if v is None else v for v in values], dtype=float)
+
+    # never let numpy silently convert mixed strings and numbers to strings
+    if str in kinds and len(kinds) > 1:
+        return np.asarray(values, dtype=object)
 
-            if product_seeds is not None:
-                return [
-                    {**c, 'seed': seed}
-                    for c in _c
-                    for seed in product_seeds
-                ]
-            else:
-                return _c
+    return np.asarray(values)
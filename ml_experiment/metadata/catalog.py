@@ -0,0 +1,156 @@
+import re
+import sqlite3
+from typing import List, Set, Tuple
+
+import ml_experiment._utils.sqlite as sqlu
+
+# bookkeeping about every table version, stored alongside the version tables
+CATALOG_TABLE = '_catalog'
+CATALOG_COLUMNS = ['part', 'version', 'n_rows', 'max_id', 'digest']
+
+_TABLE_NAME = re.compile(r'^(.*)-v(\d+)$')
+
+
+def parse_table_name(name: str) -> Tuple[str, int] | None:
+    m = _TABLE_NAME.match(name)
+    if m is None:
+        return None
+
+    return m.group(1), int(m.group(2))
+
+
+# ------------------
+# -- Construction --
+# ------------------
+
+def is_current(cur: sqlite3.Cursor) -> bool:
+    res = cur.execute(f"PRAGMA table_info('{CATALOG_TABLE}')").fetchall()
+    return set(x[1] for x in res) == set(CATALOG_COLUMNS)
+
+
+def create_catalog(cur: sqlite3.Cursor, temp: bool = False):
+    temp_str = 'TEMP' if temp else ''
+    cur.execute(f"""
+        CREATE {temp_str} TABLE IF NOT EXISTS '{CATALOG_TABLE}' (
+            part TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            n_rows INTEGER NOT NULL DEFAULT 0,
+            max_id INTEGER NOT NULL DEFAULT -1,
+            digest TEXT,
+            PRIMARY KEY (part, version)
+        )
+    """)
+
+
+def rebuild_catalog(cur: sqlite3.Cursor, temp: bool = False):
+    """
+    Databases written by older versions of this library either have
+    no catalog, or a catalog without row statistics. Build a complete
+    catalog from the version tables, keeping any digests already recorded.
+    Callers run this inside a write transaction, so other connections
+    never see the catalog dropped but not yet refilled.
+    """
+    digests = {}
+    if CATALOG_TABLE in sqlu.get_tables(cur):
+        cols = cur.execute(f"PRAGMA table_info('{CATALOG_TABLE}')").fetchall()
+        if 'digest' in set(x[1] for x in cols):
+            res = cur.execute(f"SELECT part, version, digest FROM '{CATALOG_TABLE}'")
+            digests = {(p, v): d for p, v, d in res}
+
+    # compact versions are views over their axes
+    versions = []
+    for name in sqlu.get_tables(cur) | sqlu.get_views(cur):
+        parsed = parse_table_name(name)
+        if parsed is None:
+            continue
+
+        n_rows, max_id = cur.execute(f"SELECT COUNT(*), COALESCE(MAX(id), -1) FROM '{name}'").fetchone()
+        versions.append((*parsed, n_rows, max_id, digests.get(parsed)))
+
+    if not temp:
+        cur.execute(f"DROP TABLE IF EXISTS '{CATALOG_TABLE}'")
+
+    create_catalog(cur, temp)
+    cur.executemany(
+        f"INSERT INTO '{CATALOG_TABLE}' (part, version, n_rows, max_id, digest) VALUES (?, ?, ?, ?, ?)",
+        versions,
+    )
+
+
+# -------------
+# -- Writers --
+# -------------
+
+def add_version(cur: sqlite3.Cursor, part_name: str, version: int, digest: str | None = None):
+    cur.execute(
+        f"INSERT INTO '{CATALOG_TABLE}' (part, version, digest) VALUES (?, ?, ?)",
+        (part_name, version, digest),
+    )
+
+
+def record_rows(cur: sqlite3.Cursor, part_name: str, version: int, n_rows: int, max_id: int):
+    cur.execute(
+        f"UPDATE '{CATALOG_TABLE}' SET n_rows = n_rows + ?, max_id = MAX(max_id, ?) WHERE part=? AND version=?",
+        (n_rows, max_id, part_name, version),
+    )
+
+
+def set_digest(cur: sqlite3.Cursor, part_name: str, version: int, digest: str):
+    cur.execute(
+        f"UPDATE '{CATALOG_TABLE}' SET digest=? WHERE part=? AND version=?",
+        (digest, part_name, version),
+    )
+
+
+# -------------
+# -- Getters --
+# -------------
+
+def get_parts(cur: sqlite3.Cursor) -> Set[str]:
+    res = cur.execute(f"SELECT DISTINCT part FROM '{CATALOG_TABLE}'")
+    return set(r[0] for r in res)
+
+
+def get_versions(cur: sqlite3.Cursor, part_name: str) -> List[int]:
+    res = cur.execute(f"SELECT version FROM '{CATALOG_TABLE}' WHERE part=? ORDER BY version", (part_name,))
+    return [r[0] for r in res]
+
+
+def has_version(cur: sqlite3.Cursor, part_name: str, version: int) -> bool:
+    res = cur.execute(f"SELECT 1 FROM '{CATALOG_TABLE}' WHERE part=? AND version=?", (part_name, version))
+    return res.fetchone() is not None
+
+
+def get_latest_version(cur: sqlite3.Cursor, part_name: str) -> int | None:
+    res = cur.execute(f"SELECT MAX(version) FROM '{CATALOG_TABLE}' WHERE part=?", (part_name,))
+    return res.fetchone()[0]
+
+
+def get_max_configuration_id(cur: sqlite3.Cursor, part_name: str) -> int:
+    res = cur.execute(f"SELECT COALESCE(MAX(max_id), -1) FROM '{CATALOG_TABLE}' WHERE part=?", (part_name,))
+    return res.fetchone()[0]
+
+
+def get_num_configurations(cur: sqlite3.Cursor, part_name: str, version: int) -> int | None:
+    res = cur.execute(f"SELECT n_rows FROM '{CATALOG_TABLE}' WHERE part=? AND version=?", (part_name, version)).fetchone()
+    if res is None:
+        return None
+
+    return res[0]
+
+
+def get_digest(cur: sqlite3.Cursor, part_name: str, version: int) -> str | None:
+    res = cur.execute(f"SELECT digest FROM '{CATALOG_TABLE}' WHERE part=? AND version=?", (part_name, version)).fetchone()
+    if res is None:
+        return None
+
+    return res[0]
+
+
+def get_entry(cur: sqlite3.Cursor, part_name: str, version: int) -> Tuple[int, int | None, str | None] | None:
+    # (version, n_rows, digest), which together identify the contents of a committed version
+    res = cur.execute(f"SELECT version, n_rows, digest FROM '{CATALOG_TABLE}' WHERE part=? AND version=?", (part_name, version)).fetchone()
+    if res is None:
+        return None
+
+    return res[0], res[1], res[2]
@@ -0,0 +1,306 @@
+"""
+Compact storage of a table version as the axes of its sweep, instead of
+one row per configuration. A configuration is a position along every
+axis, so it is numbered by its mixed-radix index
+
+    index = sum(position[k] * stride[k])
+
+and the ids of a version are stored as runs of consecutive indices with
+consecutive ids. A sweep whose ids are all new is a single run, so
+finding a configuration from its id, or its id from the configuration,
+takes O(#axes). Configurations that keep the ids of older versions, and
+sweeps pruned by conditions or constraints, split the ids into more runs.
+
+Every compact version is also a read-only view with the same name and
+columns as a row table, so SQL over version tables works on either.
+"""
+import sqlite3
+import ml_experiment._utils.sqlite as sqlu
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, Mapping, NamedTuple, Sequence, Tuple
+
+from ml_experiment.metadata.fingerprint import ValueType
+
+# the name and number of values of every axis of every compact version
+AXES_TABLE = '_axes'
+
+# the values along every axis, in order
+VALUES_TABLE = '_axis_values'
+
+# runs of consecutive indices that map to consecutive ids
+RUNS_TABLE = '_id_runs'
+
+
+class Run(NamedTuple):
+    start: int
+    id: int
+    length: int
+
+
+class CompactLayout:
+    def __init__(self, axes: Mapping[str, Sequence[ValueType]], runs: Iterable[Run] = ()):
+        self.names = list(axes)
+        self.values = [list(axes[k]) for k in self.names]
+        self._positions = [{v: i for i, v in enumerate(values)} for values in self.values]
+
+        self.strides = get_strides([len(values) for values in self.values])
+
+        self.runs: List[Run] = sorted(runs)
+        self._by_id: List[Run] | None = None
+
+
+    def encode(self, configuration: Mapping[str, ValueType]) -> int | None:
+        # the index of a configuration, or None if it is not on the grid
+        index = 0
+        for name, positions, stride in zip(self.names, self._positions, self.strides, strict=True):
+            pos = positions.get(configuration[name])
+            if pos is None:
+                return None
+
+            index += pos * stride
+
+        return index
+
+
+    def decode(self, index: int) -> Dict[str, ValueType]:
+        return {
+            name: values[(index // stride) % len(values)]
+            for name, values, stride in zip(self.names, self.values, self.strides, strict=True)
+        }
+
+
+    def iter_configurations(self) -> Iterator[Tuple[int, Dict[str, ValueType]]]:
+        # every id and its configuration, in increasing id order
+        axes = list(zip(self.names, self.values, self.strides, strict=True))
+        for run in self._get_runs_by_id():
+            for offset in range(run.length):
+                index = run.start + offset
+                yield run.id + offset, {name: values[(index // stride) % len(values)] for name, values, stride in axes}
+
+
+    def get_id(self, index: int) -> int | None:
+        run = _find(self.runs, index, 0)
+        if run is None:
+            return None
+
+        return run.id + index - run.start
+
+
+    def get_index(self, config_id: int) -> int | None:
+        run = _find(self._get_runs_by_id(), config_id, 1)
+        if run is None:
+            return None
+
+        return run.start + config_id - run.id
+
+
+    def get_num_configurations(self) -> int:
+        return sum(r.length for r in self.runs)
+
+
+    def add_runs(self, runs: Sequence[Run]):
+        # runs are usually added in increasing index order while committing
+        in_order = not self.runs or not runs or runs[0].start > self.runs[-1].start
+        self.runs.extend(runs)
+        if not in_order:
+            self.runs.sort()
+
+        self._by_id = None
+
+
+    def _get_runs_by_id(self) -> List[Run]:
+        if self._by_id is None:
+            self._by_id = sorted(self.runs, key=lambda r: r.id)
+
+        return self._by_id
+
+
+def get_strides(sizes: Sequence[int]) -> List[int]:
+    # the last axis varies fastest, like itertools.product
+    strides = [1] * len(sizes)
+    for i in reversed(range(len(sizes) - 1)):
+        strides[i] = strides[i + 1] * sizes[i + 1]
+
+    return strides
+
+
+def to_runs(pairs: Iterable[Tuple[int, int]]) -> List[Run]:
+    # (index, id) pairs in increasing index order, merged into runs
+    runs: List[Run] = []
+    for index, config_id in pairs:
+        if runs:
+            last = runs[-1]
+            if index == last.start + last.length and config_id == last.id + last.length:
+                runs[-1] = last._replace(length=last.length + 1)
+                continue
+
+        runs.append(Run(index, config_id, 1))
+
+    return runs
+
+
+def _find(runs: List[Run], key: int, field: int) -> Run | None:
+    i = bisect_right(runs, key, key=lambda r: r[field]) - 1
+    if i < 0:
+        return None
+
+    run = runs[i]
+    if key >= run[field] + run.length:
+        return None
+
+    return run
+
+
+# -------------
+# -- Storage --
+# -------------
+
+def create_tables(cur: sqlite3.Cursor):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS '{AXES_TABLE}' (
+            part TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            axis INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            stride INTEGER NOT NULL,
+            PRIMARY KEY (part, version, axis)
+        )
+    """)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS '{VALUES_TABLE}' (
+            part TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            axis INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            value,
+            PRIMARY KEY (part, version, axis, position)
+        )
+    """)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS '{RUNS_TABLE}' (
+            part TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            idx INTEGER NOT NULL,
+            id INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            PRIMARY KEY (part, version, idx)
+        )
+    """)
+    sqlu.create_index(cur, f'{RUNS_TABLE}:id', RUNS_TABLE, ['part', 'version', 'id'])
+
+
+def add_version(cur: sqlite3.Cursor, part_name: str, version: int, axes: Mapping[str, Sequence[ValueType]]):
+    create_tables(cur)
+    sizes = [len(values) for values in axes.values()]
+    strides = get_strides(sizes)
+    cur.executemany(
+        f"INSERT INTO '{AXES_TABLE}' (part, version, axis, name, size, stride) VALUES (?, ?, ?, ?, ?, ?)",
+        ((part_name, version, axis, name, size, stride) for axis, (name, size, stride) in enumerate(zip(axes, sizes, strides, strict=True))),
+    )
+    cur.executemany(
+        f"INSERT INTO '{VALUES_TABLE}' (part, version, axis, position, value) VALUES (?, ?, ?, ?, ?)",
+        (
+            (part_name, version, axis, position, value)
+            for axis, values in enumerate(axes.values())
+            for position, value in enumerate(values)
+        ),
+    )
+
+    # the view enumerates every run, and looks up the value along each axis by its position
+    key = f"part={_literal(part_name)} AND version={int(version)}"
+    cols = [
+        f"(SELECT value FROM '{VALUES_TABLE}' WHERE {key} AND axis={axis} AND position=(idx / {stride}) % {size}) AS \"{name}\""
+        for axis, (name, size, stride) in enumerate(zip(axes, sizes, strides, strict=True))
+    ]
+    cur.execute(f"""
+        CREATE VIEW '{part_name}-v{version}' AS
+        WITH RECURSIVE _rows(idx, id, last_idx) AS (
+            SELECT idx, id, idx + length - 1 FROM '{RUNS_TABLE}' WHERE {key}
+            UNION ALL
+            SELECT idx + 1, id + 1, last_idx FROM _rows WHERE idx < last_idx
+        )
+        SELECT {', '.join([*cols, 'id'])} FROM _rows
+    """)
+
+
+def add_runs(cur: sqlite3.Cursor, part_name: str, version: int, layout: CompactLayout, runs: List[Run]):
+    """
+    Stores `runs`, which follow every run already in `layout`,
+    extending the last stored run when the first new one continues it.
+    """
+    if not runs:
+        return
+
+    if layout.runs:
+        last, first = layout.runs[-1], runs[0]
+        if first.start == last.start + last.length and first.id == last.id + last.length:
+            merged = last._replace(length=last.length + first.length)
+            cur.execute(
+                f"UPDATE '{RUNS_TABLE}' SET length=? WHERE part=? AND version=? AND idx=?",
+                (merged.length, part_name, version, last.start),
+            )
+            layout.runs.pop()
+            layout.add_runs([merged])
+            runs = runs[1:]
+
+    cur.executemany(
+        f"INSERT INTO '{RUNS_TABLE}' (part, version, idx, id, length) VALUES (?, ?, ?, ?, ?)",
+        ((part_name, version, *r) for r in runs),
+    )
+    layout.add_runs(runs)
+
+
+def is_compact(cur: sqlite3.Cursor, part_name: str, version: int) -> bool:
+    res = cur.execute("SELECT 1 FROM sqlite_master WHERE type='view' AND name=?", (f'{part_name}-v{version}',))
+    return res.fetchone() is not None
+
+
+def load(cur: sqlite3.Cursor, part_name: str, version: int) -> CompactLayout:
+    # the whole layout, for decoding or encoding many configurations
+    res = cur.execute(f"SELECT name FROM '{AXES_TABLE}' WHERE part=? AND version=? ORDER BY axis", (part_name, version))
+    axes: Dict[str, List[ValueType]] = {r[0]: [] for r in res}
+    names = list(axes)
+    res = cur.execute(
+        f"SELECT axis, value FROM '{VALUES_TABLE}' WHERE part=? AND version=? ORDER BY axis, position",
+        (part_name, version),
+    )
+    for axis, value in res:
+        axes[names[axis]].append(value)
+
+    res = cur.execute(f"SELECT idx, id, length FROM '{RUNS_TABLE}' WHERE part=? AND version=?", (part_name, version))
+    return CompactLayout(axes, (Run(*r) for r in res))
+
+
+def decode(cur: sqlite3.Cursor, part_name: str, version: int, config_id: int) -> Dict[str, ValueType] | None:
+    """
+    A single configuration, found with one probe for the run of its id
+    and one for its value along every axis, without loading the layout.
+    """
+    res = cur.execute(f"""
+        SELECT a.name, v.value FROM (
+            SELECT idx + :id - id AS i FROM (
+                SELECT idx, id, length FROM '{RUNS_TABLE}'
+                WHERE part=:part AND version=:version AND id<=:id
+                ORDER BY id DESC LIMIT 1
+            ) WHERE :id < id + length
+        ) AS r
+        LEFT JOIN '{AXES_TABLE}' AS a ON a.part=:part AND a.version=:version
+        LEFT JOIN '{VALUES_TABLE}' AS v ON v.part=:part AND v.version=:version AND v.axis=a.axis AND v.position=(r.i / a.stride) % a.size
+        ORDER BY a.axis
+    """, {'part': part_name, 'version': version, 'id': config_id}).fetchall()
+
+    # no rows when the id is not in this version, and a single empty row when there are no axes
+    if not res:
+        return None
+
+    return {name: value for name, value in res if name is not None}
+
+
+def count(cur: sqlite3.Cursor, part_name: str, version: int) -> int:
+    res = cur.execute(f"SELECT COALESCE(SUM(length), 0) FROM '{RUNS_TABLE}' WHERE part=? AND version=?", (part_name, version))
+    return res.fetchone()[0]
+
+
+def _literal(s: str) -> str:
+    return "'" + s.replace("'", "''") + "'"
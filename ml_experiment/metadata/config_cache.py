@@ -0,0 +1,109 @@
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, NamedTuple, Tuple
+
+from ml_experiment.metadata.metadata_table import ValueType
+
+Configurations = Dict[int, Dict[str, ValueType]]
+
+# total number of configurations held across all cached tables
+DEFAULT_MAX_ROWS = 1_000_000
+
+
+class _Entry(NamedTuple):
+    token: Tuple[int, ...]
+    version: Hashable | None
+    configurations: Configurations
+
+
+class ConfigCache:
+    """
+    Process-local cache of whole table versions, keyed by database
+    and table. Entries are validated against the database file's
+    stat info, so while nothing is written sqlite is never asked
+    whether anything changed.
+
+    Writes to other tables in the same file, like the run ledger, also
+    change its stat info. When `version` is given it identifies the
+    contents of the table, and an entry whose version still matches
+    is kept as long as the file was not replaced.
+    """
+    def __init__(self, max_rows: int = DEFAULT_MAX_ROWS):
+        self.max_rows = max_rows
+
+        self._entries: OrderedDict[Tuple[str, str], _Entry] = OrderedDict()
+        self._rows = 0
+
+
+    def get_table(
+        self,
+        db_path: str,
+        table_name: str,
+        load: Callable[[], Configurations],
+        version: Callable[[], Hashable | None] | None = None,
+    ) -> Configurations:
+        key = (db_path, table_name)
+        token = file_token(db_path)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.token == token:
+            self._entries.move_to_end(key)
+            return entry.configurations
+
+        # the file changed, but the table did not if it is the same file with the same version
+        current = version() if version is not None else None
+        if entry is not None and current is not None and entry.token[0] == token[0] and entry.version == current:
+            self._entries[key] = entry._replace(token=token)
+            self._entries.move_to_end(key)
+            return entry.configurations
+
+        if entry is not None:
+            self._evict(key)
+
+        configurations = load()
+        self._entries[key] = _Entry(token, current, configurations)
+        self._rows += len(configurations)
+
+        # evict least recently used tables until we fit
+        # but always keep the table that was just loaded
+        while self._rows > self.max_rows and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            self._evict(oldest)
+
+        return configurations
+
+
+    def clear(self):
+        self._entries.clear()
+        self._rows = 0
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def _evict(self, key: Tuple[str, str]):
+        entry = self._entries.pop(key)
+        self._rows -= len(entry.configurations)
+
+
+def file_token(path: str) -> Tuple[int, ...]:
+    # any commit to the database changes the size or mtime of the file
+    # or, in WAL mode, of the write-ahead log next to it
+    st = os.stat(path)
+    token = (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    try:
+        wal = os.stat(path + '-wal')
+    except FileNotFoundError:
+        return token
+
+    # readers create an empty log, which holds no commits
+    if wal.st_size == 0:
+        return token
+
+    return token + (wal.st_ino, wal.st_size, wal.st_mtime_ns)
+
+
+# shared by every ExperimentDefinition that opts into caching
+default_cache = ConfigCache()
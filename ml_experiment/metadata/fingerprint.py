@@ -0,0 +1,122 @@
+import hashlib
+import json
+from types import CodeType, FunctionType, ModuleType
+from typing import Any, Callable, Dict, Iterable, Mapping, Set, Tuple
+
+ValueType = int | float | str | bool
+
+def canonical_value(v: ValueType) -> int | float | str:
+    # sqlite considers 1, 1.0 and True to be equal,
+    # so they must also share a fingerprint
+    if isinstance(v, bool):
+        return int(v)
+
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+
+    return v
+
+
+def fingerprint(configuration: Dict[str, ValueType]) -> int:
+    items = sorted((k, canonical_value(v)) for k, v in configuration.items())
+    s = json.dumps(items, separators=(',', ':'))
+
+    # sqlite integers are signed 64-bit
+    digest = hashlib.blake2b(s.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def sweep_digest(
+    properties: Mapping[str, Iterable[ValueType]],
+    prior_values: Mapping[str, ValueType],
+    conditions: Mapping[str, Tuple[Mapping[str, Iterable[ValueType]], ValueType]] | None = None,
+    selection: str | None = None,
+) -> str:
+    # a sweep is a set of values per property, so neither the order of the
+    # properties nor the order of the values within a property matters
+    axes = {
+        k: sorted({json.dumps(canonical_value(v)) for v in values})
+        for k, values in properties.items()
+    }
+    priors = {k: canonical_value(v) for k, v in prior_values.items()}
+    sweep: Dict[str, Any] = {'properties': axes, 'priors': priors}
+
+    # only present for sweeps that use them, so plain sweeps keep their digest
+    if conditions:
+        sweep['conditions'] = {
+            k: {
+                'when': {c: sorted({json.dumps(canonical_value(v)) for v in allowed}) for c, allowed in when.items()},
+                'otherwise': canonical_value(otherwise),
+            }
+            for k, (when, otherwise) in conditions.items()
+        }
+
+    if selection is not None:
+        sweep['selection'] = selection
+
+    s = json.dumps(sweep, sort_keys=True, separators=(',', ':'))
+    return hashlib.blake2b(s.encode(), digest_size=16).hexdigest()
+
+
+def function_digest(fn: Callable[..., Any]) -> str:
+    """
+    Identifies what a function computes without calling it: its code, its
+    defaults, the values it closes over and the globals it reads, with the
+    functions among those digested the same way. Anything else it depends
+    on, like a file it reads, is not seen. Values without a stable repr
+    give a new digest every time, which is only ever too cautious.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    _digest_value(h, fn, set())
+    return h.hexdigest()
+
+
+def _digest_function(h: Any, fn: FunctionType, seen: Set[int]):
+    # a function that refers to itself is only digested once
+    if id(fn) in seen:
+        return
+    seen.add(id(fn))
+
+    _digest_code(h, fn.__code__)
+    h.update(repr((fn.__defaults__, fn.__kwdefaults__)).encode())
+
+    for cell in fn.__closure__ or ():
+        try:
+            _digest_value(h, cell.cell_contents, seen)
+        except ValueError:
+            # a variable that was never assigned
+            h.update(b'<empty>')
+
+    for name in sorted(_get_names(fn.__code__)):
+        if name in fn.__globals__:
+            h.update(name.encode())
+            _digest_value(h, fn.__globals__[name], seen)
+
+
+def _digest_code(h: Any, code: CodeType):
+    h.update(code.co_code)
+    h.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            _digest_code(h, const)
+        else:
+            h.update(repr(const).encode())
+
+
+def _digest_value(h: Any, value: Any, seen: Set[int]):
+    if isinstance(value, FunctionType):
+        _digest_function(h, value, seen)
+    elif isinstance(value, ModuleType):
+        h.update(value.__name__.encode())
+    else:
+        h.update(repr(value).encode())
+
+
+def _get_names(code: CodeType) -> Set[str]:
+    # every global or attribute name used, including by nested functions
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            names |= _get_names(const)
+
+    return names
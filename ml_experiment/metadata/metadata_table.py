@@ -1,9 +1,27 @@
 import sqlite3
-from typing import Dict, Iterable, Set
+import ml_experiment._utils.sqlite as sqlu
+import ml_experiment.metadata.catalog as catalog
+import ml_experiment.metadata.compact as compact
+from typing import TYPE_CHECKING, Dict, Iterable, List, Sequence, Set
+
+from ml_experiment.metadata.fingerprint import fingerprint
+
+if TYPE_CHECKING:
+    from ml_experiment.metadata.query import Where
 
 # TODO: find some root-level place to store these types
 ValueType = int | float | str | bool
 
+# internal column holding a hash of each configuration
+# this column is indexed so that configurations can be found with a single probe
+FINGERPRINT_COLUMN = '_fingerprint'
+
+# maximum number of bound parameters used in a single `IN (...)` query
+_MAX_PARAMS = 500
+
+# configurations of a compact version decoded one at a time before the whole layout is loaded instead
+_MAX_POINT_DECODES = 100
+
 class MetadataTable:
     def __init__(self, part_name: str, version: int):
         self.part_name = part_name
@@ -11,13 +29,33 @@ class MetadataTable:
 
         # cached results
         self._cols: Set[str] | None = None
+        self._has_fingerprint: bool | None = None
         self._configuration_ids: Set[int] | None = None
+        self._indexed_columns: Set[str] = set()
+        self._is_compact: bool | None = None
+        self._layout: compact.CompactLayout | None = None
 
 
     def get_table_name(self):
         return f'{self.part_name}-v{self.version}'
 
 
+    def is_compact(self, cur: sqlite3.Cursor) -> bool:
+        # whether this version stores its axes instead of rows, see ml_experiment.metadata.compact
+        if self._is_compact is None:
+            self._is_compact = compact.is_compact(cur, self.part_name, self.version)
+
+        return self._is_compact
+
+
+    def get_layout(self, cur: sqlite3.Cursor) -> compact.CompactLayout | None:
+        # the whole layout of a compact version, or None for a table of rows
+        if self._layout is None and self.is_compact(cur):
+            self._layout = compact.load(cur, self.part_name, self.version)
+
+        return self._layout
+
+
     def get_columns(self, cur: sqlite3.Cursor) -> Set[str]:
         if self._cols is not None:
             return self._cols
@@ -26,10 +64,77 @@ class MetadataTable:
             cur.execute(f"PRAGMA table_info('{self.get_table_name()}')")
             .fetchall()
         )
-        self._cols = set(x[1] for x in res)
+        cols = set(x[1] for x in res)
+        self._has_fingerprint = FINGERPRINT_COLUMN in cols
+        self._cols = cols - {FINGERPRINT_COLUMN}
         return self._cols
 
 
+    def has_fingerprint(self, cur: sqlite3.Cursor) -> bool:
+        if self._has_fingerprint is None:
+            self.get_columns(cur)
+
+        assert self._has_fingerprint is not None
+        return self._has_fingerprint
+
+
+    def get_index_name(self):
+        return f'{self.get_table_name()}{FINGERPRINT_COLUMN}'
+
+
+    def create_fingerprint_index(self, cur: sqlite3.Cursor):
+        sqlu.create_index(cur, self.get_index_name(), self.get_table_name(), [FINGERPRINT_COLUMN])
+
+
+    def ensure_fingerprint(self, cur: sqlite3.Cursor):
+        """
+        Tables written before configurations were fingerprinted
+        are missing the fingerprint column. Add and backfill it, then
+        build the index.
+        """
+        if self.has_fingerprint(cur) or self.is_compact(cur):
+            return
+
+        table_name = self.get_table_name()
+        cols = sorted(self.get_configuration_columns(cur))
+        col_str = ', '.join(f'"{k}"' for k in cols)
+
+        cur.execute(f"ALTER TABLE '{table_name}' ADD COLUMN {FINGERPRINT_COLUMN} INTEGER")
+        rows = cur.execute(f"SELECT {col_str}, id FROM '{table_name}'").fetchall()
+        cur.executemany(
+            f"UPDATE '{table_name}' SET {FINGERPRINT_COLUMN}=? WHERE id=?",
+            ((fingerprint(dict(zip(cols, row[:-1], strict=True))), row[-1]) for row in rows),
+        )
+        self.create_fingerprint_index(cur)
+
+        self._cols = None
+        self._has_fingerprint = None
+
+
+    def get_column_index_name(self, column: str):
+        return f'{self.get_table_name()}:{column}'
+
+
+    def has_column_index(self, cur: sqlite3.Cursor, column: str) -> bool:
+        # compact versions are views, which cannot be indexed
+        if column in self._indexed_columns or self.is_compact(cur):
+            return True
+
+        res = cur.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name=?", [self.get_column_index_name(column)]).fetchone()
+        if res is not None:
+            self._indexed_columns.add(column)
+
+        return res is not None
+
+
+    def create_column_index(self, cur: sqlite3.Cursor, column: str):
+        if column not in self.get_configuration_columns(cur):
+            raise ValueError(f'<{self.get_table_name()}> has no property <{column}>')
+
+        sqlu.create_index(cur, self.get_column_index_name(column), self.get_table_name(), [f'"{column}"'])
+        self._indexed_columns.add(column)
+
+
     def get_configuration_columns(self, cur: sqlite3.Cursor):
         cols = self.get_columns(cur)
         return cols - {'id'}
@@ -39,6 +144,11 @@ class MetadataTable:
         if self._configuration_ids is not None:
             return self._configuration_ids
 
+        layout = self.get_layout(cur)
+        if layout is not None:
+            self._configuration_ids = {i for r in layout.runs for i in range(r.id, r.id + r.length)}
+            return self._configuration_ids
+
         res = (
             cur.execute(f"SELECT DISTINCT id FROM '{self.get_table_name()}'")
             .fetchall()
@@ -47,7 +157,34 @@ class MetadataTable:
         return self._configuration_ids
 
 
+    def get_num_configurations(self, cur: sqlite3.Cursor) -> int:
+        if self._layout is not None:
+            return self._layout.get_num_configurations()
+
+        if self.is_compact(cur):
+            return compact.count(cur, self.part_name, self.version)
+
+        res = cur.execute(f"SELECT COUNT(*) FROM '{self.get_table_name()}'").fetchone()
+        return res[0]
+
+
+    def has_same_configuration_ids(self, cur: sqlite3.Cursor, other: 'MetadataTable') -> bool:
+        # ids are primary keys, so if both tables have the same number of rows
+        # and every id of one is in the other, then the id sets are equal
+        n = self.get_num_configurations(cur)
+        if n != other.get_num_configurations(cur):
+            return False
+
+        res = cur.execute(
+            f"SELECT COUNT(*) FROM '{self.get_table_name()}' AS a JOIN '{other.get_table_name()}' AS b ON a.id = b.id"
+        ).fetchone()
+        return res[0] == n
+
+
     def get_configuration_id(self, cur: sqlite3.Cursor, configuration: Dict[str, ValueType]) -> int | None:
+        if self.is_compact(cur):
+            return self.lookup_configuration_ids(cur, [configuration])[0]
+
         col_names = self.get_configuration_columns(cur)
 
         # if this table does not have the same columns
@@ -61,6 +198,12 @@ class MetadataTable:
         where = ' AND '.join(f'"{k}"=?' for k in col_names)
         conf_values = [configuration[k] for k in col_names]
 
+        # probe the fingerprint index first, the remaining filters only
+        # guard against hash collisions
+        if self.has_fingerprint(cur):
+            where = f'{FINGERPRINT_COLUMN}=? AND {where}'
+            conf_values = [fingerprint(configuration)] + conf_values
+
         res = (
             cur.execute(f"SELECT id FROM '{table_name}' WHERE {where}", conf_values)
             .fetchone()
@@ -71,28 +214,250 @@ class MetadataTable:
 
         return res[0]
 
+
+    def lookup_configuration_ids(self, cur: sqlite3.Cursor, configurations: Sequence[Dict[str, ValueType]]) -> List[int | None]:
+        col_names = self.get_configuration_columns(cur)
+
+        # only configurations with exactly this table's columns can match
+        # everything else is known to not be in this table
+        candidates = [i for i, c in enumerate(configurations) if col_names == set(c.keys())]
+        out: List[int | None] = [None] * len(configurations)
+        if len(candidates) == 0:
+            return out
+
+        # a compact version finds the id from the configuration's position on the grid
+        layout = self.get_layout(cur)
+        if layout is not None:
+            for i in candidates:
+                position = layout.encode(configurations[i])
+                out[i] = layout.get_id(position) if position is not None else None
+
+            return out
+
+        cols = sorted(col_names)
+        col_str = ', '.join(f'"{k}"' for k in cols)
+        table_name = self.get_table_name()
+
+        if not self.has_fingerprint(cur):
+            # scan the table once and build an in-memory index of values -> id
+            # rows are visited in id order, so on duplicate rows the first id wins
+            # exactly like the single-row lookup's `fetchone`
+            res = cur.execute(f"SELECT {col_str}, id FROM '{table_name}' ORDER BY id")
+
+            index: Dict[tuple, int] = {}
+            for row in res:
+                index.setdefault(tuple(row[:-1]), row[-1])
+
+            for i in candidates:
+                out[i] = index.get(tuple(configurations[i][k] for k in cols))
+
+            return out
+
+        # otherwise probe the fingerprint index in chunks
+        # only rows sharing a fingerprint with a candidate are ever read
+        for start in range(0, len(candidates), _MAX_PARAMS):
+            chunk = candidates[start:start + _MAX_PARAMS]
+            prints = [fingerprint(configurations[i]) for i in chunk]
+            params = ', '.join(['?'] * len(chunk))
+            res = cur.execute(
+                f"SELECT {col_str}, id FROM '{table_name}' WHERE {FINGERPRINT_COLUMN} IN ({params}) ORDER BY id",
+                prints,
+            )
+
+            index = {}
+            for row in res:
+                index.setdefault(tuple(row[:-1]), row[-1])
+
+            for i in chunk:
+                out[i] = index.get(tuple(configurations[i][k] for k in cols))
+
+        return out
+
+
     def get_configuration(self, cur: sqlite3.Cursor, config_id: int) -> Dict[str, ValueType]:
-        if config_id not in self.get_configuration_ids(cur):
-            raise ValueError(f"config_id <{config_id}> is not in table <{self.get_table_name()}>")
+        return self.get_configurations(cur, [config_id])[0]
 
+
+    def get_configurations(self, cur: sqlite3.Cursor, config_ids: Sequence[int]) -> List[Dict[str, ValueType]]:
         table_name = self.get_table_name()
+
+        if self.is_compact(cur):
+            return self._decode_configurations(cur, config_ids)
+
         cols = list(self.get_columns(cur))
-        col_str = ', '.join(cols)
-        res = (
-            cur.execute(f"SELECT {col_str} FROM '{table_name}' WHERE id=?", (config_id,))
-            .fetchone()
-        )
+        col_str = ', '.join(f'"{k}"' for k in cols)
+        id_idx = cols.index('id')
+
+        wanted = set(config_ids)
+        found: Dict[int, tuple] = {}
+
+        # when asking for a large fraction of the table, a single scan
+        # is cheaper than many index lookups
+        if len(wanted) > _MAX_PARAMS and 4 * len(wanted) >= self.get_num_configurations(cur):
+            for row in cur.execute(f"SELECT {col_str} FROM '{table_name}'"):
+                if row[id_idx] in wanted:
+                    found[row[id_idx]] = row
+
+        else:
+            ids = list(wanted)
+            for start in range(0, len(ids), _MAX_PARAMS):
+                chunk = ids[start:start + _MAX_PARAMS]
+                params = ', '.join(['?'] * len(chunk))
+                res = cur.execute(f"SELECT {col_str} FROM '{table_name}' WHERE id IN ({params})", chunk)
+                for row in res:
+                    found[row[id_idx]] = row
+
+        missing = wanted - found.keys()
+        if missing:
+            raise missing_configurations_error(table_name, missing)
+
+        return [dict(zip(cols, found[config_id], strict=True)) for config_id in config_ids]
+
+
+    def get_all_configurations(self, cur: sqlite3.Cursor) -> Dict[int, Dict[str, ValueType]]:
+        layout = self.get_layout(cur)
+        if layout is not None:
+            return {config_id: {**c, 'id': config_id} for config_id, c in layout.iter_configurations()}
+
+        cols = list(self.get_columns(cur))
+        col_str = ', '.join(f'"{k}"' for k in cols)
+        res = cur.execute(f"SELECT {col_str} FROM '{self.get_table_name()}'")
+
+        configurations = (dict(zip(cols, row, strict=True)) for row in res)
+        return {c['id']: c for c in configurations}  # type: ignore
+
+
+    def query_ids(self, cur: sqlite3.Cursor, where: 'Where') -> List[int]:
+        """
+        Ids of the configurations satisfying every condition in `where`,
+        in increasing order. See ml_experiment.metadata.query.
+        """
+        clause, params = self._compile_query(cur, where)
+        res = cur.execute(f"SELECT id FROM '{self.get_table_name()}' WHERE {clause} ORDER BY id", params)
+        return [r[0] for r in res]
+
+
+    def query_configurations(self, cur: sqlite3.Cursor, where: 'Where') -> List[Dict[str, ValueType]]:
+        clause, params = self._compile_query(cur, where)
+        cols = list(self.get_columns(cur))
+        col_str = ', '.join(f'"{k}"' for k in cols)
+        res = cur.execute(f"SELECT {col_str} FROM '{self.get_table_name()}' WHERE {clause} ORDER BY id", params)
+        return [dict(zip(cols, row, strict=True)) for row in res]
 
-        return {k: v for k, v in zip(cols, res, strict=True)}
+
+    def _compile_query(self, cur: sqlite3.Cursor, where: 'Where'):
+        # imported here, since the query module needs this module's types
+        from ml_experiment.metadata.query import to_sql
+
+        unknown = set(where) - self.get_configuration_columns(cur)
+        if unknown:
+            raise ValueError(f'<{self.get_table_name()}> has no properties <{sorted(unknown)}>')
+
+        return to_sql(where)
+
+
+    def get_columnar(self, cur: sqlite3.Cursor) -> Dict[str, List[ValueType]]:
+        """
+        Gives back the whole table as one list of values per column,
+        including `id`, with rows sorted by id.
+        """
+        cols = sorted(self.get_columns(cur))
+
+        layout = self.get_layout(cur)
+        if layout is not None:
+            configurations = self.get_all_configurations(cur).values()
+            return {k: [c[k] for c in configurations] for k in cols}
+
+        col_str = ', '.join(f'"{k}"' for k in cols)
+        res = cur.execute(f"SELECT {col_str} FROM '{self.get_table_name()}' ORDER BY id").fetchall()
+
+        if len(res) == 0:
+            return {k: [] for k in cols}
+
+        return {k: list(v) for k, v in zip(cols, zip(*res, strict=True), strict=True)}
 
 
     def add_configurations(self, cur: sqlite3.Cursor, configurations: Iterable[Dict[str, ValueType]]):
+        layout = self.get_layout(cur)
+        if layout is not None:
+            self._add_compact_configurations(cur, layout, configurations)
+            return
+
         # get an ordered list of cols
         cols = list(self.get_columns(cur))
+        conf_cols = [k for k in cols if k != 'id']
+        with_fingerprint = self.has_fingerprint(cur)
+        insert_cols = cols + [FINGERPRINT_COLUMN] if with_fingerprint else cols
 
         table_name = self.get_table_name()
-        conf_str = ', '.join(['?'] * len(cols))
-        col_names = ', '.join(cols)
-        conf_values = [[c[k] for k in cols] for c in configurations]
+        conf_str = ', '.join(['?'] * len(insert_cols))
+        col_names = ', '.join(insert_cols)
+
+        # keep the catalog's row statistics up to date while streaming rows
+        n_rows = 0
+        max_id = -1
+
+        def _row(c: Dict[str, ValueType]):
+            nonlocal n_rows, max_id
+            n_rows += 1
+            max_id = max(max_id, int(c['id']))
+
+            values = [c[k] for k in cols]
+            if with_fingerprint:
+                values.append(fingerprint({k: c[k] for k in conf_cols}))
+            return values
+
+        cur.executemany(f"INSERT INTO '{table_name}' ({col_names}) VALUES ({conf_str})", (_row(c) for c in configurations))
+        catalog.record_rows(cur, self.part_name, self.version, n_rows, max_id)
+
+
+    def _add_compact_configurations(self, cur: sqlite3.Cursor, layout: compact.CompactLayout, configurations: Iterable[Dict[str, ValueType]]):
+        # configurations must be added in increasing grid order
+        pairs = []
+        for c in configurations:
+            index = layout.encode(c)
+            if index is None:
+                raise ValueError(f'Configuration <{c}> is not on the axes of <{self.get_table_name()}>')
+
+            pairs.append((index, int(c['id'])))
+
+        if not pairs:
+            return
+
+        compact.add_runs(cur, self.part_name, self.version, layout, compact.to_runs(pairs))
+        catalog.record_rows(cur, self.part_name, self.version, len(pairs), max(i for _, i in pairs))
+
+
+    def _decode_configurations(self, cur: sqlite3.Cursor, config_ids: Sequence[int]) -> List[Dict[str, ValueType]]:
+        # a few configurations are cheaper to probe for than loading the whole layout
+        layout = self._layout
+        if layout is None and len(config_ids) > _MAX_POINT_DECODES:
+            layout = self.get_layout(cur)
+
+        out = []
+        missing = []
+        for config_id in config_ids:
+            if layout is not None:
+                index = layout.get_index(config_id)
+                c = layout.decode(index) if index is not None else None
+            else:
+                c = compact.decode(cur, self.part_name, self.version, config_id)
+
+            if c is None:
+                missing.append(config_id)
+                continue
+
+            out.append({**c, 'id': config_id})
+
+        if missing:
+            raise missing_configurations_error(self.get_table_name(), missing)
+
+        return out
+
+
+def missing_configurations_error(table_name: str, missing: Iterable[int]) -> ValueError:
+    missing = sorted(missing)
+    if len(missing) == 1:
+        return ValueError(f"config_id <{missing[0]}> is not in table <{table_name}>")
 
-        cur.executemany(f"INSERT INTO '{table_name}' ({col_names}) VALUES ({conf_str})", conf_values)
+    return ValueError(f"config_ids <{missing}> are not in table <{table_name}>")
@@ -1,20 +1,23 @@
 import sqlite3
 import ml_experiment._utils.sqlite as sqlu
+import ml_experiment.metadata.catalog as catalog
+import ml_experiment.metadata.compact as compact
 
-from typing import Dict, Iterable
+from typing import Dict, Iterable, List, Mapping, Sequence
 from ml_experiment._utils.maybe import Maybe
-from ml_experiment.metadata.metadata_table import MetadataTable, ValueType
+from ml_experiment.metadata.metadata_table import FINGERPRINT_COLUMN, MetadataTable, ValueType
 
 class MetadataTableRegistry:
     def __init__(self):
         # cached results
         self._latest_versions: Dict[str, int] = {}
         self._tables: Dict[str, MetadataTable] = {}
+        self._has_catalog = False
 
 
     def get_parts(self, cur: sqlite3.Cursor) -> set[str]:
-        n = sqlu.get_tables(cur)
-        return set(p.rsplit('-', 1)[0] for p in n)
+        self._ensure_catalog(cur)
+        return catalog.get_parts(cur)
 
 
     def get_table(self, cur: sqlite3.Cursor, part_name: str, version: int) -> MetadataTable | None:
@@ -25,8 +28,8 @@ class MetadataTableRegistry:
             return self._tables[table_name]
 
         # ensure table exists
-        tables = sqlu.get_tables(cur)
-        if table_name not in tables:
+        self._ensure_catalog(cur)
+        if not catalog.has_version(cur, part_name, version):
             return None
 
         # construct table object
@@ -35,13 +38,9 @@ class MetadataTableRegistry:
 
 
     def get_tables(self, cur: sqlite3.Cursor, part_name: str):
-        table_names = sqlu.get_tables(cur)
+        self._ensure_catalog(cur)
 
-        for t in table_names:
-            if not t.startswith(part_name):
-                continue
-
-            version = int(t.replace(f'{part_name}-v', ''))
+        for version in catalog.get_versions(cur, part_name):
             table = self.get_table(cur, part_name, version)
 
             if table is not None:
@@ -53,29 +52,20 @@ class MetadataTableRegistry:
             version = self._latest_versions[part_name]
             return self.get_table(cur, part_name, version)
 
-
-        tables = list(self.get_tables(cur, part_name))
-        if len(tables) == 0:
+        self._ensure_catalog(cur)
+        latest = catalog.get_latest_version(cur, part_name)
+        if latest is None:
             return None
 
-        latest = max(t.version for t in tables)
         self._latest_versions[part_name] = latest
         return self.get_table(cur, part_name, latest)
 
 
     def get_max_configuration_id(self, cur: sqlite3.Cursor, part_name: str) -> int:
-        all_ids = set[int]()
-
-        tables = self.get_tables(cur, part_name)
-        for t in tables:
-            all_ids |= t.get_configuration_ids(cur)
-
         # define the no configurations case (e.g. this is table v0)
         # as having a max id of -1
-        if len(all_ids) == 0:
-            return -1
-
-        return max(all_ids)
+        self._ensure_catalog(cur)
+        return catalog.get_max_configuration_id(cur, part_name)
 
 
     def get_configuration_id(self, cur: sqlite3.Cursor, part_name: str, configuration: Dict[str, ValueType]) -> Maybe[int]:
@@ -99,9 +89,113 @@ class MetadataTableRegistry:
         return Maybe(None)
 
 
-    def create_new_table(self, cur: sqlite3.Cursor, part_name: str, version: int, config_params: Iterable[str]) -> MetadataTable:
+    def lookup_configuration_ids(
+        self,
+        cur: sqlite3.Cursor,
+        part_name: str,
+        configurations: Sequence[Dict[str, ValueType]],
+        max_version: int | None = None,
+    ) -> List[int | None]:
+        """
+        Batched equivalent of `get_configuration_id`. Each table is
+        searched at most once for the whole batch, instead of once
+        per configuration. Tables newer than `max_version` are ignored.
+        """
+        out: List[int | None] = [None] * len(configurations)
+
+        latest = self.get_latest_version(cur, part_name)
+        if latest is None:
+            return out
+
+        start = latest.version
+        if max_version is not None:
+            start = min(start, max_version)
+
+        # walk backwards starting from the latest version
+        # only configurations that are still unresolved are searched for in older tables
+        unresolved = list(range(len(configurations)))
+        for i in range(start + 1):
+            if len(unresolved) == 0:
+                break
+
+            table = self.get_table(cur, part_name, version=start - i)
+
+            if table is None:
+                continue
+
+            conf_ids = table.lookup_configuration_ids(cur, [configurations[j] for j in unresolved])
+            still_unresolved = []
+            for j, conf_id in zip(unresolved, conf_ids, strict=True):
+                if conf_id is None:
+                    still_unresolved.append(j)
+                else:
+                    out[j] = conf_id
+
+            unresolved = still_unresolved
+
+        return out
+
+
+    def get_digest(self, cur: sqlite3.Cursor, part_name: str, version: int) -> str | None:
+        self._ensure_catalog(cur)
+        return catalog.get_digest(cur, part_name, version)
+
+
+    def set_digest(self, cur: sqlite3.Cursor, part_name: str, version: int, digest: str):
+        self._ensure_catalog(cur)
+        catalog.set_digest(cur, part_name, version, digest)
+
+
+    def create_new_table(
+        self,
+        cur: sqlite3.Cursor,
+        part_name: str,
+        version: int,
+        config_params: Iterable[str],
+        digest: str | None = None,
+    ) -> MetadataTable:
         table_name = f'{part_name}-v{version}'
-        sqlu.create_table(cur, table_name, list(config_params) + ['id INTEGER PRIMARY KEY'])
+        sqlu.create_table(cur, table_name, list(config_params) + ['id INTEGER PRIMARY KEY', f'{FINGERPRINT_COLUMN} INTEGER'])
+
+        table = self._register_version(cur, part_name, version, digest)
+        table.create_fingerprint_index(cur)
+        return table
+
+
+    def create_compact_table(
+        self,
+        cur: sqlite3.Cursor,
+        part_name: str,
+        version: int,
+        axes: Mapping[str, Sequence[ValueType]],
+        digest: str | None = None,
+    ) -> MetadataTable:
+        """
+        Like `create_new_table`, for a version that stores the values along
+        each of `axes` instead of a row per configuration.
+        See ml_experiment.metadata.compact.
+        """
+        compact.add_version(cur, part_name, version, axes)
+        return self._register_version(cur, part_name, version, digest)
+
+
+    def migrate(self, cur: sqlite3.Cursor):
+        """
+        Bring tables written by older versions of this library
+        up to date with the current schema.
+        """
+        for part_name in self.get_parts(cur):
+            for table in self.get_tables(cur, part_name):
+                table.ensure_fingerprint(cur)
+
+
+    # ----------------------
+    # -- Internal Methods --
+    # ----------------------
+
+    def _register_version(self, cur: sqlite3.Cursor, part_name: str, version: int, digest: str | None) -> MetadataTable:
+        self._ensure_catalog(cur)
+        catalog.add_version(cur, part_name, version, digest)
 
         # since we just created this table, it better be there!
         table = self.get_table(cur, part_name, version)
@@ -114,3 +208,31 @@ class MetadataTableRegistry:
             self._latest_versions[part_name] = version
 
         return table
+
+
+    def _ensure_catalog(self, cur: sqlite3.Cursor):
+        if self._has_catalog:
+            return
+
+        def _rebuild(cur: sqlite3.Cursor):
+            # another connection may have rebuilt it while this one waited for the lock
+            if not catalog.is_current(cur):
+                catalog.rebuild_catalog(cur)
+
+        if not catalog.is_current(cur):
+            try:
+                # the catalog is dropped and refilled in one transaction,
+                # so no other connection ever sees it empty or half-filled
+                if cur.connection.in_transaction:
+                    _rebuild(cur)
+                else:
+                    sqlu.write_transaction(cur.connection, _rebuild)
+            except sqlite3.OperationalError as e:
+                # read-only connections cannot upgrade the database,
+                # so build a catalog that is private to this connection instead
+                if e.sqlite_errorcode != sqlite3.SQLITE_READONLY:
+                    raise
+
+                catalog.rebuild_catalog(cur, temp=True)
+
+        self._has_catalog = True
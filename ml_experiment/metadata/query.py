@@ -0,0 +1,97 @@
+"""
+Selecting configurations by the values of their properties. A query maps
+property names to conditions, all of which must hold:
+
+    {'alpha': 0.01, 'tau': gt(5), 'optimizer': {'adam', 'sgd'}}
+
+A plain value must be equal, a set, list or tuple (or `isin(...)`) lists
+the allowed values, and `gt`, `ge`, `lt`, `le` and `between` bound a range.
+Queries are compiled to a single SQL `WHERE` clause.
+"""
+import json
+from dataclasses import dataclass
+from typing import Iterable, List, Mapping, Set, Tuple
+
+from ml_experiment.metadata.metadata_table import ValueType
+
+# membership tests with more values than this are bound as one JSON array
+_MAX_PARAMS = 500
+
+
+@dataclass(frozen=True)
+class In:
+    values: Tuple[ValueType, ...]
+
+
+@dataclass(frozen=True)
+class Range:
+    low: ValueType | None = None
+    high: ValueType | None = None
+    include_low: bool = True
+    include_high: bool = True
+
+
+Condition = ValueType | In | Range | Set[ValueType] | List[ValueType] | Tuple[ValueType, ...]
+Where = Mapping[str, Condition]
+
+
+def isin(values: Iterable[ValueType]) -> In:
+    return In(tuple(values))
+
+def gt(value: ValueType) -> Range:
+    return Range(low=value, include_low=False)
+
+def ge(value: ValueType) -> Range:
+    return Range(low=value)
+
+def lt(value: ValueType) -> Range:
+    return Range(high=value, include_high=False)
+
+def le(value: ValueType) -> Range:
+    return Range(high=value)
+
+def between(low: ValueType, high: ValueType) -> Range:
+    return Range(low, high)
+
+
+def to_sql(where: Where) -> Tuple[str, List[ValueType]]:
+    """
+    The `WHERE` clause matching `where`, and the parameters it binds.
+    Property names are quoted but not checked, see `MetadataTable.query_ids`.
+    """
+    clauses: List[str] = []
+    params: List[ValueType] = []
+
+    for key, cond in sorted(where.items()):
+        col = f'"{key}"'
+
+        if isinstance(cond, Range):
+            if cond.low is not None:
+                clauses.append(f'{col} {">=" if cond.include_low else ">"} ?')
+                params.append(cond.low)
+
+            if cond.high is not None:
+                clauses.append(f'{col} {"<=" if cond.include_high else "<"} ?')
+                params.append(cond.high)
+
+        elif isinstance(cond, (In, set, frozenset, list, tuple)):
+            values = list(cond.values if isinstance(cond, In) else cond)
+            if not values:
+                clauses.append('0')
+
+            elif len(values) <= _MAX_PARAMS:
+                clauses.append(f'{col} IN ({", ".join(["?"] * len(values))})')
+                params += values
+
+            else:
+                clauses.append(f'{col} IN (SELECT value FROM json_each(?))')
+                params.append(json.dumps(values))
+
+        elif isinstance(cond, (bool, int, float, str)):
+            clauses.append(f'{col} = ?')
+            params.append(cond)
+
+        else:
+            raise TypeError(f'Unsupported condition <{cond!r}> on property <{key}>')
+
+    return ' AND '.join(clauses) or '1', params
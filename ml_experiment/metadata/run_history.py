@@ -0,0 +1,83 @@
+import sqlite3
+from collections import defaultdict
+from typing import Dict, Iterable, Tuple
+
+from ml_experiment.execution.types import RunResult, RunSpec
+
+# running mean of successful run durations, per part, version and configuration
+HISTORY_TABLE = '_run_history'
+
+
+def ensure_history(cur: sqlite3.Cursor):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS '{HISTORY_TABLE}' (
+            part TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            config_id INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            mean_duration REAL NOT NULL,
+            PRIMARY KEY (part, version, config_id)
+        )
+    """)
+
+
+def record_durations(cur: sqlite3.Cursor, results: Iterable[RunResult]):
+    rows = [
+        (r.run.part_name, r.run.version, r.run.config_id, r.duration)
+        for r in results
+        if r.ok
+    ]
+
+    cur.executemany(
+        f"""
+        INSERT INTO '{HISTORY_TABLE}' (part, version, config_id, n, mean_duration) VALUES (?, ?, ?, 1, ?)
+        ON CONFLICT (part, version, config_id) DO UPDATE SET
+            n = n + 1,
+            mean_duration = mean_duration + (excluded.mean_duration - mean_duration) / (n + 1)
+        """,
+        rows,
+    )
+
+
+class RuntimeEstimator:
+    """
+    Expected run durations from the recorded history. Configuration ids
+    are stable across versions, so a configuration that has only been run
+    under another version falls back to that version's timings, and then
+    to the average over the whole part.
+    """
+    def __init__(self, cur: sqlite3.Cursor, default: float):
+        self.default = default
+
+        self._exact: Dict[Tuple[str, int, int], float] = {}
+        by_config = defaultdict(lambda: [0, 0.0])
+        by_part = defaultdict(lambda: [0, 0.0])
+
+        for part, version, config_id, n, mean in _load(cur):
+            self._exact[(part, version, config_id)] = mean
+
+            for acc in (by_config[(part, config_id)], by_part[part]):
+                acc[0] += n
+                acc[1] += n * mean
+
+        self._by_config = {k: total / n for k, (n, total) in by_config.items()}
+        self._by_part = {k: total / n for k, (n, total) in by_part.items()}
+
+
+    def estimate(self, run: RunSpec) -> float:
+        est = self._exact.get((run.part_name, run.version, run.config_id))
+        if est is not None:
+            return est
+
+        est = self._by_config.get((run.part_name, run.config_id))
+        if est is not None:
+            return est
+
+        return self._by_part.get(run.part_name, self.default)
+
+
+def _load(cur: sqlite3.Cursor):
+    if HISTORY_TABLE not in set(r[0] for r in cur.execute("SELECT name FROM sqlite_master WHERE type='table'")):
+        return []
+
+    return cur.execute(f"SELECT part, version, config_id, n, mean_duration FROM '{HISTORY_TABLE}'").fetchall()
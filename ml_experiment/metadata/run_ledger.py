@@ -0,0 +1,119 @@
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Set, Tuple
+
+import ml_experiment._utils.sqlite as sqlu
+from ml_experiment.execution.types import RunResult, RunSpec
+
+# status of every run the scheduler has been asked to execute
+LEDGER_TABLE = '_runs'
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def ensure_ledger(cur: sqlite3.Cursor):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS '{LEDGER_TABLE}' (
+            part TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            config_id INTEGER NOT NULL,
+            seed INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            exit_code INTEGER,
+            duration REAL,
+            host TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            updated REAL NOT NULL,
+            PRIMARY KEY (part, version, config_id, seed)
+        )
+    """)
+    sqlu.create_index(cur, f'{LEDGER_TABLE}_status', LEDGER_TABLE, ['part', 'version', 'status'])
+
+
+# -------------
+# -- Writers --
+# -------------
+
+# runs are keyed by (part, version, config_id, seed), matching RunSpec
+def mark_pending(cur: sqlite3.Cursor, runs: Iterable[RunSpec]):
+    now = time.time()
+    cur.executemany(
+        f"""
+        INSERT INTO '{LEDGER_TABLE}' (part, version, config_id, seed, status, updated) VALUES (?, ?, ?, ?, '{PENDING}', ?)
+        ON CONFLICT (part, version, config_id, seed) DO UPDATE SET
+            status = excluded.status,
+            exit_code = NULL,
+            duration = NULL,
+            updated = excluded.updated
+        """,
+        ((*r, now) for r in runs),
+    )
+
+
+def mark_running(cur: sqlite3.Cursor, runs: Iterable[RunSpec], host: str):
+    now = time.time()
+    cur.executemany(
+        f"""
+        INSERT INTO '{LEDGER_TABLE}' (part, version, config_id, seed, status, host, attempts, updated) VALUES (?, ?, ?, ?, '{RUNNING}', ?, 1, ?)
+        ON CONFLICT (part, version, config_id, seed) DO UPDATE SET
+            status = excluded.status,
+            host = excluded.host,
+            attempts = attempts + 1,
+            updated = excluded.updated
+        """,
+        ((*r, host, now) for r in runs),
+    )
+
+
+def mark_finished(cur: sqlite3.Cursor, results: Iterable[RunResult]):
+    now = time.time()
+    cur.executemany(
+        f"""
+        UPDATE '{LEDGER_TABLE}' SET status=?, exit_code=?, duration=?, updated=?
+        WHERE part=? AND version=? AND config_id=? AND seed=?
+        """,
+        (
+            (DONE if r.ok else FAILED, r.exit_code, r.duration, now, *r.run)
+            for r in results
+        ),
+    )
+
+
+# -------------
+# -- Getters --
+# -------------
+
+def has_ledger(cur: sqlite3.Cursor) -> bool:
+    return LEDGER_TABLE in sqlu.get_tables(cur)
+
+
+def get_runs_with_status(cur: sqlite3.Cursor, part_name: str, version: int, status: str) -> Set[Tuple[int, int]]:
+    if not has_ledger(cur):
+        return set()
+
+    res = cur.execute(
+        f"SELECT config_id, seed FROM '{LEDGER_TABLE}' WHERE part=? AND version=? AND status=?",
+        (part_name, version, status),
+    )
+    return set(res)
+
+
+def get_status_counts(cur: sqlite3.Cursor) -> Dict[str, int]:
+    if not has_ledger(cur):
+        return {}
+
+    res = cur.execute(f"SELECT status, COUNT(*) FROM '{LEDGER_TABLE}' GROUP BY status")
+    return dict(res.fetchall())
+
+
+def get_failed(cur: sqlite3.Cursor) -> List[Tuple[RunSpec, int | None, str | None]]:
+    if not has_ledger(cur):
+        return []
+
+    res = cur.execute(
+        f"SELECT part, version, config_id, seed, exit_code, host FROM '{LEDGER_TABLE}' WHERE status='{FAILED}'"
+    )
+    return [(RunSpec(*row[:4]), row[4], row[5]) for row in res]
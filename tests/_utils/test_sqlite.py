@@ -0,0 +1,98 @@
+import sqlite3
+
+import pytest
+
+import ml_experiment._utils.sqlite as sqlu
+
+
+def test_connect_uses_wal(tmp_path, monkeypatch):
+    monkeypatch.setenv(sqlu.WAL_ENV_VAR, "1")
+    con = sqlu.init_db(str(tmp_path / "wal" / "metadata.db"))
+    assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    con.close()
+
+    monkeypatch.setenv(sqlu.WAL_ENV_VAR, "0")
+    con = sqlu.init_db(str(tmp_path / "rollback" / "metadata.db"))
+    assert con.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    con.close()
+
+
+def test_readonly_connection(tmp_path):
+    db_path = str(tmp_path / "metadata.db")
+    con = sqlu.connect(db_path)
+    con.execute("CREATE TABLE t (x)")
+    con.execute("INSERT INTO t VALUES (1)")
+    con.commit()
+
+    ro = sqlu.connect(db_path, readonly=True)
+    assert ro.execute("SELECT x FROM t").fetchall() == [(1,)]
+
+    with pytest.raises(sqlite3.OperationalError) as e:
+        ro.execute("INSERT INTO t VALUES (2)")
+    assert e.value.sqlite_errorcode == sqlite3.SQLITE_READONLY
+
+    ro.close()
+    con.close()
+
+
+def test_retry_busy(tmp_path):
+    db_path = str(tmp_path / "metadata.db")
+    con = sqlu.connect(db_path, timeout=0)
+    con.execute("CREATE TABLE t (x)")
+    con.commit()
+
+    # another connection holds the write lock for the first two attempts
+    other = sqlu.connect(db_path)
+    other.execute("BEGIN IMMEDIATE")
+
+    calls = []
+    def _insert():
+        calls.append(1)
+        if len(calls) == 3:
+            other.rollback()
+
+        con.execute("BEGIN IMMEDIATE")
+        con.execute("INSERT INTO t VALUES (1)")
+        con.commit()
+
+    sqlu.retry_busy(_insert, delay=0.001)
+    assert len(calls) == 3
+    assert con.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+
+    con.close()
+    other.close()
+
+
+def test_write_transaction_rolls_back(tmp_path):
+    con = sqlu.connect(str(tmp_path / "metadata.db"))
+    con.execute("CREATE TABLE t (x)")
+    con.commit()
+
+    def _fail(cur):
+        cur.execute("INSERT INTO t VALUES (1)")
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        sqlu.write_transaction(con, _fail)
+
+    sqlu.write_transaction(con, lambda cur: cur.execute("INSERT INTO t VALUES (2)"))
+    assert con.execute("SELECT x FROM t").fetchall() == [(2,)]
+    con.close()
+
+
+def test_retry_gives_up(tmp_path):
+    def _fail():
+        raise sqlite3.OperationalError("database is locked")
+
+    with pytest.raises(sqlite3.OperationalError):
+        sqlu.retry_busy(_fail, attempts=3, delay=0.001)
+
+    # other errors are not retried
+    calls = []
+    def _broken():
+        calls.append(1)
+        raise sqlite3.OperationalError("no such table: t")
+
+    with pytest.raises(sqlite3.OperationalError):
+        sqlu.retry_busy(_broken)
+    assert len(calls) == 1
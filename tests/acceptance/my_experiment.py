@@ -1,7 +1,9 @@
 import argparse
 import os
 import random
+import sys
 
+from ml_experiment.execution.batch import BATCH_FLAG, run_batch
 from ml_experiment.experiment_definition import ExperimentDefinition
 
 parser = argparse.ArgumentParser()
@@ -31,21 +33,19 @@ class SoftmaxAC:
         return f"{self.name}({self.alpha}, {self.tau}, {self.nstep}, {self.tiles}, {self.tilings})"
 
 
-def main():
-    cmdline = parser.parse_args()
-
+def run(part: str, version: int, config_id: int, seed: int, results_path: str):
     # make sure we are using softmaxAC
-    if cmdline.part != "softmaxAC":
-        raise ValueError(f"Unknown part: {cmdline.part}")
+    if part != "softmaxAC":
+        raise ValueError(f"Unknown part: {part}")
 
     # do some rng control
-    random.seed(cmdline.seed)
+    random.seed(seed)
 
     # extract configs from the database
-    exp = ExperimentDefinition("softmaxAC", cmdline.version)
+    exp = ExperimentDefinition("softmaxAC", version)
     # TODO: don't overwrite this
-    exp.get_results_path = lambda *args, **kwargs: cmdline.results_path # overwrite results path
-    config = exp.get_config(cmdline.config_id)
+    exp.get_results_path = lambda *args, **kwargs: results_path # overwrite results path
+    config = exp.get_config(config_id)
 
     # make our dummy agent
     alpha = config["alpha"]
@@ -59,9 +59,25 @@ def main():
     output = agent.run()
 
     # write the output to a file
-    output_path = os.path.join(cmdline.results_path, f"output_{cmdline.config_id}.txt")
+    output_path = os.path.join(results_path, f"output_{config_id}.txt")
     with open(output_path, "w") as f:
         f.write(output)
 
+
+def main():
+    # many runs are packed into this invocation, and given on stdin
+    if BATCH_FLAG in sys.argv[1:]:
+        run_batch(run)
+        return
+
+    cmdline = parser.parse_args()
+    run(
+        part=cmdline.part,
+        version=cmdline.version,
+        config_id=cmdline.config_id,
+        seed=cmdline.seed,
+        results_path=cmdline.results_path,
+    )
+
 if __name__ == "__main__":
     main()
@@ -1,9 +1,16 @@
+import json
 import os
+import sqlite3
+import subprocess
+import sys
 import pytest
 
 from ml_experiment.definition_part import DefinitionPart
+from ml_experiment.execution.existence_index import ExistenceIndex
 from ml_experiment.experiment_definition import ExperimentDefinition
-from ml_experiment.Scheduler import LocalRunConfig, Scheduler
+from ml_experiment.metadata.metadata_table import MetadataTable
+from ml_experiment.metadata.query import ge
+from ml_experiment.Scheduler import LocalRunConfig, Scheduler, SlurmRunConfig
 
 
 @pytest.fixture
@@ -33,6 +40,35 @@ def write_database(tmp_path, alphas: list[float], taus: list[float]):
 
     return softmaxAC
 
+
+ALPHAS = [0.05, 0.01]
+TAUS = [10.0, 20.0, 5.0]
+EXP_NAME = "acceptance"
+N_CONFIGS = len(ALPHAS) * len(TAUS)
+
+
+@pytest.fixture
+def results_path(tmp_path, base_path):
+    """Writes the softmaxAC sweep to a fresh experiment and gives back its results path."""
+    write_database(tmp_path, ALPHAS, TAUS)
+    return os.path.join(tmp_path, "results", EXP_NAME)
+
+
+def make_scheduler(tmp_path, seeds: list[int] | None = None) -> Scheduler:
+    return Scheduler(
+        exp_name=EXP_NAME,
+        entry=f"tests/{EXP_NAME}/my_experiment.py",
+        seeds=seeds if seeds is not None else [10],
+        version=0,
+        base=str(tmp_path),
+    )
+
+
+def assert_outputs(results_path, sched: Scheduler):
+    for runspec in sched.all_runs:
+        assert os.path.exists(os.path.join(results_path, f"output_{runspec.config_id}.txt"))
+
+
 def test_read_database(tmp_path, base_path):
     """
     Test that we can retrieve the configurations from the experiment definition.
@@ -80,7 +116,7 @@ def test_read_database(tmp_path, base_path):
         assert config == expected_config
 
 
-def test_run_tasks(tmp_path):
+def test_run_tasks(tmp_path, base_path):
     """Make sure that the scheduler runs all the tasks, and that they return the correct results."""
     # setup
     alphas = [0.05, 0.01]
@@ -122,7 +158,7 @@ def test_run_tasks(tmp_path):
     try:
         import multiprocessing
 
-        ntasks = multiprocessing.cpu_count() - 1
+        ntasks = max(1, multiprocessing.cpu_count() - 1)
     except (ImportError, NotImplementedError):
         ntasks = 1
 
@@ -164,5 +200,220 @@ def test_run_tasks(tmp_path):
             assert output.strip() == expected_output
 
 
+def test_in_process_tasks(tmp_path, results_path):
+    """Make sure that in-process workers run all the tasks through the entry's `run` function."""
+    sched = make_scheduler(tmp_path).get_all_runs()
+    results = sched.run(LocalRunConfig(tasks_in_parallel=2, in_process=True))
+
+    assert len(sched.all_runs) == N_CONFIGS
+    assert sorted(r.run for r in results) == sorted(sched.all_runs)
+    assert all(r.ok for r in results)
+
+    # run times are remembered for ordering future runs
+    with sqlite3.connect(os.path.join(results_path, "metadata.db")) as con:
+        n = con.execute("SELECT COUNT(*) FROM _run_history").fetchone()[0]
+        assert n == N_CONFIGS
+
+        # and every run is recorded as done, so there is nothing left to resume
+        status = con.execute("SELECT status, COUNT(*) FROM _runs GROUP BY status").fetchall()
+        assert status == [("done", N_CONFIGS)]
+
+    assert len(sched.remaining().all_runs) == 0
+
+    # every run wrote its output, which a single directory walk can tell
+    index = ExistenceIndex(results_path)
+    assert len(sched.filter_batch(index.predicate("output_{config_id}.txt")).all_runs) == 0
+    assert_outputs(results_path, sched)
+
+
+def test_batched_tasks(tmp_path, results_path):
+    """Make sure that packing several runs into each invocation runs all the tasks."""
+    sched = make_scheduler(tmp_path).get_all_runs()
+    sched.run(LocalRunConfig(tasks_in_parallel=2, runs_per_invocation=4))
+
+    assert_outputs(results_path, sched)
+
+
+def test_telemetry(tmp_path, results_path):
+    """Make sure that every run is measured, reported on and, when asked, profiled."""
+    log_path = os.path.join(tmp_path, "logs")
+    report_path = os.path.join(tmp_path, "report.json")
+
+    progress = []
+    sched = make_scheduler(tmp_path).get_all_runs()
+    results = sched.run(LocalRunConfig(
+        tasks_in_parallel=2,
+        log_path=log_path,
+        report_path=report_path,
+        on_progress=progress.append,
+        profile=lambda r: r.config_id == 0,
+    ))
+
+    assert all(r.ok and r.cpu_time is not None and r.max_rss > 0 for r in results)
+    assert [p.done for p in progress] == list(range(1, N_CONFIGS + 1))
+    assert progress[-1].total == N_CONFIGS and progress[-1].failed == 0
+
+    with open(report_path) as f:
+        report = json.load(f)
 
+    assert report["summary"]["runs"] == N_CONFIGS
+    assert report["summary"]["throughput"] > 0
+    assert set(report["summary"]["wall_time"]) == {"mean", "p50", "p90", "p99", "max"}
+    assert sorted(r["config_id"] for r in report["runs"]) == list(range(N_CONFIGS))
+
+    # only the selected run is profiled, next to the logs
+    profiles = os.listdir(os.path.join(log_path, EXP_NAME))
+    assert profiles == ["softmaxAC-0-0-10.prof"]
 
+
+def test_lazy_tasks(tmp_path, results_path):
+    """Make sure that a lazily enumerated run space runs the same tasks as the eager one."""
+    eager = make_scheduler(tmp_path, seeds=[10, 11]).get_all_runs()
+    lazy = make_scheduler(tmp_path, seeds=[10, 11]).get_all_runs(lazy=True)
+    assert len(lazy.all_runs) == len(eager.all_runs)
+    assert sorted(lazy.all_runs) == sorted(eager.all_runs)
+
+    results = lazy.run(LocalRunConfig(tasks_in_parallel=2, in_process=True))
+    assert all(r.ok for r in results)
+    assert sorted(r.run for r in results) == sorted(eager.all_runs)
+
+    assert len(lazy.remaining().all_runs) == 0
+    assert_outputs(results_path, lazy)
+
+
+def test_query_tasks(tmp_path, results_path):
+    """Make sure that only the runs of the queried configurations are enumerated and run."""
+    where = {"alpha": 0.01, "tau": ge(10.0)}
+    with sqlite3.connect(os.path.join(results_path, "metadata.db")) as con:
+        configs = MetadataTable("softmaxAC", 0).get_all_configurations(con.cursor())
+
+    keep = {i for i, c in configs.items() if c["alpha"] == 0.01 and c["tau"] >= 10.0}
+    expected = make_scheduler(tmp_path).get_all_runs().filter(lambda part, version, config_id, seed: config_id not in keep)
+    assert len(expected.all_runs) == 2
+
+    sched = make_scheduler(tmp_path).get_all_runs(where=where)
+    lazy = make_scheduler(tmp_path).get_all_runs(lazy=True, where=where)
+    assert sorted(sched.all_runs) == sorted(lazy.all_runs) == sorted(expected.all_runs)
+
+    results = sched.run(LocalRunConfig(tasks_in_parallel=2, in_process=True))
+    assert all(r.ok for r in results)
+    outputs = {f for f in os.listdir(results_path) if f.startswith("output_")}
+    assert outputs == {f"output_{config_id}.txt" for config_id in keep}
+
+    with pytest.raises(ValueError):
+        make_scheduler(tmp_path).get_all_runs(where={"beta": 1})
+
+
+_SHARD_SCRIPT = """
+import json, sys
+from ml_experiment.Scheduler import Scheduler
+
+base, index, count, balance, lazy = sys.argv[1:]
+sched = Scheduler("acceptance", seeds=[0, 1, 2], entry="unused.py", base=base)
+sched = sched.get_all_runs(lazy=lazy == "lazy").shard(int(index), int(count), balance)
+print(json.dumps([list(r) for r in sched.all_runs]))
+"""
+
+
+def test_sharding(tmp_path, results_path):
+    """Make sure that shards computed by independent processes split the runs exactly."""
+    other = DefinitionPart("other", base=str(tmp_path))
+    other.add_sweepable_property("x", [1, 2, 3, 4, 5])
+    other.commit()
+
+    # give some configurations a much longer history than others
+    with sqlite3.connect(os.path.join(results_path, "metadata.db")) as con:
+        con.execute("CREATE TABLE _run_history (part TEXT, version INTEGER, config_id INTEGER, n INTEGER, mean_duration REAL, PRIMARY KEY (part, version, config_id))")
+        con.execute("INSERT INTO _run_history VALUES ('softmaxAC', 0, 0, 1, 50.0), ('other', 0, 3, 1, 20.0)")
+
+    all_runs = Scheduler("acceptance", seeds=[0, 1, 2], entry="unused.py", base=str(tmp_path)).get_all_runs().all_runs
+    count = 3
+
+    for balance, lazy in [("count", "eager"), ("count", "lazy"), ("cost", "eager")]:
+        shards = []
+        for index in range(count):
+            # every shard is computed by a separate interpreter with its own hash seed
+            proc = subprocess.run(
+                [sys.executable, "-c", _SHARD_SCRIPT, str(tmp_path), str(index), str(count), balance, lazy],
+                env={**os.environ, "PYTHONHASHSEED": str(index + 1)},
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            shards.append([tuple(r) for r in json.loads(proc.stdout)])
+
+        flat = [r for shard in shards for r in shard]
+        assert len(flat) == len(set(flat)) == len(all_runs)
+        assert set(flat) == set(all_runs)
+
+        if balance == "count":
+            assert max(len(s) for s in shards) - min(len(s) for s in shards) <= 1
+
+
+_FAKE_SBATCH = """#!/bin/bash
+# runs every task of the job array in turn, on this machine, and
+# prints a new job id as `sbatch --parsable` does
+script="${@: -1}"
+last=$(sed -n 's/^#SBATCH --array=0-//p' "$script")
+for i in $(seq 0 "$last"); do
+    SLURM_ARRAY_TASK_ID=$i bash "$script" >/dev/null || exit 1
+done
+id=$(( $(cat "$0.jobs" 2>/dev/null || echo 0) + 1 ))
+echo "$id" > "$0.jobs"
+echo "$id"
+"""
+
+
+def test_slurm_tasks(tmp_path, results_path):
+    """Make sure that a job array packs the runs into tasks, and that the tasks run them all."""
+    sbatch = tmp_path / "sbatch"
+    sbatch.write_text(_FAKE_SBATCH)
+    sbatch.chmod(0o755)
+
+    # two cores of 54s each fit four 20s runs per task
+    sched = make_scheduler(tmp_path).get_all_runs()
+    submission = sched.submit(SlurmRunConfig(
+        wall_time=60.0,
+        cores=2,
+        job_dir=str(tmp_path / "slurm"),
+        sbatch=str(sbatch),
+        estimated_run_time=20.0,
+    ))
+
+    assert submission.job_ids == ["1"]
+    assert os.listdir(tmp_path / "slurm") == [os.path.basename(submission.job_dir)]
+    manifests = [f for f in os.listdir(submission.job_dir) if f.endswith(".json")]
+    assert len(manifests) == 2
+
+    with sqlite3.connect(os.path.join(results_path, "metadata.db")) as con:
+        status = con.execute("SELECT status, COUNT(*) FROM _runs GROUP BY status").fetchall()
+        assert status == [("done", N_CONFIGS)]
+
+    assert_outputs(results_path, sched)
+
+
+def test_slurm_max_array_size(tmp_path, results_path):
+    """Make sure that a sweep with more tasks than an array may hold is split across arrays."""
+    sbatch = tmp_path / "sbatch"
+    sbatch.write_text(_FAKE_SBATCH)
+    sbatch.chmod(0o755)
+
+    # one 20s run per task gives one array per run
+    sched = make_scheduler(tmp_path).get_all_runs()
+    submission = sched.submit(SlurmRunConfig(
+        wall_time=30.0,
+        job_dir=str(tmp_path / "slurm"),
+        sbatch=str(sbatch),
+        estimated_run_time=20.0,
+        max_array_size=1,
+    ))
+
+    assert submission.job_ids == [str(i + 1) for i in range(N_CONFIGS)]
+    scripts = [f for f in os.listdir(submission.job_dir) if f.endswith(".sh")]
+    assert len(scripts) == N_CONFIGS
+
+    with sqlite3.connect(os.path.join(results_path, "metadata.db")) as con:
+        status = con.execute("SELECT status, COUNT(*) FROM _runs GROUP BY status").fetchall()
+        assert status == [("done", N_CONFIGS)]
+
+    assert_outputs(results_path, sched)
@@ -1,3 +1,11 @@
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import ml_experiment._utils.sqlite as sqlu
 from ml_experiment.definition_part import DefinitionPart
 
 
@@ -7,3 +15,192 @@ def test_add_sweepable_property():
 
     for i in range(1, 4):
         builder.add_property('key_2', i)
+
+
+def _read_table(part: DefinitionPart, version: int):
+    db_path = os.path.join(part.get_results_path(part.base_path), 'metadata.db')
+    with sqlite3.connect(db_path) as con:
+        return sorted(con.execute(f"SELECT alpha, beta, id FROM '{part.name}-v{version}'").fetchall())
+
+
+def test_commit_chunked(tmp_path):
+    """
+    Streaming commits in small chunks must assign the same ids as a single chunk
+    and still skip building a table when nothing changed.
+    """
+    def build(name: str, chunk_size: int):
+        part = DefinitionPart(name, base=str(tmp_path))
+        part.add_sweepable_property('alpha', [0.1, 0.2, 0.3])
+        part.commit(chunk_size=chunk_size)
+
+        part.add_sweepable_property('beta', [1, 2], assume_prior_value=1)
+        part.commit(chunk_size=chunk_size)
+        part.commit(chunk_size=chunk_size)
+        return part
+
+    whole = build('whole', chunk_size=10_000)
+    chunks = build('chunks', chunk_size=2)
+
+    assert _read_table(chunks, 1) == _read_table(whole, 1)
+
+    db_path = os.path.join(chunks.get_results_path(chunks.base_path), 'metadata.db')
+    with sqlite3.connect(db_path) as con:
+        names = {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+
+    # the third commit did not change anything
+    assert 'chunks-v2' not in names
+    assert 'whole-v2' not in names
+
+
+def test_commit_unchanged_is_noop(tmp_path, monkeypatch):
+    """
+    Committing an unchanged definition must not generate any configurations.
+    """
+    part = DefinitionPart('noop', base=str(tmp_path))
+    part.add_sweepable_property('alpha', [0.1, 0.2, 0.3])
+    part.add_property('beta', 1)
+    part.commit()
+
+    def fail(*args, **kwargs):
+        raise AssertionError('configurations should not be generated')
+
+    monkeypatch.setattr('ml_experiment.definition_part.generate_configurations', fail)
+
+    # same definition, declared in a different order
+    same = DefinitionPart('noop', base=str(tmp_path))
+    same.add_property('beta', 1.0)
+    same.add_sweepable_property('alpha', [0.3, 0.1, 0.2])
+    same.commit()
+
+    monkeypatch.undo()
+
+    # a definition that resolves to the same table records its digest
+    # so that it is a no-op from then on
+    prior = DefinitionPart('noop', base=str(tmp_path))
+    prior.add_sweepable_property('alpha', [0.1, 0.2, 0.3])
+    prior.add_property('beta', 1, assume_prior_value=1)
+    prior.commit()
+
+    monkeypatch.setattr('ml_experiment.definition_part.generate_configurations', fail)
+    prior.commit()
+    monkeypatch.undo()
+
+    db_path = os.path.join(part.get_results_path(part.base_path), 'metadata.db')
+    with sqlite3.connect(db_path) as con:
+        names = {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+
+    assert 'noop-v0' in names
+    assert 'noop-v1' not in names
+
+
+def test_commit_pruned(tmp_path):
+    """
+    Conditional properties and constraints decide which configurations are
+    committed, and changing either builds a new table.
+    """
+    part = DefinitionPart('pruned', base=str(tmp_path))
+    part.add_sweepable_property('alpha', [0.1, 0.2, 0.3])
+    part.add_sweepable_property('trace', [True, False])
+    part.add_conditional_property('beta', [1, 2], when={'trace': True}, otherwise=0)
+    part.commit()
+
+    db_path = os.path.join(part.get_results_path(part.base_path), 'metadata.db')
+    with sqlite3.connect(db_path) as con:
+        assert con.execute("SELECT COUNT(*) FROM 'pruned-v0'").fetchone() == (9,)
+
+    # an identical definition is a no-op
+    part.commit()
+
+    part.add_constraint(lambda alpha, beta: alpha * beta < 0.5)
+    part.commit()
+    part.commit()
+
+    with sqlite3.connect(db_path) as con:
+        tables = con.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'pruned-v%'").fetchall()
+        assert sorted(tables) == [('pruned-v0',), ('pruned-v1',)]
+
+        rows = sorted(con.execute("SELECT alpha, trace, beta FROM 'pruned-v1'").fetchall())
+        assert rows == [
+            (0.1, 0, 0), (0.1, 1, 1), (0.1, 1, 2),
+            (0.2, 0, 0), (0.2, 1, 1), (0.2, 1, 2),
+            (0.3, 0, 0), (0.3, 1, 1),
+        ]
+
+
+def test_commit_constrained_noop(tmp_path, monkeypatch):
+    def build(limit: float):
+        part = DefinitionPart('constrained', base=str(tmp_path))
+        part.add_sweepable_property('alpha', [0.1, 0.2, 0.3])
+        part.add_sweepable_property('beta', [1, 2])
+        part.add_constraint(lambda alpha, beta: alpha * beta < limit)
+        return part
+
+    part = build(0.5)
+    part.commit()
+
+    def fail(*args, **kwargs):
+        raise AssertionError('configurations should not be generated')
+
+    # the constraint is identified without generating the sweep it keeps
+    monkeypatch.setattr('ml_experiment.definition_part.generate_configurations', fail)
+    build(0.5).commit()
+    monkeypatch.undo()
+
+    # but a constraint that keeps different configurations builds a new table
+    build(0.3).commit()
+
+    db_path = os.path.join(part.get_results_path(part.base_path), 'metadata.db')
+    with sqlite3.connect(db_path) as con:
+        tables = con.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'constrained-v%'").fetchall()
+        assert sorted(tables) == [('constrained-v0',), ('constrained-v1',)]
+
+
+def test_conditional_property_order():
+    part = DefinitionPart('ordered')
+    with pytest.raises(ValueError):
+        part.add_conditional_property('lambda', [0.5], when={'trace': True}, otherwise=0.0)
+
+
+def test_commit_concurrent(tmp_path):
+    """
+    Two writers committing the same definition at once build a single new
+    version. Whichever takes the write lock second finds it and does nothing.
+    """
+    def build():
+        part = DefinitionPart('concurrent', base=str(tmp_path))
+        part.add_sweepable_property('alpha', [0.1, 0.2])
+        return part
+
+    build().commit()
+
+    writers = [build(), build()]
+    for part in writers:
+        part.add_sweepable_property('beta', [1, 2], assume_prior_value=1)
+
+    # hold the write lock until both writers have checked the latest version and are waiting for it
+    db_path = os.path.join(writers[0].get_results_path(writers[0].base_path), 'metadata.db')
+    lock = sqlu.connect(db_path)
+    lock.execute('BEGIN IMMEDIATE')
+
+    errors = []
+    def _commit(part: DefinitionPart):
+        try:
+            part.commit()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=_commit, args=(part,)) for part in writers]
+    for t in threads:
+        t.start()
+
+    time.sleep(0.5)
+    lock.rollback()
+    lock.close()
+
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    with sqlite3.connect(db_path) as con:
+        tables = con.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'concurrent-v%'").fetchall()
+        assert sorted(tables) == [('concurrent-v0',), ('concurrent-v1',)]
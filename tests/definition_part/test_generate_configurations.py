@@ -50,3 +50,61 @@ def test_generate_configurations(tmp_path):
 
     for config, expected_config in zip(configs, expected_configs, strict=True):
         assert config == expected_config
+
+
+def test_generate_configurations_pruned():
+    """
+    Conditional properties collapse to their fallback outside of their condition,
+    and constraints drop configurations without changing the order of the rest.
+    """
+    properties = {
+        'trace': [True, False],
+        'lambda': [0.5, 0.9],
+        'alpha': [0.1, 1.0],
+        'tau': [1, 10],
+    }
+    conditions = {'lambda': dp.Condition({'trace': {True}}, 0.0)}
+    constraints = [dp.Constraint(lambda alpha, tau: alpha * tau <= 1, ('alpha', 'tau'))]
+
+    expected = [
+        c for c in dp.generate_configurations(properties)
+        if c['alpha'] * c['tau'] <= 1 and (c['trace'] or c['lambda'] == 0.5)
+    ]
+    for c in expected:
+        if not c['trace']:
+            c['lambda'] = 0.0
+
+    configs = list(dp.generate_configurations(properties, conditions, constraints))
+    assert configs == expected
+    assert len(configs) == 9
+
+
+def test_generate_configurations_prunes_early():
+    """
+    A constraint on the first properties is checked before the rest are enumerated.
+    """
+    calls = []
+    def first_only(a):
+        calls.append(a)
+        return a == 0
+
+    properties = {'a': list(range(10)), 'b': list(range(100)), 'c': list(range(100))}
+    configs = list(dp.generate_configurations(properties, constraints=[dp.Constraint(first_only, ('a',))]))
+
+    assert len(configs) == 100 * 100
+    assert len(calls) == 10
+
+
+def test_generate_configurations_nested_conditions(tmp_path):
+    part = dp.DefinitionPart('nested', base=str(tmp_path))
+    part.add_sweepable_property('optimizer', ['sgd', 'adam'])
+    part.add_conditional_property('beta1', [0.9, 0.99], when={'optimizer': 'adam'}, otherwise=0.0)
+    part.add_conditional_property('amsgrad', [True, False], when={'optimizer': 'adam', 'beta1': 0.99}, otherwise=False)
+
+    configs = dp.generate_configurations(part._properties, part._conditions, part._constraints)
+    assert sorted(tuple(c.values()) for c in configs) == [
+        ('adam', 0.9, False),
+        ('adam', 0.99, False),
+        ('adam', 0.99, True),
+        ('sgd', 0.0, False),
+    ]
@@ -0,0 +1,164 @@
+import gzip
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ml_experiment.execution.async_executor import AsyncSubprocessExecutor, Launch
+from ml_experiment.execution.dispatch import dispatch
+from ml_experiment.execution.resources import Placement
+from ml_experiment.execution.types import RunResult, RunSpec
+
+CHILD = """
+import sys
+
+config_id = int(sys.argv[1])
+if config_id == 1:
+    sys.stderr.write('bad config\\n')
+    sys.exit(3)
+
+# more than fits in a pipe, so the parent has to keep draining it
+sys.stdout.write(str(config_id) * 1_000_000)
+sys.stdout.write(sys.stdin.read())
+"""
+
+
+def launch(runs):
+    r = runs[0]
+    return Launch([sys.executable, '-c', CHILD, str(r.config_id)], f'run-{r.config_id}', f'input-{r.config_id}'.encode())
+
+
+def test_executor_streams_logs(tmp_path):
+    runs = [RunSpec('part', 0, c, 0) for c in range(4)]
+    executor = AsyncSubprocessExecutor(2, launch, str(tmp_path / 'logs'), chunk_size=1024)
+    try:
+        results = dispatch(executor, [[r] for r in runs])
+    finally:
+        executor.close()
+
+    by_config = {r.run.config_id: r for r in results}
+    assert by_config[1].exit_code == 3
+    assert by_config[1].error == 'bad config\n'
+    assert all(by_config[c].ok and by_config[c].error is None for c in (0, 2, 3))
+
+    # the usage of every child is kept when it is reaped
+    assert all(r.cpu_time is not None and r.max_rss > 0 for r in results)
+
+    for c in (0, 2, 3):
+        out = (tmp_path / 'logs' / f'run-{c}.out').read_text()
+        assert out == str(c) * 1_000_000 + f'input-{c}'
+
+    # empty logs are not kept
+    assert (tmp_path / 'logs' / 'run-1.err').exists()
+    assert not (tmp_path / 'logs' / 'run-0.err').exists()
+
+
+def test_executor_compresses_logs(tmp_path):
+    executor = AsyncSubprocessExecutor(1, launch, str(tmp_path), compress=True)
+    try:
+        dispatch(executor, [[RunSpec('part', 0, 2, 0)]])
+    finally:
+        executor.close()
+
+    assert not (tmp_path / 'run-2.out').exists()
+    with gzip.open(tmp_path / 'run-2.out.gz', 'rt') as f:
+        assert f.read() == '2' * 1_000_000 + 'input-2'
+
+
+def test_executor_collects_results(tmp_path):
+    def _launch(runs):
+        return Launch(
+            ['does-not-exist'],
+            'missing',
+            collect=lambda code, duration, error: [RunResult(r, code, duration, 'collected') for r in runs],
+        )
+
+    runs = [RunSpec('part', 0, 0, s) for s in range(2)]
+    executor = AsyncSubprocessExecutor(1, _launch, str(tmp_path))
+    try:
+        results = dispatch(executor, [runs])
+    finally:
+        executor.close()
+
+    # a child that cannot start fails its runs instead of the executor
+    assert [r.run for r in results] == runs
+    assert all(r.exit_code == 1 and r.error == 'collected' for r in results)
+
+
+def test_executor_kills_children_on_close(tmp_path):
+    def _launch(runs):
+        seconds = runs[0].config_id
+        return Launch([sys.executable, '-c', f'import time; time.sleep({seconds})'], f'sleep-{seconds}')
+
+    executor = AsyncSubprocessExecutor(2, _launch)
+    executor.start(0, [RunSpec('part', 0, 0, 0)])
+    executor.start(1, [RunSpec('part', 0, 60, 0)])
+
+    # the long run is underway once the short one has finished
+    start = time.perf_counter()
+    assert [slot for slot, _ in executor.wait()] == [0]
+    executor.close()
+    assert time.perf_counter() - start < 10
+
+
+def test_executor_cleans_up_cancelled_jobs():
+    cleaned = []
+
+    def _launch(runs):
+        seconds = runs[0].config_id
+        return Launch(
+            [sys.executable, '-c', f'import time; time.sleep({seconds})'],
+            f'sleep-{seconds}',
+            cleanup=lambda: cleaned.append(seconds),
+        )
+
+    executor = AsyncSubprocessExecutor(2, _launch)
+    executor.start(0, [RunSpec('part', 0, 0, 0)])
+    executor.start(1, [RunSpec('part', 0, 60, 0)])
+
+    # both the finished and the killed job are cleaned up
+    executor.wait()
+    assert cleaned == [0]
+    executor.close()
+    assert cleaned == [0, 60]
+
+
+def test_executor_reaps_beyond_default_threads():
+    def _launch(runs):
+        seconds = runs[0].config_id / 10
+        return Launch([sys.executable, '-c', f'import time; time.sleep({seconds})'], f'sleep-{seconds}')
+
+    # more slots than the loop's default pool has threads, with the long run started first
+    executor = AsyncSubprocessExecutor(4, _launch)
+    executor._loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+    runs = [RunSpec('part', 0, 30, 0)] + [RunSpec('part', 0, 0, s) for s in range(3)]
+    try:
+        results = dispatch(executor, [[r] for r in runs])
+    finally:
+        executor.close()
+
+    # the short runs are reaped as soon as they finish, not once the long run frees a thread
+    short = [r.duration for r in results if r.run.config_id == 0]
+    assert len(short) == 3
+    assert max(short) < 2.0
+
+
+@pytest.mark.skipif(not hasattr(os, 'sched_setaffinity') or shutil.which('taskset') is None, reason='needs CPU affinity and taskset')
+def test_executor_pins_cpus(tmp_path):
+    cpu = min(os.sched_getaffinity(0))
+
+    def affinity(runs):
+        return Launch([sys.executable, '-c', 'import os; print(sorted(os.sched_getaffinity(0)))'], 'affinity')
+
+    executor = AsyncSubprocessExecutor(1, affinity, str(tmp_path))
+    try:
+        executor.start(0, [RunSpec('part', 0, 0, 0)], Placement(1, 0.0, (cpu,)))
+        ((_, (result,)),) = executor.wait()
+    finally:
+        executor.close()
+
+    assert result.ok
+    assert (tmp_path / 'affinity.out').read_text().strip() == str([cpu])
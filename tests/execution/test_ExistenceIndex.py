@@ -0,0 +1,53 @@
+import os
+
+from ml_experiment.execution.existence_index import ExistenceIndex
+from ml_experiment.execution.types import RunSpec
+
+
+def _touch(root, *parts):
+    path = os.path.join(root, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("")
+
+
+def test_index_membership(tmp_path):
+    _touch(tmp_path, "top.txt")
+    for part in ["a", "b", "c"]:
+        for config_id in range(3):
+            _touch(tmp_path, part, str(config_id), "0.npy")
+
+    serial = ExistenceIndex(str(tmp_path))
+    parallel = ExistenceIndex(str(tmp_path), workers=3)
+
+    assert len(serial) == len(parallel) == 10
+    assert "top.txt" in serial
+    assert "b/2/0.npy" in parallel
+    assert "./b/2/0.npy" in parallel
+    assert "b/2/1.npy" not in parallel
+    assert "b/2" not in parallel
+
+    # the index only sees the filesystem as of the last walk
+    _touch(tmp_path, "d", "0", "0.npy")
+    assert "d/0/0.npy" not in serial
+    serial.refresh()
+    assert "d/0/0.npy" in serial
+
+
+def test_index_predicate(tmp_path):
+    _touch(tmp_path, "a", "0", "1.npy")
+    _touch(tmp_path, "a", "2", "0.npy")
+
+    idx = ExistenceIndex(str(tmp_path))
+    runs = [RunSpec("a", 0, c, s) for c in range(3) for s in range(2)]
+
+    exists = idx.predicate("{part}/{config_id}/{seed}.npy")
+    assert [r for r, e in zip(runs, exists(runs), strict=True) if e] == [RunSpec("a", 0, 0, 1), RunSpec("a", 0, 2, 0)]
+
+    exists = idx.predicate(lambda r: os.path.join(r.part_name, str(r.config_id), f"{r.seed}.npy"))
+    assert sum(exists(runs)) == 2
+
+
+def test_index_missing_root(tmp_path):
+    idx = ExistenceIndex(str(tmp_path / "nope"))
+    assert len(idx) == 0
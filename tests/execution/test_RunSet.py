@@ -0,0 +1,66 @@
+import pytest
+
+import ml_experiment.execution.run_set as run_set
+from ml_experiment.execution.run_set import RunSet
+from ml_experiment.execution.types import RunSpec
+
+
+@pytest.fixture(params=["numpy", "python"])
+def backend(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(run_set, "_np", None)
+    elif run_set._np is None:
+        pytest.skip("numpy is not installed")
+
+    return request.param
+
+
+def test_construction(backend):
+    runs = [RunSpec("b", 1, 3, 0), RunSpec("a", 0, 1, 2), RunSpec("b", 1, 3, 0)]
+    s = RunSet(runs)
+
+    # duplicates are dropped and insertion order is kept
+    assert list(s) == runs[:2]
+    assert len(s) == 2
+    assert s[1] == RunSpec("a", 0, 1, 2)
+    assert list(s[:1]) == runs[:1]
+    assert RunSpec("a", 0, 1, 2) in s
+    assert RunSpec("a", 0, 1, 3) not in s
+    assert RunSpec("c", 0, 1, 2) not in s
+    assert s.get_parts() == {"a", "b"}
+    assert s.get_groups() == {("a", 0), ("b", 1)}
+
+    p = RunSet.from_product("a", 2, [5, 6, 5], [0, 1])
+    assert list(p) == [RunSpec("a", 2, 5, 0), RunSpec("a", 2, 5, 1), RunSpec("a", 2, 6, 0), RunSpec("a", 2, 6, 1)]
+    assert p == set(p)
+
+
+def test_set_operations(backend):
+    a = RunSet.from_product("a", 0, range(4), [0, 1])
+    b = RunSet([RunSpec("b", 0, 0, 0), RunSpec("a", 0, 3, 1), RunSpec("a", 0, 9, 9)])
+
+    assert set(a | b) == set(a) | set(b)
+    assert list(a | b)[:len(a)] == list(a)
+    assert list(a - b) == [r for r in a if r not in set(b)]
+    assert list(a & b) == [RunSpec("a", 0, 3, 1)]
+    assert list(b - a) == [RunSpec("b", 0, 0, 0), RunSpec("a", 0, 9, 9)]
+
+    # plain iterables of runs are accepted too
+    assert a - list(b) == a - b
+    assert RunSet() | a == a
+    assert len(a - a) == 0
+
+
+def test_filter_and_sort(backend):
+    runs = [RunSpec("b", 0, 1, 0), RunSpec("a", 1, 0, 0), RunSpec("a", 0, 2, 1), RunSpec("a", 0, 2, 0)]
+    s = RunSet(runs)
+
+    assert list(s.filter([True, False, True, False])) == [runs[0], runs[2]]
+    assert list(s.sort()) == sorted(runs)
+    assert list(s.sort(reverse=True)) == sorted(runs, reverse=True)
+    assert list(s.sort(key=lambda r: r.config_id)) == sorted(runs, key=lambda r: r.config_id)
+
+
+def test_memory():
+    s = RunSet.from_product("a", 0, range(10_000), range(10))
+    assert s.nbytes <= 24 * len(s)
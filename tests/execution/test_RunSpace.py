@@ -0,0 +1,76 @@
+from ml_experiment.execution.run_space import RunSpace
+from ml_experiment.execution.run_set import RunSet
+from ml_experiment.execution.types import RunSpec
+
+
+def _eager(factors):
+    return [
+        RunSpec(part, version, c, s)
+        for part, version, ids, seeds in factors
+        for c in sorted(set(ids))
+        for s in sorted(set(seeds))
+    ]
+
+
+def test_space_matches_product():
+    factors = [("a", 0, {3, 1, 2}, [10, 11]), ("b", 2, [7], [0, 1, 2]), ("c", 0, [], [0])]
+    space = RunSpace(factors)
+    runs = _eager(factors)
+
+    assert len(space) == len(runs) == 9
+    assert list(space) == runs
+    assert [space[i] for i in range(-len(runs), len(runs))] == runs + runs
+    assert space.get_groups() == {("a", 0), ("b", 2)}
+
+    for r in runs:
+        assert r in space
+    assert RunSpec("a", 0, 4, 10) not in space
+    assert RunSpec("a", 0, 1, 12) not in space
+    assert RunSpec("a", 1, 1, 10) not in space
+
+
+def test_space_sorts_seeds():
+    # numbered like a sorted RunSet, so eager and lazy hosts shard alike
+    factors = [("a", 0, [2, 0, 1], [11, 3, 7, 3]), ("b", 0, [5], range(4, 0, -1))]
+    space = RunSpace(factors)
+    runs = RunSet(RunSpec(part, version, c, s) for part, version, ids, seeds in factors for c in ids for s in seeds).sort()
+
+    assert list(space) == list(runs)
+    for index in range(3):
+        assert list(space[index::3]) == list(runs[index::3])
+
+
+def test_space_slicing():
+    factors = [("a", 0, range(5), [0, 1]), ("b", 0, range(3), [0, 1, 2])]
+    space = RunSpace(factors)
+    runs = _eager(factors)
+
+    for s in [slice(3, 12), slice(None, None, 4), slice(None, None, -3), slice(15, 2, -2)]:
+        view = space[s]
+        assert list(view) == runs[s]
+        assert len(view) == len(runs[s])
+        assert all(r in view for r in runs[s])
+        assert sum(r in view for r in runs) == len(runs[s])
+
+    # the tail of the space only covers part b
+    assert space[10:].get_groups() == {("b", 0)}
+    assert space[2:9][1:3][1] == runs[2:9][1:3][1]
+
+
+def test_space_materialization():
+    factors = [("a", 0, range(4), [0, 1]), ("b", 1, [2], [5])]
+    space = RunSpace(factors)
+
+    assert list(space.to_run_set()) == list(space)
+    assert list(space[1:5].to_run_set()) == list(space)[1:5]
+
+    done = RunSet([RunSpec("a", 0, 0, 1), RunSpec("b", 1, 2, 5)])
+    assert list(space - done) == [r for r in space if r not in set(done)]
+    assert list(space.filter(r.seed == 0 for r in space)) == [r for r in space if r.seed == 0]
+
+
+def test_huge_space_is_cheap():
+    space = RunSpace([("a", 0, range(1000), range(10**9))])
+    assert len(space) == 10**12
+    assert space[-1] == RunSpec("a", 0, 999, 10**9 - 1)
+    assert space[10**9 + 5] == RunSpec("a", 0, 1, 5)
@@ -0,0 +1,126 @@
+import multiprocessing
+import os
+
+import pytest
+
+import ml_experiment.execution.worker_pool as worker_pool
+from ml_experiment.execution.dispatch import dispatch
+from ml_experiment.execution.types import RunSpec
+from ml_experiment.execution.worker_pool import WorkerPool
+
+ENTRY = """
+import os
+
+LOADED_IN = os.getpid()
+
+def run(part, version, config_id, seed, results_path):
+    if config_id == 1:
+        os._exit(3)
+
+    if config_id == 2:
+        raise ValueError('bad config')
+
+    with open(os.path.join(results_path, f'{config_id}-{seed}.txt'), 'w') as f:
+        f.write(str(LOADED_IN))
+"""
+
+
+def test_worker_pool_isolates_crashes(tmp_path):
+    entry = tmp_path / 'entry.py'
+    entry.write_text(ENTRY)
+
+    runs = [RunSpec('part', 0, c, s) for c in range(5) for s in range(3)]
+    pool = WorkerPool(str(entry), 2, str(tmp_path))
+    try:
+        results = dispatch(pool, [[r] for r in runs])
+    finally:
+        pool.close()
+
+    assert sorted(r.run for r in results) == sorted(runs)
+
+    by_config = {}
+    for r in results:
+        by_config.setdefault(r.run.config_id, set()).add(r.exit_code)
+
+    # the crashing config only takes itself down
+    assert by_config[1] == {3}
+    assert by_config[2] == {1}
+    assert by_config[0] == by_config[3] == by_config[4] == {0}
+
+    # the entry is imported once per worker, not once per run
+    loaded_in = set()
+    for c in (0, 3, 4):
+        for s in range(3):
+            loaded_in.add((tmp_path / f'{c}-{s}.txt').read_text())
+
+    assert len(loaded_in) < 9
+    assert str(os.getpid()) not in loaded_in
+
+    assert all(r.cpu_time is not None for r in results if r.exit_code in (0, 1))
+
+
+THREADS_ENTRY = """
+import os
+
+def run(part, version, config_id, seed, results_path):
+    with open(os.path.join(results_path, f'{config_id}-{seed}.txt'), 'w') as f:
+        f.write(os.environ.get('OMP_NUM_THREADS', ''))
+"""
+
+
+def test_worker_pool_limits_threads(tmp_path):
+    entry = tmp_path / 'entry.py'
+    entry.write_text(THREADS_ENTRY)
+
+    runs = [RunSpec('part', 0, c, 0) for c in range(4)]
+    pool = WorkerPool(str(entry), 2, str(tmp_path), threads=1)
+    try:
+        results = dispatch(pool, [[r] for r in runs])
+    finally:
+        pool.close()
+
+    assert all(r.ok for r in results)
+    assert {(tmp_path / f'{c}-0.txt').read_text() for c in range(4)} == {'1'}
+
+
+def test_worker_pool_profiles_runs(tmp_path):
+    entry = tmp_path / 'entry.py'
+    entry.write_text(THREADS_ENTRY)
+
+    def _profile(r):
+        return str(tmp_path / f'{r.config_id}.prof') if r.config_id == 1 else None
+
+    runs = [RunSpec('part', 0, c, 0) for c in range(3)]
+    pool = WorkerPool(str(entry), 1, str(tmp_path), profile=_profile)
+    try:
+        results = dispatch(pool, [[r] for r in runs])
+    finally:
+        pool.close()
+
+    assert all(r.ok for r in results)
+    assert sorted(p.name for p in tmp_path.glob('*.prof')) == ['1.prof']
+
+
+@pytest.mark.skipif('forkserver' not in multiprocessing.get_all_start_methods(), reason='needs a forkserver')
+def test_worker_pool_limits_threads_after_preload(tmp_path, monkeypatch):
+    monkeypatch.setattr(worker_pool, '_forkserver_preload', None)
+
+    entry = tmp_path / 'entry.py'
+    entry.write_text(THREADS_ENTRY)
+
+    # the first pool preloads its entry into the forkserver
+    first = WorkerPool(str(entry), 1, str(tmp_path))
+    first.close()
+    assert first._ctx.get_start_method() == 'forkserver'
+
+    # so a later pool limiting threads cannot fork from it
+    runs = [RunSpec('part', 0, c, 0) for c in range(2)]
+    pool = WorkerPool(str(entry), 1, str(tmp_path), threads=1)
+    try:
+        assert pool._ctx.get_start_method() == 'spawn'
+        results = dispatch(pool, [[r] for r in runs])
+    finally:
+        pool.close()
+
+    assert all(r.ok for r in results)
+    assert {(tmp_path / f'{c}-0.txt').read_text() for c in range(2)} == {'1'}
@@ -0,0 +1,51 @@
+import io
+import json
+
+from ml_experiment.execution.batch import encode_runs, make_batches, read_status, run_batch
+from ml_experiment.execution.types import RunSpec
+
+
+def test_make_batches_by_count():
+    runs = [RunSpec('p', 0, i, 0) for i in range(7)]
+    batches = list(make_batches(runs, max_runs=3))
+    assert batches == [runs[0:3], runs[3:6], runs[6:7]]
+
+
+def test_make_batches_by_budget():
+    runs = [RunSpec('p', 0, i, 0) for i in range(6)]
+    costs = {0: 2.0, 1: 2.0, 2: 5.0, 3: 1.0, 4: 1.0, 5: 1.0}
+    batches = list(make_batches(runs, max_runs=100, time_budget=4.0, estimate=lambda r: costs[r.config_id]))
+
+    # the over-budget run gets a batch of its own
+    assert batches == [runs[0:2], runs[2:3], runs[3:6]]
+
+
+def test_run_batch_protocol(tmp_path):
+    runs = [RunSpec('p', 0, i, 1) for i in range(4)]
+    status_path = tmp_path / 'status.jsonl'
+
+    seen = []
+    def run(part, version, config_id, seed, results_path):
+        seen.append((part, version, config_id, seed, results_path))
+        if config_id == 2:
+            raise ValueError('bad config')
+
+    argv = ['--batch', '--results-path', str(tmp_path), '--status-file', str(status_path)]
+    failures = run_batch(run, argv=argv, stdin=io.StringIO(encode_runs(runs)))
+
+    assert failures == 1
+    assert seen == [('p', 0, i, 1, str(tmp_path)) for i in range(4)]
+
+    lines = [json.loads(line) for line in status_path.read_text().splitlines()]
+    assert [d['exit_code'] for d in lines] == [0, 0, 1, 0]
+    assert 'bad config' in lines[2]['error']
+
+    # a run missing from the status file failed with the process
+    extra = RunSpec('p', 0, 9, 1)
+    results = read_status(str(status_path), runs + [extra], exit_code=-9, error='Killed')
+    assert [r.exit_code for r in results] == [0, 0, 1, 0, -9]
+    assert [r.run for r in results] == runs + [extra]
+
+    # and is told the tail of the process's stderr
+    assert results[-1].error is not None and results[-1].error.endswith('Killed')
+    assert results[0].error is None
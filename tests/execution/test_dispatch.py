@@ -0,0 +1,97 @@
+from typing import List, Tuple
+
+import pytest
+
+import ml_experiment.execution.resources as resources
+from ml_experiment.execution.dispatch import dispatch
+from ml_experiment.execution.resources import Placement, ResourceManager, Resources
+from ml_experiment.execution.types import RunResult, RunSpec
+
+
+class FakeExecutor:
+    """
+    Completes jobs in simulated time, always finishing the job with the
+    earliest end time first.
+    """
+    def __init__(self, slots: int, durations: dict[int, float]):
+        self.slots = slots
+        self.durations = durations
+        self.now = 0.0
+        self.running: dict[int, Tuple[float, List[RunSpec]]] = {}
+        self.started: List[Tuple[int, int]] = []
+        self.placements: dict[int, Placement | None] = {}
+        self.peak = 0
+
+    def start(self, slot: int, runs: List[RunSpec], placement: Placement | None = None):
+        end = self.now + sum(self.durations[r.config_id] for r in runs)
+        self.running[slot] = (end, runs)
+        self.placements[slot] = placement
+        self.peak = max(self.peak, len(self.running))
+        self.started.extend((slot, r.config_id) for r in runs)
+
+    def wait(self):
+        slot = min(self.running, key=lambda s: self.running[s][0])
+        end, runs = self.running.pop(slot)
+        self.now = end
+        return [(slot, [RunResult(r, 0, self.durations[r.config_id]) for r in runs])]
+
+    def close(self):
+        pass
+
+
+def test_dispatch_is_dynamic():
+    durations = {0: 10.0, 1: 1.0, 2: 1.0, 3: 1.0, 4: 1.0, 5: 1.0}
+    runs = [RunSpec('p', 0, c, 0) for c in durations]
+    executor = FakeExecutor(2, durations)
+
+    seen = []
+    started = []
+    results = dispatch(executor, [[r] for r in runs], on_result=seen.append, on_start=started.append)
+
+    assert sorted(r.run for r in results) == runs
+    assert seen == results
+    assert [job[0].config_id for job in started] == [c for s, c in executor.started]
+
+    # the long run occupies one slot while the other slot drains the rest
+    assert executor.now == 10.0
+    assert [c for s, c in executor.started if c != 0] == [1, 2, 3, 4, 5]
+
+
+def test_dispatch_needs_a_slot():
+    executor = FakeExecutor(0, {0: 1.0})
+    with pytest.raises(ValueError):
+        dispatch(executor, [[RunSpec('p', 0, 0, 0)]])
+
+
+def test_dispatch_admits_by_resources(monkeypatch):
+    monkeypatch.setattr(resources, 'get_available_cpus', lambda: [0, 1, 2, 3])
+    monkeypatch.setattr(resources, 'can_pin_cpus', lambda: True)
+
+    durations = {c: 1.0 for c in range(6)}
+    runs = [RunSpec('p', 0, c, 0) for c in durations]
+
+    # enough slots for every run, but only room for two runs of two threads at a time
+    manager = ResourceManager(lambda r: Resources(threads=2), pin_cpus=True, memory_limit=1024)
+    executor = FakeExecutor(6, durations)
+    results = dispatch(executor, [[r] for r in runs], resources=manager)
+
+    assert sorted(r.run for r in results) == runs
+    assert executor.peak == 2
+    assert executor.now == 3.0
+    assert manager._threads == 0 and manager._free_cpus == [0, 1, 2, 3]
+
+    cpus = {p.cpus for p in executor.placements.values() if p is not None}
+    assert cpus <= {(0, 1), (2, 3)}
+
+
+def test_dispatch_forces_oversized_jobs():
+    durations = {0: 1.0, 1: 1.0}
+    runs = [RunSpec('p', 0, c, 0) for c in durations]
+
+    # a run that can never fit still runs, alone
+    manager = ResourceManager(lambda r: Resources(memory=100), memory_limit=10)
+    executor = FakeExecutor(2, durations)
+    results = dispatch(executor, [[r] for r in runs], resources=manager)
+
+    assert sorted(r.run for r in results) == runs
+    assert executor.peak == 1
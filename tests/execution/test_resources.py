@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+import ml_experiment.execution.resources as resources
+from ml_experiment.execution.resources import THREAD_ENV_VARS, Placement, ResourceManager, Resources
+from ml_experiment.execution.types import RunSpec
+
+
+def test_placement_env():
+    assert Placement(None, 0.0).get_env() == {}
+    assert Placement(None, 0.0).get_popen_kwargs() == {}
+
+    env = Placement(2, 0.0).get_env()
+    assert set(env) == set(THREAD_ENV_VARS)
+    assert set(env.values()) == {'2'}
+
+    kwargs = Placement(2, 0.0, (0,)).get_popen_kwargs()
+    assert kwargs['env']['OMP_NUM_THREADS'] == '2'
+    assert kwargs['env']['PATH'] == os.environ['PATH']
+    assert 'preexec_fn' not in kwargs
+
+    # pinned children are started through taskset
+    assert Placement(2, 0.0).wrap(['python', 'x.py']) == ['python', 'x.py']
+    assert Placement(2, 0.0, (0, 3)).wrap(['python', 'x.py']) == ['taskset', '--cpu-list', '0,3', 'python', 'x.py']
+
+
+def test_manager_skips_pinning_without_affinity(monkeypatch):
+    monkeypatch.delattr(os, 'sched_setaffinity', raising=False)
+    monkeypatch.setattr(resources, 'get_available_cpus', lambda: [0, 1])
+
+    with pytest.warns(UserWarning):
+        manager = ResourceManager(lambda r: Resources(threads=1), pin_cpus=True)
+
+    placement = manager.acquire([RunSpec('p', 0, 0, 0)])
+    assert placement == Placement(1, 0.0)
+
+
+def test_manager_skips_pinning_without_taskset(monkeypatch):
+    monkeypatch.setattr(resources.shutil, 'which', lambda cmd: None)
+    monkeypatch.setattr(resources, 'get_available_cpus', lambda: [0, 1])
+
+    with pytest.warns(UserWarning, match='taskset'):
+        manager = ResourceManager(lambda r: Resources(threads=1), pin_cpus=True)
+
+    assert not manager.pin_cpus
+    assert manager.acquire([RunSpec('p', 0, 0, 0)]) == Placement(1, 0.0)
+
+
+def test_manager_limits_threads(monkeypatch):
+    monkeypatch.setattr(resources, 'get_available_cpus', lambda: [0, 1, 2, 3])
+    manager = ResourceManager(lambda r: Resources(threads=r.config_id))
+
+    # a job holds the most threads any of its runs asks for
+    a = manager.acquire([RunSpec('p', 0, 1, 0), RunSpec('p', 0, 3, 0)])
+    assert a == Placement(3, 0.0)
+
+    assert manager.acquire([RunSpec('p', 0, 2, 0)]) is None
+    b = manager.acquire([RunSpec('p', 0, 1, 0)])
+    assert b is not None
+
+    manager.release(a)
+    assert manager.acquire([RunSpec('p', 0, 2, 0)]) is not None
+
+    # undeclared runs are only limited by the slots
+    manager = ResourceManager(lambda r: Resources())
+    assert all(manager.acquire([RunSpec('p', 0, c, 0)]) for c in range(8))
+
+
+def test_manager_pins_cpus(monkeypatch):
+    monkeypatch.setattr(resources, 'get_available_cpus', lambda: [0, 1, 2, 3])
+    monkeypatch.setattr(resources, 'can_pin_cpus', lambda: True)
+    manager = ResourceManager(lambda r: Resources(threads=2), pin_cpus=True)
+
+    a = manager.acquire([RunSpec('p', 0, 0, 0)])
+    b = manager.acquire([RunSpec('p', 0, 1, 0)])
+    assert a is not None and b is not None
+    assert (a.cpus, b.cpus) == ((0, 1), (2, 3))
+    assert manager.acquire([RunSpec('p', 0, 2, 0)]) is None
+
+    manager.release(a)
+    c = manager.acquire([RunSpec('p', 0, 2, 0)])
+    assert c is not None and c.cpus == (0, 1)
+
+
+def test_manager_limits_memory(monkeypatch):
+    monkeypatch.setattr(resources, 'get_available_memory', lambda: 1000.0)
+    manager = ResourceManager(lambda r: Resources(memory=400), memory_limit=1000)
+
+    assert manager.acquire([RunSpec('p', 0, 0, 0)]) is not None
+    assert manager.acquire([RunSpec('p', 0, 1, 0)]) is not None
+    assert manager.acquire([RunSpec('p', 0, 2, 0)]) is None
+    assert manager.acquire([RunSpec('p', 0, 2, 0)], force=True) is not None
+
+    # the memory the os reports as free is checked as well
+    monkeypatch.setattr(resources, 'get_available_memory', lambda: 100.0)
+    manager = ResourceManager(lambda r: Resources(memory=400), memory_limit=1000)
+    assert manager.acquire([RunSpec('p', 0, 0, 0)]) is None
+
+
+
+def test_manager_limits_load(monkeypatch):
+    monkeypatch.setattr(resources, '_get_load', lambda: 8.0)
+    manager = ResourceManager(lambda r: Resources(), max_load=4.0)
+    assert manager.acquire([RunSpec('p', 0, 0, 0)]) is None
+
+    monkeypatch.setattr(resources, '_get_load', lambda: 2.0)
+    assert manager.acquire([RunSpec('p', 0, 0, 0)]) is not None
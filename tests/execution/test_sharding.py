@@ -0,0 +1,15 @@
+from ml_experiment.execution.sharding import assign_by_cost
+
+
+def test_assign_by_cost():
+    costs = [1.0, 8.0, 2.0, 7.0, 3.0, 3.0]
+    shards = assign_by_cost(costs, 2)
+
+    loads = [sum(c for c, s in zip(costs, shards, strict=True) if s == k) for k in range(2)]
+    assert loads == [12.0, 12.0]
+    assert assign_by_cost(costs, 2) == shards
+
+
+def test_assign_by_cost_more_shards_than_items():
+    assert sorted(assign_by_cost([1.0, 1.0], 4)) == [0, 1]
+    assert assign_by_cost([], 3) == []
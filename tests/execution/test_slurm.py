@@ -0,0 +1,57 @@
+import pytest
+
+from ml_experiment.execution.slurm import format_time, pack_tasks, write_submission
+from ml_experiment.execution.types import RunSpec
+
+
+def test_pack_tasks():
+    durations = {0: 50.0, 1: 30.0, 2: 30.0, 3: 20.0, 4: 10.0, 5: 10.0, 6: 10.0}
+    runs = [RunSpec("p", 0, c, 0) for c in durations]
+
+    tasks = pack_tasks(runs, lambda r: durations[r.config_id], time_budget=60.0, cores=2)
+
+    # every run lands in exactly one task
+    assert sorted(r for t in tasks for r in t) == runs
+
+    # 160s of work over two 60s cores needs at least two tasks
+    assert len(tasks) == 2
+    for task in tasks:
+        # longest first, and fits when run longest-first over the cores
+        costs = [durations[r.config_id] for r in task]
+        assert costs == sorted(costs, reverse=True)
+
+        cores = [0.0, 0.0]
+        for c in costs:
+            cores[cores.index(min(cores))] += c
+        assert max(cores) <= 60.0
+
+
+def test_pack_tasks_too_long():
+    with pytest.raises(ValueError):
+        pack_tasks([RunSpec("p", 0, 0, 0)], lambda r: 100.0, time_budget=60.0, cores=4)
+
+    assert pack_tasks([], lambda r: 1.0, time_budget=60.0, cores=4) == []
+
+
+def test_format_time():
+    assert format_time(1) == "0-00:01:00"
+    assert format_time(3600) == "0-01:00:00"
+    assert format_time(26 * 3600 + 61) == "1-02:02:00"
+
+
+def test_write_submission_offset(tmp_path):
+    first = write_submission(str(tmp_path), "exp", 3, 60.0, 1)
+    rest = write_submission(str(tmp_path), "exp", 2, 60.0, 1, first_task=3)
+
+    # later arrays get their own script and logs, and offset their task ids
+    assert first != rest
+    with open(first) as f:
+        text = f.read()
+    assert "#SBATCH --array=0-2" in text
+    assert "task_${SLURM_ARRAY_TASK_ID}.json" in text
+
+    with open(rest) as f:
+        text = f.read()
+    assert "#SBATCH --array=0-1" in text
+    assert "task_3+%a.out" in text
+    assert "task_$((SLURM_ARRAY_TASK_ID + 3)).json" in text
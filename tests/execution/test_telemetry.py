@@ -0,0 +1,52 @@
+import csv
+import json
+
+from ml_experiment.execution.telemetry import Telemetry, describe, get_profiled_command, percentile
+from ml_experiment.execution.types import RunResult, RunSpec
+
+
+def test_percentile():
+    ordered = [float(i) for i in range(1, 101)]
+    assert percentile(ordered, 50) == 50.0
+    assert percentile(ordered, 99) == 99.0
+    assert percentile([3.0], 90) == 3.0
+
+    assert describe([]) is None
+    assert describe([2.0, 1.0, 3.0]) == {'mean': 2.0, 'p50': 2.0, 'p90': 3.0, 'p99': 3.0, 'max': 3.0}
+
+
+def test_telemetry_report(tmp_path):
+    runs = [RunSpec('p', 0, c, 0) for c in range(4)]
+
+    progress = []
+    telemetry = Telemetry(2, len(runs), progress.append)
+    for i, r in enumerate(runs):
+        telemetry.on_start([r])
+        telemetry.on_result(RunResult(r, int(i == 3), 1.0, None, 0.5, 100.0 + i))
+
+    assert [p.done for p in progress] == [1, 2, 3, 4]
+    assert progress[-1].failed == 1
+    assert progress[-1].running == 0
+    assert progress[1].eta is not None
+
+    summary = telemetry.get_summary()
+    assert summary['runs'] == 4 and summary['failed'] == 1
+    assert summary['cpu_per_wall'] == 0.5
+    assert summary['max_rss']['max'] == 103.0
+
+    telemetry.write_report(str(tmp_path / 'report.json'))
+    report = json.loads((tmp_path / 'report.json').read_text())
+    assert report['summary']['runs'] == 4
+    assert [r['config_id'] for r in report['runs']] == [0, 1, 2, 3]
+
+    telemetry.write_report(str(tmp_path / 'report.csv'))
+    with open(tmp_path / 'report.csv') as f:
+        rows = list(csv.DictReader(f))
+
+    assert [int(r['exit_code']) for r in rows] == [0, 0, 0, 1]
+
+
+def test_profiled_command():
+    cmd = ['python', 'entry.py', '--seed', '0']
+    assert get_profiled_command(cmd, 'out.prof', 'cprofile') == ['python', '-m', 'cProfile', '-o', 'out.prof', 'entry.py', '--seed', '0']
+    assert get_profiled_command(cmd, 'out.json', 'py-spy')[-5:] == ['--', *cmd]
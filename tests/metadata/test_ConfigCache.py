@@ -0,0 +1,121 @@
+import os
+import shutil
+import sqlite3
+
+from ml_experiment.definition_part import DefinitionPart
+from ml_experiment.experiment_definition import ExperimentDefinition
+from ml_experiment.metadata.config_cache import ConfigCache
+
+
+def _commit(tmp_path, name: str, alphas: list[float]):
+    part = DefinitionPart(name, base=str(tmp_path))
+    part.add_sweepable_property("alpha", alphas)
+    part.commit()
+    return part
+
+
+def test_cached_reads_match(tmp_path):
+    _commit(tmp_path, "cached", [0.1, 0.2, 0.3])
+
+    cache = ConfigCache()
+    cached = ExperimentDefinition("cached", 0, base=str(tmp_path), cache=cache)
+    uncached = ExperimentDefinition("cached", 0, base=str(tmp_path))
+
+    for i in range(3):
+        assert cached.get_config(i) == uncached.get_config(i)
+
+    assert cached.get_configs([2, 0], product_seeds=[1]) == uncached.get_configs([2, 0], product_seeds=[1])
+    assert len(cache) == 1
+
+    # modifying a returned config does not modify the cache
+    cached.get_config(0)["alpha"] = -1
+    assert cached.get_config(0) == uncached.get_config(0)
+
+
+def test_cached_reads_skip_sqlite(tmp_path, monkeypatch):
+    _commit(tmp_path, "cached", [0.1, 0.2, 0.3])
+
+    cache = ConfigCache()
+    exp = ExperimentDefinition("cached", 0, base=str(tmp_path), cache=cache)
+    expected = exp.get_config(1)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("sqlite should not be queried")
+
+    monkeypatch.setattr(exp, "_get_cursor", fail)
+    assert exp.get_config(1) == expected
+
+    # a second definition in the same process shares the cache
+    other = ExperimentDefinition("cached", 0, base=str(tmp_path), cache=cache)
+    monkeypatch.setattr(other, "_get_cursor", fail)
+    assert other.get_configs([0, 1, 2])[1] == expected
+
+
+def test_cache_invalidated_on_change(tmp_path):
+    part = _commit(tmp_path, "cached", [0.1, 0.2])
+    results_path = part.get_results_path(part.base_path)
+
+    cache = ConfigCache()
+    exp = ExperimentDefinition("cached", 0, base=str(tmp_path), cache=cache)
+    assert exp.get_config(0)["alpha"] in (0.1, 0.2)
+
+    # replace the database with a different sweep behind the cache's back
+    shutil.rmtree(results_path)
+    _commit(tmp_path, "cached", [0.5, 0.6])
+
+    assert exp.get_config(0)["alpha"] in (0.5, 0.6)
+
+
+def test_cache_kept_on_other_writes(tmp_path, monkeypatch):
+    part = _commit(tmp_path, "cached", [0.1, 0.2])
+    db_path = os.path.join(part.get_results_path(part.base_path), "metadata.db")
+
+    cache = ConfigCache()
+    exp = ExperimentDefinition("cached", 0, base=str(tmp_path), cache=cache)
+
+    loads = []
+    real_get_all = exp.table.get_all_configurations
+
+    def counted(cur):
+        loads.append(1)
+        return real_get_all(cur)
+
+    monkeypatch.setattr(exp.table, "get_all_configurations", counted)
+    expected = exp.get_config(1)
+
+    # writing run bookkeeping to the same file does not change any table version
+    with sqlite3.connect(db_path) as con:
+        con.execute("CREATE TABLE '_runs' (id INTEGER)")
+        con.execute("INSERT INTO '_runs' VALUES (1)")
+
+    assert exp.get_config(1) == expected
+    assert len(loads) == 1
+
+    # neither does committing a new version
+    part.add_sweepable_property("alpha", [0.3])
+    part.commit()
+
+    assert exp.get_config(1) == expected
+    assert len(loads) == 1
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    part = _commit(tmp_path, "cached", [0.1, 0.2])
+    part.add_sweepable_property("alpha", [0.3])
+    part.commit()
+    part.add_sweepable_property("alpha", [0.4])
+    part.commit()
+
+    cache = ConfigCache(max_rows=7)
+    v0 = ExperimentDefinition("cached", 0, base=str(tmp_path), cache=cache)
+    v1 = ExperimentDefinition("cached", 1, base=str(tmp_path), cache=cache)
+    v2 = ExperimentDefinition("cached", 2, base=str(tmp_path), cache=cache)
+
+    v0.get_config(0)
+    v1.get_config(0)
+    assert len(cache) == 2
+
+    # 2 + 3 + 4 rows do not fit, so v0 is evicted
+    v2.get_config(0)
+    assert len(cache) == 2
+    assert "cached-v0" not in {k[1] for k in cache._entries}
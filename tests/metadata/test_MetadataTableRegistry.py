@@ -70,3 +70,154 @@ def test_get_parts(tmp_path):
         parts = meta.get_parts(cur)
 
         assert parts == set(["test", "test-2", "test-3-lot-of-hyphens-"])
+
+
+def test_lookup_configuration_ids(tmp_path):
+    """
+    Test that batched id lookup agrees with the single-configuration lookup
+    across several versions, including configurations that only exist
+    without their assumed prior values.
+    """
+    df = DefinitionPart("test", base=str(tmp_path))
+    df.add_sweepable_property("a", [1, 2, 3])
+    df.add_property("b", 0.5)
+    df.commit()
+
+    df.add_sweepable_property("c", [True, False], assume_prior_value=True)
+    df.commit()
+
+    df.add_sweepable_property("a", [4])
+    df.commit()
+
+    queries = [
+        {"a": 1, "b": 0.5},
+        {"a": 1, "b": 0.5, "c": True},
+        {"a": 4, "b": 0.5, "c": False},
+        {"a": 4, "b": 0.5},
+        {"a": 1.0, "b": 0.5, "c": 1},
+        {"a": 5, "b": 0.5, "c": True},
+        {"a": 2},
+    ]
+
+    meta = MetadataTableRegistry()
+    res_path = os.path.join(df.get_results_path(df.base_path), "metadata.db")
+    with sqlite3.connect(res_path) as con:
+        cur = con.cursor()
+
+        expected = [meta.get_configuration_id(cur, "test", q).or_else(None) for q in queries]
+        got = meta.lookup_configuration_ids(cur, "test", queries)
+
+        assert got == expected
+        assert got[0] is not None and got[2] is not None
+        assert got[5] is None and got[6] is None
+
+
+def test_migrate_legacy_tables(tmp_path):
+    """
+    Test that tables written without a fingerprint column are backfilled
+    and indexed on the next commit, and keep their configuration ids.
+    """
+    df = DefinitionPart("legacy", base=str(tmp_path))
+    res_path = os.path.join(df.get_results_path(df.base_path), "metadata.db")
+    os.makedirs(os.path.dirname(res_path), exist_ok=True)
+
+    # write a table using the old schema
+    with sqlite3.connect(res_path) as con:
+        con.execute("CREATE TABLE 'legacy-v0' (a, b, id INTEGER PRIMARY KEY)")
+        con.executemany(
+            "INSERT INTO 'legacy-v0' (a, b, id) VALUES (?, ?, ?)",
+            [(1, 0.5, 0), (2, 0.5, 1), (3, 0.5, 2)],
+        )
+
+    df.add_sweepable_property("a", [1, 2, 3, 4])
+    df.add_property("b", 0.5)
+    df.commit()
+
+    meta = MetadataTableRegistry()
+    with sqlite3.connect(res_path) as con:
+        cur = con.cursor()
+
+        legacy = meta.get_table(cur, "legacy", 0)
+        assert legacy is not None
+        assert legacy.has_fingerprint(cur)
+        assert legacy.get_columns(cur) == {"a", "b", "id"}
+
+        indices = {r[0] for r in cur.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        assert legacy.get_index_name() in indices
+
+        # the legacy rows are found through the index
+        assert legacy.get_configuration_id(cur, {"a": 2, "b": 0.5}) == 1
+
+        latest = meta.get_latest_version(cur, "legacy")
+        assert latest is not None and latest.version == 1
+        assert latest.get_configuration_id(cur, {"a": 1.0, "b": 0.5}) == 0
+        assert latest.get_configuration_id(cur, {"a": 4, "b": 0.5}) == 3
+        assert meta.get_parts(cur) == {"legacy"}
+
+
+def test_part_name_prefixes(tmp_path):
+    """
+    Test that parts whose names are prefixes of each other do not see each other's tables.
+    """
+    ac2 = DefinitionPart("ac-2", base=str(tmp_path))
+    ac2.add_sweepable_property("a", [1, 2, 3, 4, 5])
+    ac2.commit()
+
+    ac = DefinitionPart("ac", base=str(tmp_path))
+    ac.add_sweepable_property("a", [1, 2])
+    ac.commit()
+    ac.add_sweepable_property("a", [3])
+    ac.commit()
+
+    meta = MetadataTableRegistry()
+    res_path = os.path.join(ac.get_results_path(ac.base_path), "metadata.db")
+    with sqlite3.connect(res_path) as con:
+        cur = con.cursor()
+
+        assert meta.get_parts(cur) == {"ac", "ac-2"}
+        assert [t.version for t in meta.get_tables(cur, "ac")] == [0, 1]
+        assert [t.version for t in meta.get_tables(cur, "ac-2")] == [0]
+        assert meta.get_max_configuration_id(cur, "ac") == 2
+        assert meta.get_max_configuration_id(cur, "ac-2") == 4
+        assert meta.get_max_configuration_id(cur, "a") == -1
+
+        latest = meta.get_latest_version(cur, "ac")
+        assert latest is not None and latest.version == 1
+
+
+def test_rebuild_legacy_catalog(tmp_path):
+    """
+    Test that databases without a catalog are cataloged transparently,
+    and that read-only connections do not write to the database.
+    """
+    res_path = os.path.join(tmp_path, "metadata.db")
+    with sqlite3.connect(res_path) as con:
+        con.execute("CREATE TABLE 'legacy-v0' (a, id INTEGER PRIMARY KEY)")
+        con.execute("CREATE TABLE 'legacy-v1' (a, b, id INTEGER PRIMARY KEY)")
+        con.executemany("INSERT INTO 'legacy-v0' (a, id) VALUES (?, ?)", [(1, 0), (2, 1)])
+        con.executemany("INSERT INTO 'legacy-v1' (a, b, id) VALUES (?, ?, ?)", [(1, 0, 0), (2, 0, 1), (3, 0, 7)])
+
+    # read-only connections get a private catalog
+    con = sqlite3.connect(f"file:{res_path}?mode=ro", uri=True)
+    meta = MetadataTableRegistry()
+    assert meta.get_parts(con.cursor()) == {"legacy"}
+    assert meta.get_max_configuration_id(con.cursor(), "legacy") == 7
+    con.close()
+
+    with sqlite3.connect(res_path) as con:
+        tables = {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        assert "_catalog" not in tables
+
+    # writable connections persist the catalog, committed as soon as it is rebuilt
+    with sqlite3.connect(res_path) as con:
+        meta = MetadataTableRegistry()
+        latest = meta.get_latest_version(con.cursor(), "legacy")
+        assert latest is not None and latest.version == 1
+        assert not con.in_transaction
+
+        with sqlite3.connect(res_path) as other:
+            assert other.execute("SELECT COUNT(*) FROM _catalog").fetchone() == (2,)
+
+    with sqlite3.connect(res_path) as con:
+        rows = sorted(con.execute("SELECT part, version, n_rows, max_id FROM _catalog").fetchall())
+        assert rows == [("legacy", 0, 2, 1), ("legacy", 1, 3, 7)]
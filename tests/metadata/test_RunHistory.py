@@ -0,0 +1,41 @@
+import sqlite3
+
+import ml_experiment.metadata.run_history as run_history
+from ml_experiment.execution.types import RunResult, RunSpec
+
+
+def test_record_and_estimate(tmp_path):
+    con = sqlite3.connect(tmp_path / "metadata.db")
+    cur = con.cursor()
+    run_history.ensure_history(cur)
+
+    run_history.record_durations(cur, [
+        RunResult(RunSpec("a", 0, 0, 0), 0, 2.0),
+        RunResult(RunSpec("a", 0, 0, 1), 0, 4.0),
+        RunResult(RunSpec("a", 0, 1, 0), 0, 9.0),
+        # failures are not representative and are ignored
+        RunResult(RunSpec("a", 0, 1, 1), 1, 100.0),
+    ])
+    con.commit()
+
+    est = run_history.RuntimeEstimator(cur, default=0.5)
+
+    # exact matches average over seeds
+    assert est.estimate(RunSpec("a", 0, 0, 5)) == 3.0
+    assert est.estimate(RunSpec("a", 0, 1, 5)) == 9.0
+
+    # config ids are stable across versions
+    assert est.estimate(RunSpec("a", 1, 1, 0)) == 9.0
+
+    # unknown configs fall back to the part, then to the default
+    assert est.estimate(RunSpec("a", 1, 2, 0)) == 5.0
+    assert est.estimate(RunSpec("b", 0, 0, 0)) == 0.5
+
+    con.close()
+
+
+def test_estimator_without_history(tmp_path):
+    con = sqlite3.connect(tmp_path / "metadata.db")
+    est = run_history.RuntimeEstimator(con.cursor(), default=1.5)
+    assert est.estimate(RunSpec("a", 0, 0, 0)) == 1.5
+    con.close()
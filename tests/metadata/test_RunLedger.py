@@ -0,0 +1,48 @@
+import sqlite3
+
+import ml_experiment.metadata.run_ledger as run_ledger
+from ml_experiment.execution.types import RunResult, RunSpec
+
+
+def test_ledger_lifecycle(tmp_path):
+    con = sqlite3.connect(tmp_path / "metadata.db")
+    cur = con.cursor()
+    run_ledger.ensure_ledger(cur)
+
+    runs = [RunSpec("a", 0, c, s) for c in range(3) for s in range(2)]
+    run_ledger.mark_pending(cur, runs)
+    assert run_ledger.get_status_counts(cur) == {"pending": 6}
+
+    run_ledger.mark_running(cur, runs[:3], "host-a")
+    run_ledger.mark_finished(cur, [
+        RunResult(runs[0], 0, 1.5),
+        RunResult(runs[1], 0, 2.5),
+        RunResult(runs[2], 3, 0.5, "boom"),
+    ])
+    con.commit()
+
+    assert run_ledger.get_status_counts(cur) == {"pending": 3, "done": 2, "failed": 1}
+    assert run_ledger.get_runs_with_status(cur, "a", 0, "done") == {(0, 0), (0, 1)}
+    assert run_ledger.get_runs_with_status(cur, "a", 1, "done") == set()
+    assert run_ledger.get_failed(cur) == [(runs[2], 3, "host-a")]
+
+    # retrying a run counts another attempt
+    run_ledger.mark_pending(cur, [runs[2]])
+    run_ledger.mark_running(cur, [runs[2]], "host-b")
+    run_ledger.mark_finished(cur, [RunResult(runs[2], 0, 1.0)])
+
+    row = cur.execute(
+        "SELECT status, exit_code, host, attempts FROM _runs WHERE config_id=1 AND seed=0"
+    ).fetchone()
+    assert row == ("done", 0, "host-b", 2)
+
+    con.close()
+
+
+def test_ledger_missing(tmp_path):
+    con = sqlite3.connect(tmp_path / "metadata.db")
+    cur = con.cursor()
+    assert run_ledger.get_runs_with_status(cur, "a", 0, "done") == set()
+    assert run_ledger.get_status_counts(cur) == {}
+    assert run_ledger.get_failed(cur) == []
+    con.close()
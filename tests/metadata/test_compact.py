@@ -0,0 +1,143 @@
+import os
+import sqlite3
+
+import pytest
+
+from ml_experiment.definition_part import DefinitionPart
+from ml_experiment.experiment_definition import ExperimentDefinition
+from ml_experiment.metadata.compact import CompactLayout, Run, to_runs
+from ml_experiment.metadata.metadata_table_registry import MetadataTableRegistry
+from ml_experiment.metadata.query import gt
+from ml_experiment.Scheduler import Scheduler
+
+
+def test_layout():
+    layout = CompactLayout({'a': [1, 2, 3], 'b': ['x', 'y']}, [Run(0, 10, 4), Run(4, 2, 2)])
+
+    assert layout.strides == [2, 1]
+    assert layout.encode({'a': 2, 'b': 'y'}) == 3
+    assert layout.encode({'a': 4, 'b': 'y'}) is None
+    assert layout.decode(3) == {'a': 2, 'b': 'y'}
+
+    assert layout.get_id(3) == 13
+    assert layout.get_id(5) == 3
+    assert layout.get_index(3) == 5
+    assert layout.get_index(4) is None
+    assert layout.get_num_configurations() == 6
+
+    assert [i for i, _ in layout.iter_configurations()] == [2, 3, 10, 11, 12, 13]
+
+
+def test_to_runs():
+    assert to_runs([]) == []
+    assert to_runs([(0, 5), (1, 6), (2, 7), (3, 0), (5, 1)]) == [Run(0, 5, 3), Run(3, 0, 1), Run(5, 1, 1)]
+
+
+def _build(tmp_path, name: str, compact: bool):
+    """
+    Three versions that alternate between rows and compact storage,
+    so that ids are resolved across both.
+    """
+    part = DefinitionPart(name, base=str(tmp_path))
+    part.add_sweepable_property('alpha', [0.1, 0.2, 0.3])
+    part.add_sweepable_property('opt', ['adam', 'sgd'])
+    part.commit(chunk_size=4, compact=compact)
+
+    part.add_sweepable_property('beta', [1, 2], assume_prior_value=1)
+    part.commit(chunk_size=4, compact=not compact)
+
+    part.add_sweepable_property('alpha', [0.4])
+    part.add_constraint(lambda alpha, beta: alpha * beta < 0.7)
+    part.commit(chunk_size=4, compact=compact)
+    return part
+
+
+def test_compact_matches_rows(tmp_path):
+    rows = _build(tmp_path, 'rows', compact=False)
+    _build(tmp_path, 'grid', compact=True)
+
+    db_path = os.path.join(rows.get_results_path(rows.base_path), 'metadata.db')
+    with sqlite3.connect(db_path) as con:
+        cur = con.cursor()
+        registry = MetadataTableRegistry()
+
+        for version in range(3):
+            a = registry.get_table(cur, 'rows', version)
+            b = registry.get_table(cur, 'grid', version)
+            assert a is not None and b is not None
+            assert b.is_compact(cur) == (version != 1)
+
+            assert b.get_all_configurations(cur) == a.get_all_configurations(cur)
+            assert b.get_columnar(cur) == a.get_columnar(cur)
+            assert b.get_num_configurations(cur) == a.get_num_configurations(cur)
+            assert b.get_configuration_ids(cur) == a.get_configuration_ids(cur)
+            assert b.query_ids(cur, {'alpha': gt(0.15)}) == a.query_ids(cur, {'alpha': gt(0.15)})
+
+            # the view holds the same rows as the table
+            cols = 'alpha, opt, id' if version == 0 else 'alpha, opt, beta, id'
+            view = sorted(cur.execute(f"SELECT {cols} FROM 'grid-v{version}'"))
+            assert view == sorted(cur.execute(f"SELECT {cols} FROM 'rows-v{version}'"))
+
+            configs = list(a.get_all_configurations(cur).values())
+            ids = [c.pop('id') for c in configs]
+            assert b.lookup_configuration_ids(cur, configs) == ids
+
+        # only the grid's axes are stored, never a row per configuration
+        assert cur.execute("SELECT COUNT(*) FROM '_axis_values' WHERE part='grid' AND version=0").fetchone() == (5,)
+        assert cur.execute("SELECT COUNT(*) FROM '_id_runs' WHERE part='grid' AND version=0").fetchone() == (1,)
+
+        # a rebuilt catalog still finds the compact versions
+        expected = cur.execute("SELECT version, n_rows, max_id FROM '_catalog' WHERE part='grid' ORDER BY version").fetchall()
+        cur.execute("DROP TABLE '_catalog'")
+        assert [t.version for t in MetadataTableRegistry().get_tables(cur, 'grid')] == [0, 1, 2]
+        assert cur.execute("SELECT version, n_rows, max_id FROM '_catalog' WHERE part='grid' ORDER BY version").fetchall() == expected
+
+
+def test_get_config(tmp_path):
+    rows = _build(tmp_path, 'rows', compact=False)
+    _build(tmp_path, 'grid', compact=True)
+
+    for version in range(3):
+        with ExperimentDefinition('rows', version, base=str(tmp_path)) as a, ExperimentDefinition('grid', version, base=str(tmp_path)) as b:
+            ids = sorted(a.get_columnar(as_numpy=False)['id'])
+            assert [b.get_config(i) for i in ids] == [a.get_config(i) for i in ids]
+            assert b.get_configs(ids) == a.get_configs(ids)
+
+            with pytest.raises(ValueError):
+                b.get_config(1000)
+
+    with ExperimentDefinition('grid', 0, base=str(tmp_path), cache=True) as b:
+        assert b.get_config(3) == ExperimentDefinition('rows', 0, base=str(tmp_path)).get_config(3)
+
+    # the scheduler finds every configuration of a compact version
+    exp_name = os.path.basename(rows.get_results_path(rows.base_path))
+    sched = Scheduler(exp_name, seeds=[0], entry='unused.py', version=2, base=str(tmp_path)).get_all_runs()
+    assert sorted(r.config_id for r in sched.all_runs if r.part_name == 'grid') == ids
+
+
+def test_compact_unchanged(tmp_path):
+    part = DefinitionPart('part', base=str(tmp_path))
+    part.add_sweepable_property('alpha', range(10))
+    part.commit(compact=True)
+    part.commit(compact=True)
+
+    # the same configurations as the latest version, so no new version is built
+    part.add_sweepable_property('alpha', [0])
+    part.commit(compact=True)
+
+    db_path = os.path.join(part.get_results_path(part.base_path), 'metadata.db')
+    with sqlite3.connect(db_path) as con:
+        assert con.execute("SELECT name FROM sqlite_master WHERE type='view'").fetchall() == [('part-v0',)]
+
+
+def test_compact_conditional(tmp_path):
+    # the value a conditional property falls back to is on its axis too
+    for name, compact in [('rows', False), ('grid', True)]:
+        part = DefinitionPart(name, base=str(tmp_path))
+        part.add_sweepable_property('trace', [True, False])
+        part.add_conditional_property('lambda', [0.5, 0.9], when={'trace': True}, otherwise=0.0)
+        part.commit(compact=compact)
+
+    with ExperimentDefinition('rows', 0, base=str(tmp_path)) as a, ExperimentDefinition('grid', 0, base=str(tmp_path)) as b:
+        assert b.get_configs([0, 1, 2]) == a.get_configs([0, 1, 2])
+        assert b.get_columnar(as_numpy=False) == a.get_columnar(as_numpy=False)
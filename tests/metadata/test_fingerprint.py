@@ -0,0 +1,57 @@
+from ml_experiment.metadata.fingerprint import fingerprint, function_digest, sweep_digest
+
+
+def test_fingerprint_key_order():
+    a = fingerprint({"alpha": 0.1, "beta": 2, "name": "x"})
+    b = fingerprint({"name": "x", "beta": 2, "alpha": 0.1})
+    assert a == b
+
+
+def test_fingerprint_numeric_representation():
+    assert fingerprint({"a": 1}) == fingerprint({"a": 1.0})
+    assert fingerprint({"a": 1}) == fingerprint({"a": True})
+    assert fingerprint({"a": 0}) == fingerprint({"a": False})
+    assert fingerprint({"a": 0.0}) == fingerprint({"a": -0.0})
+
+
+def test_fingerprint_distinguishes_values():
+    assert fingerprint({"a": 1}) != fingerprint({"a": "1"})
+    assert fingerprint({"a": 1}) != fingerprint({"a": 1.5})
+    assert fingerprint({"a": 1}) != fingerprint({"b": 1})
+    assert fingerprint({"a": 1}) != fingerprint({"a": 1, "b": 1})
+
+
+def test_fingerprint_fits_sqlite_integer():
+    for i in range(100):
+        f = fingerprint({"a": i})
+        assert -2**63 <= f < 2**63
+
+
+def test_sweep_digest():
+    a = sweep_digest({"alpha": [0.1, 0.2], "beta": [1]}, {})
+    b = sweep_digest({"beta": [1.0], "alpha": [0.2, 0.1]}, {})
+    assert a == b
+
+    assert a != sweep_digest({"alpha": [0.1, 0.2], "beta": [1, 2]}, {})
+    assert a != sweep_digest({"alpha": [0.1, 0.2], "beta": [1]}, {"beta": 1})
+    assert a != sweep_digest({"alpha": [0.1, 0.2], "beta": ["1"]}, {})
+
+
+LIMIT = 0.5
+
+
+def test_function_digest():
+    def below(t):
+        return lambda a, b: a * b < t
+
+    # the same code over the same values, however it was made
+    assert function_digest(below(1)) == function_digest(below(1))
+    assert function_digest(below(1)) != function_digest(below(2))
+    assert function_digest(lambda a: a < 1) != function_digest(lambda a: a <= 1)
+
+    # globals are read when digesting, not when the function was made
+    global LIMIT
+    fn = lambda a: a < LIMIT  # noqa: E731
+    digest = function_digest(fn)
+    LIMIT = 0.7
+    assert function_digest(fn) != digest
@@ -0,0 +1,61 @@
+import os
+import sqlite3
+
+import pytest
+
+from ml_experiment.definition_part import DefinitionPart
+from ml_experiment.metadata.metadata_table import MetadataTable
+from ml_experiment.metadata.query import between, ge, gt, isin, le, lt, to_sql
+
+
+def test_to_sql():
+    assert to_sql({}) == ('1', [])
+    assert to_sql({'alpha': 0.01}) == ('"alpha" = ?', [0.01])
+    assert to_sql({'tau': gt(5), 'alpha': le(1)}) == ('"alpha" <= ? AND "tau" > ?', [1, 5])
+    assert to_sql({'tau': between(1, 2)}) == ('"tau" >= ? AND "tau" <= ?', [1, 2])
+    assert to_sql({'opt': ['adam', 'sgd']}) == ('"opt" IN (?, ?)', ['adam', 'sgd'])
+    assert to_sql({'opt': isin([])}) == ('0', [])
+
+    with pytest.raises(TypeError):
+        to_sql({'alpha': None})  # type: ignore
+
+
+def test_query_table(tmp_path):
+    part = DefinitionPart('part', base=str(tmp_path))
+    part.get_results_path = lambda base: os.path.join(base, 'results')
+    part.add_sweepable_property('alpha', [0.1, 0.01, 0.001])
+    part.add_sweepable_property('tau', range(1000))
+    part.add_sweepable_property('opt', ['adam', 'sgd'])
+    part.add_sweepable_property('flag', [True, False])
+    part.commit()
+
+    table = MetadataTable('part', 0)
+    with sqlite3.connect(os.path.join(tmp_path, 'results', 'metadata.db')) as con:
+        cur = con.cursor()
+        everything = table.get_all_configurations(cur)
+
+        def _expected(keep):
+            return [i for i, c in sorted(everything.items()) if keep(c)]
+
+        assert table.query_ids(cur, {}) == sorted(everything)
+        assert table.query_ids(cur, {'alpha': 0.01, 'tau': gt(5), 'opt': {'adam'}}) == _expected(
+            lambda c: c['alpha'] == 0.01 and c['tau'] > 5 and c['opt'] == 'adam'
+        )
+        assert table.query_ids(cur, {'tau': ge(10), 'alpha': lt(0.1)}) == _expected(
+            lambda c: c['tau'] >= 10 and c['alpha'] < 0.1
+        )
+        assert table.query_ids(cur, {'flag': True, 'tau': le(3)}) == _expected(
+            lambda c: c['flag'] and c['tau'] <= 3
+        )
+
+        # large membership tests are bound as a single parameter
+        taus = set(range(0, 1000, 2))
+        taus.add(999)
+        assert table.query_ids(cur, {'tau': taus}) == _expected(lambda c: c['tau'] in taus)
+        assert table.query_ids(cur, {'tau': isin([])}) == []
+
+        configs = table.query_configurations(cur, {'tau': 7, 'opt': 'sgd', 'flag': False})
+        assert configs == [everything[i] for i in _expected(lambda c: c['tau'] == 7 and c['opt'] == 'sgd' and not c['flag'])]
+
+        with pytest.raises(ValueError):
+            table.query_ids(cur, {'beta': 1})
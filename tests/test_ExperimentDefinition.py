@@ -1,7 +1,10 @@
 import os
+import pytest
 
+import ml_experiment.experiment_definition as experiment_definition
 from ml_experiment.definition_part import DefinitionPart
 from ml_experiment.experiment_definition import ExperimentDefinition
+from ml_experiment.metadata.query import gt
 
 
 def test_ExperimentDefinition(tmp_path):
@@ -45,6 +48,39 @@ def test_ExperimentDefinition(tmp_path):
     ]
 
 
+def test_query(tmp_path, monkeypatch):
+    exp_name = 'dummy_experiment'
+    part_name = 'qrc'
+
+    part = stubbed_DefinitionPart(exp_name, part_name, base = str(tmp_path))
+    part.add_sweepable_property('alpha', [0.1, 0.01])
+    part.add_sweepable_property('tau', [1, 5, 10])
+    part.commit()
+
+    exp = stubbed_ExperimentDefinition(exp_name, part_name, 0, base = str(tmp_path))
+
+    ids = exp.query_ids({'alpha': 0.01, 'tau': gt(1)}, index=False)
+    assert exp.get_configs(ids) == exp.query({'alpha': 0.01, 'tau': gt(1)}, index=False)
+    assert sorted((c['alpha'], c['tau']) for c in exp.get_configs(ids)) == [(0.01, 5), (0.01, 10)]
+
+    cur = exp._get_cursor()
+    assert not exp.table.has_column_index(cur, 'alpha')
+
+    # properties are indexed when asked
+    exp.query_ids({'alpha': 0.01}, index=True)
+    assert exp.table.has_column_index(cur, 'alpha')
+
+    # and once they have been queried often enough
+    monkeypatch.setattr(experiment_definition, 'AUTO_INDEX_MIN_ROWS', 0)
+    for _ in range(experiment_definition.AUTO_INDEX_AFTER):
+        assert not exp.table.has_column_index(cur, 'tau')
+        exp.query_ids({'tau': 5})
+
+    fresh = stubbed_ExperimentDefinition(exp_name, part_name, 0, base = str(tmp_path))
+    assert fresh.table.has_column_index(fresh._get_cursor(), 'tau')
+    assert fresh.query_ids({'tau': 5}) == exp.query_ids({'tau': 5})
+
+
 class stubbed_DefinitionPart(DefinitionPart):
     def __init__(self, exp_name: str, name: str, base: str | None = None):
         self.exp_name = exp_name
@@ -60,3 +96,79 @@ class stubbed_ExperimentDefinition(ExperimentDefinition):
 
     def get_results_path(self, base_path) -> str:
         return os.path.join(base_path, 'results', self.exp_name)
+
+
+def test_get_configs_batched(tmp_path):
+    exp_name = 'batched_experiment'
+    part_name = 'qrc'
+
+    part = stubbed_DefinitionPart(exp_name, part_name, base = str(tmp_path))
+    part.add_sweepable_property('alpha', range(100))
+    part.add_sweepable_property('beta', range(20))
+    part.commit()
+
+    exp = stubbed_ExperimentDefinition(exp_name, part_name, 0, base = str(tmp_path))
+    expected = {i: exp.get_config(i) for i in range(2000)}
+
+    # results come back in the requested order, including duplicates
+    ids = [5, 3, 1999, 3, 0]
+    assert exp.get_configs(ids) == [expected[i] for i in ids]
+
+    # large requests read the whole table
+    ids = list(reversed(range(2000)))
+    assert exp.get_configs(ids) == [expected[i] for i in ids]
+
+    # missing ids are reported together
+    with pytest.raises(ValueError, match=r'\[2000, 2001\]'):
+        exp.get_configs([1, 2000, 2001])
+
+    with pytest.raises(ValueError, match='<2000>'):
+        exp.get_config(2000)
+
+    exp.close()
+
+
+def test_get_columnar(tmp_path):
+    exp_name = 'columnar_experiment'
+    part_name = 'qrc'
+
+    part = stubbed_DefinitionPart(exp_name, part_name, base = str(tmp_path))
+    part.add_sweepable_property('alpha', [0.5, 0.25])
+    part.add_sweepable_property('beta', [1, 2, 3])
+    part.add_property('name', 'qrc')
+    part.commit()
+
+    exp = stubbed_ExperimentDefinition(exp_name, part_name, 0, base = str(tmp_path))
+    columns = exp.get_columnar(as_numpy=False)
+
+    assert set(columns.keys()) == {'alpha', 'beta', 'name', 'id'}
+    assert columns['id'] == list(range(6))
+
+    # columns are aligned with the ids
+    for i, config_id in enumerate(columns['id']):
+        config = exp.get_config(config_id)
+        assert {k: v[i] for k, v in columns.items()} == config
+
+
+def test_get_columnar_numpy(tmp_path):
+    np = pytest.importorskip('numpy')
+
+    exp_name = 'columnar_numpy_experiment'
+    part_name = 'qrc'
+
+    part = stubbed_DefinitionPart(exp_name, part_name, base = str(tmp_path))
+    part.add_sweepable_property('alpha', [0.5, 0.25])
+    part.add_sweepable_property('beta', [1, 2, 3])
+    part.add_property('name', 'qrc')
+    part.commit()
+
+    exp = stubbed_ExperimentDefinition(exp_name, part_name, 0, base = str(tmp_path))
+    columns = exp.get_columnar(as_numpy=True)
+
+    assert isinstance(columns['alpha'], np.ndarray)
+    assert columns['alpha'].dtype == np.float64
+    assert columns['beta'].dtype.kind == 'i'
+    assert np.array_equal(columns['id'], np.arange(6))
+
+    mask = columns['alpha'] == 0.5
+    assert sorted(columns['beta'][mask].tolist()) == [1, 2, 3]